@@ -0,0 +1,315 @@
+import argparse
+import contextlib
+import functools
+import json
+import pathlib
+import statistics
+import sys
+import time
+import typing
+
+import torch
+from torch.utils.data import DataLoader, RandomSampler, TensorDataset
+
+from src.concept_bottleneck.dataset import (
+    DATA_PATH,
+    NUM_CLASSES,
+    CUB200AttributesToClass,
+    CUB200ImageToAttributes,
+    CUB200ImageToClass,
+    load_image_paths,
+)
+from src.concept_bottleneck.engine import TrainingEngine
+from src.concept_bottleneck.inference import (
+    INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+    MODEL_TYPE_MAP,
+    SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    AttributesToClassModel,
+    ImageToAttributesModel,
+    ModelRegistry,
+)
+from src.concept_bottleneck.networks import JointImageToClass
+from src.concept_bottleneck.rerun import RerunEngine
+from src.concept_bottleneck.synthetic import Environment, synthetic_environment
+from src.concept_bottleneck.train import MODEL_PATH
+
+# Relative slowdown tolerated before a result is flagged as a regression.
+DEFAULT_TOLERANCE = 0.2
+
+
+class Result(typing.NamedTuple):
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool
+
+
+REAL_ENVIRONMENT = Environment(DATA_PATH, MODEL_PATH)
+
+
+def measure(
+    fn: typing.Callable[[], typing.Any], repeats: int = 10, warmup: int = 1
+) -> float:
+    for _ in range(warmup):
+        fn()
+    durations: list[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def benchmark_datasets(data_path: pathlib.Path, num_items: int = 64) -> list[Result]:
+    results: list[Result] = []
+    datasets: dict[str, typing.Callable[[], torch.utils.data.Dataset[typing.Any]]] = {
+        "image_to_attributes": lambda: CUB200ImageToAttributes(
+            train=True, download=False, data_path=data_path
+        ),
+        "attributes_to_class": lambda: CUB200AttributesToClass(
+            train=True, download=False, data_path=data_path
+        ),
+        "image_to_class": lambda: CUB200ImageToClass(
+            train=True, download=False, data_path=data_path
+        ),
+    }
+
+    for name, build in datasets.items():
+        start = time.perf_counter()
+        data = build()
+        results.append(
+            Result(
+                f"dataset.{name}.construct",
+                (time.perf_counter() - start) * 1000,
+                "ms",
+                False,
+            )
+        )
+
+        count = min(num_items, len(data))  # type: ignore
+        start = time.perf_counter()
+        for idx in range(count):
+            data[idx]  # pylint: disable=pointless-statement
+        results.append(
+            Result(
+                f"dataset.{name}.getitem",
+                count / (time.perf_counter() - start),
+                "items/s",
+                True,
+            )
+        )
+
+    return results
+
+
+def benchmark_dataloader(
+    data_path: pathlib.Path,
+    num_workers: typing.Sequence[int] = (0, 2, 4),
+    batch_size: int = 32,
+    num_batches: int = 8,
+) -> list[Result]:
+    results: list[Result] = []
+    data = CUB200ImageToAttributes(train=True, download=False, data_path=data_path)
+
+    for workers in num_workers:
+        # Sampling with replacement keeps small datasets from running out.
+        sampler = RandomSampler(
+            data, replacement=True, num_samples=batch_size * (num_batches + 1)
+        )
+        dataloader = DataLoader(
+            data, batch_size=batch_size, num_workers=workers, sampler=sampler
+        )
+        batches = iter(dataloader)
+        # The first batch also pays for starting the workers.
+        next(batches)
+
+        count = 0
+        start = time.perf_counter()
+        for _, (images, _) in zip(range(num_batches), batches):
+            count += len(images)
+        results.append(
+            Result(
+                f"dataloader.workers_{workers}",
+                count / (time.perf_counter() - start),
+                "images/s",
+                True,
+            )
+        )
+
+    return results
+
+
+def benchmark_inference(environment: Environment, repeats: int = 10) -> list[Result]:
+    data_path, model_path = environment
+    image_uri = (data_path / "images" / load_image_paths(data_path)[0]).as_uri()
+
+    # Fresh registries without a prediction cache, so that every prediction
+    # runs the models.
+    image_to_attributes_model = ImageToAttributesModel(
+        ModelRegistry(), model_path=model_path
+    )
+    start = time.perf_counter()
+    concepts = image_to_attributes_model.predict(
+        INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME, image_uri
+    )
+    cold = time.perf_counter() - start
+    warm = measure(
+        lambda: image_to_attributes_model.predict(
+            INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME, image_uri
+        ),
+        repeats=repeats,
+        warmup=0,
+    )
+
+    attributes_to_class_model = AttributesToClassModel(
+        ModelRegistry(), model_path=model_path
+    )
+    attributes = list(concepts.values())
+    class_predict = measure(
+        lambda: attributes_to_class_model.predict(
+            SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME, attributes
+        ),
+        repeats=repeats * 10,
+    )
+
+    return [
+        Result("image_to_attributes.predict.cold", cold * 1000, "ms", False),
+        Result("image_to_attributes.predict.warm", warm * 1000, "ms", False),
+        Result("attributes_to_class.predict", class_predict * 1000, "ms", False),
+        *benchmark_rerun(attributes, model_path, repeats * 10),
+    ]
+
+
+def benchmark_rerun(
+    attributes: list[float], model_path: pathlib.Path, repeats: int
+) -> list[Result]:
+    engine = RerunEngine(ModelRegistry(), model_path)
+    engine.set_model(SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME)
+    engine.set_concepts(attributes)
+    rerun = measure(engine.predict, repeats=repeats)
+    return [Result("rerun.predict", rerun * 1000, "ms", False)]
+
+
+def benchmark_joint_training_step(batch_size: int = 8, steps: int = 3) -> list[Result]:
+    model = JointImageToClass(pretrained=False)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9)
+
+    generator = torch.Generator().manual_seed(0)
+    x = torch.randn(batch_size, 3, 299, 299, generator=generator)
+    y = torch.randint(0, NUM_CLASSES, (batch_size,), generator=generator)
+    dataloader = DataLoader(TensorDataset(x, y), batch_size=batch_size)
+
+    results: list[Result] = []
+    for name, mixed_precision in (
+        ("joint.train_step", False),
+        ("joint.train_step_bf16", True),
+    ):
+        engine = TrainingEngine(optimizer, "class", mixed_precision=mixed_precision)
+        duration = measure(
+            functools.partial(engine.train, model, dataloader), repeats=steps
+        )
+        results.append(Result(name, batch_size / duration, "samples/s", True))
+    return results
+
+
+def has_real_data(environment: Environment = REAL_ENVIRONMENT):
+    return (environment.data_path / "images").exists() and all(
+        (environment.model_path / name).exists()
+        for names in MODEL_TYPE_MAP.values()
+        for name in names
+    )
+
+
+def compare_with_baseline(
+    results: typing.Sequence[Result],
+    baseline: typing.Mapping[str, typing.Mapping[str, typing.Any]],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> list[tuple[Result, float]]:
+    # Returns the regressed results with their relative slowdown.
+    regressions: list[tuple[Result, float]] = []
+    for result in results:
+        if result.name not in baseline:
+            continue
+        base = baseline[result.name]["value"]
+        if base <= 0 or result.value <= 0:
+            continue
+        slowdown = (
+            base / result.value - 1
+            if result.higher_is_better
+            else result.value / base - 1
+        )
+        if slowdown > tolerance:
+            regressions.append((result, slowdown))
+    return regressions
+
+
+def run_benchmarks(
+    environment: Environment,
+    num_workers: typing.Sequence[int],
+    repeats: int,
+    training_steps: int,
+) -> list[Result]:
+    return [
+        *benchmark_datasets(environment.data_path),
+        *benchmark_dataloader(environment.data_path, num_workers),
+        *benchmark_inference(environment, repeats),
+        *benchmark_joint_training_step(steps=training_steps),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the dataset, training and interactive inference hot paths."
+    )
+    parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="use random data and models even if the real ones are available",
+    )
+    parser.add_argument("--synthetic-images", type=int, default=256)
+    parser.add_argument("--num-workers", type=int, nargs="+", default=[0, 2, 4])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--training-steps", type=int, default=3)
+    parser.add_argument("--output", type=pathlib.Path, default=None)
+    parser.add_argument("--baseline", type=pathlib.Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    synthetic = args.synthetic or not has_real_data()
+    with (
+        synthetic_environment(args.synthetic_images)
+        if synthetic
+        else contextlib.nullcontext(REAL_ENVIRONMENT)
+    ) as environment:
+        results = run_benchmarks(
+            environment, args.num_workers, args.repeats, args.training_steps
+        )
+
+    for result in results:
+        print(f"{result.name:<40} {result.value:>12.3f} {result.unit}")
+
+    report = {
+        result.name: {**result._asdict(), "synthetic": synthetic} for result in results
+    }
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        # Timings on synthetic and real data are not comparable.
+        baseline = {
+            name: result
+            for name, result in baseline.items()
+            if result.get("synthetic", synthetic) == synthetic
+        }
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for result, slowdown in regressions:
+            print(f"REGRESSION {result.name}: {100 * slowdown:.1f}% slower")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import pathlib
+import statistics
+import time
+import typing
+
+import numpy as np
+import numpy.typing as npt
+import torch
+from torch.utils.data import DataLoader, Subset
+
+from src.concept_bottleneck.cache import atomic_write
+from src.concept_bottleneck.dataset import CUB200ImageToAttributes
+
+# int8 models are loaded from the artifacts written by
+# src.concept_bottleneck.quantization instead of being built from the fp32 model.
+Backend = typing.Literal["eager", "torchscript", "onnx", "channels_last_bf16", "int8"]
+
+BACKENDS: tuple[Backend, ...] = typing.get_args(Backend)
+
+IMAGE_SHAPE = (3, 299, 299)
+
+
+class AutocastModule(torch.nn.Module):
+    # Runs a channels_last copy of the model under bfloat16 autocast and
+    # returns float32 outputs like the eager model.
+    def __init__(self, model: torch.nn.Module, device: str):
+        super().__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+        self.device_type = torch.device(device).type
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        with torch.autocast(self.device_type, dtype=torch.bfloat16):
+            return self.model(x.contiguous(memory_format=torch.channels_last)).float()
+
+
+class OnnxModule(torch.nn.Module):
+    # Wraps an ONNX Runtime session, so it can be used and cached like the other
+    # backends.
+    def __init__(self, filepath: pathlib.Path, num_threads: int | None = None):
+        super().__init__()
+        try:
+            # pylint: disable-next=import-outside-toplevel
+            import onnxruntime  # pyright: ignore[reportMissingImports]
+        except ImportError as e:
+            raise ImportError("The onnx backend requires onnxruntime.") from e
+
+        # onnxruntime is optional and has no type information.
+        options = typing.cast(typing.Any, onnxruntime.SessionOptions())
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self.session: typing.Any = onnxruntime.InferenceSession(
+            str(filepath), options, providers=["CPUExecutionProvider"]
+        )
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        outputs: list[npt.NDArray[np.float32]] = self.session.run(
+            None, {"images": x.cpu().numpy()}
+        )
+        (logits,) = outputs
+        return torch.from_numpy(logits).to(x.device)
+
+
+def build_backend(
+    model: torch.nn.Module,
+    backend: Backend,
+    device: str,
+    onnx_path: pathlib.Path | None = None,
+    num_threads: int | None = None,
+) -> torch.nn.Module:
+    # num_threads only sizes the ONNX Runtime session. The other backends run
+    # on the process-wide torch pool, which callers set with
+    # torch.set_num_threads, e.g. the server's --num-threads.
+    model.eval()
+    example = torch.rand(1, *IMAGE_SHAPE, device=device)
+
+    if backend == "eager":
+        return model
+
+    if backend == "torchscript":
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)  # type: ignore
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+    if backend == "onnx":
+        if onnx_path is None:
+            raise ValueError("The onnx backend requires onnx_path.")
+        if not onnx_path.exists():
+            export_onnx(model, example, onnx_path)
+        return OnnxModule(onnx_path, num_threads)
+
+    if backend == "channels_last_bf16":
+        return AutocastModule(model, device)
+
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def export_onnx(model: torch.nn.Module, example: torch.Tensor, filepath: pathlib.Path):
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_write(filepath) as temp_filepath, torch.no_grad():
+        torch.onnx.export(
+            model,
+            (example,),
+            str(temp_filepath),
+            input_names=["images"],
+            output_names=["logits"],
+            dynamic_axes={"images": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=13,
+        )
+
+
+def check_parity(
+    models: typing.Mapping[str, torch.nn.Module],
+    num_images: int = 256,
+    batch_size: int = 32,
+    device: str = "cpu",
+):
+    # Compares the concept probabilities of every model with the first one on
+    # the first images of the CUB test split. They are decoded on the fly, as
+    # building the preprocessed store for a few hundred images is not worth it.
+    dataset = CUB200ImageToAttributes(train=False)
+    dataloader = DataLoader(
+        Subset(dataset, range(min(num_images, len(dataset)))), batch_size=batch_size
+    )
+
+    probabilities: dict[str, list[torch.Tensor]] = {name: [] for name in models}
+    with torch.inference_mode():
+        for images, _ in dataloader:
+            for name, model in models.items():
+                probabilities[name].append(
+                    torch.sigmoid(model(images.to(device))).cpu()
+                )
+
+    reference_name, *names = models
+    reference = torch.cat(probabilities[reference_name])
+    return {
+        name: {
+            "max_abs_diff": (torch.cat(probabilities[name]) - reference)
+            .abs()
+            .max()
+            .item(),
+            "prediction_agreement": (
+                (torch.cat(probabilities[name]) > 0.5) == (reference > 0.5)
+            )
+            .float()
+            .mean()
+            .item(),
+        }
+        for name in names
+    }
+
+
+def measure_latency(
+    model: torch.nn.Module, device: str = "cpu", warmup: int = 3, repeats: int = 20
+):
+    image = torch.rand(1, *IMAGE_SHAPE, device=device)
+    latencies: list[float] = []
+    with torch.inference_mode():
+        for i in range(warmup + repeats):
+            start = time.perf_counter()
+            model(image)
+            if i >= warmup:
+                latencies.append(time.perf_counter() - start)
+    return {
+        "median_ms": statistics.median(latencies) * 1000,
+        "p90_ms": float(np.percentile(latencies, 90)) * 1000,
+    }
@@ -0,0 +1,275 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+import pathlib
+import time
+import typing
+
+import numpy as np
+import numpy.typing as npt
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision.datasets.folder import pil_loader
+
+from src.concept_bottleneck.cache import atomic_write, hash_file
+from src.concept_bottleneck.dataset import (
+    DEFAULT_IMAGE_TRANSFORM,
+    NUM_ATTRIBUTES,
+    NUM_CLASSES,
+    ImageLoader,
+    draft_loader,
+    load_attribute_names,
+    load_class_names,
+)
+from src.concept_bottleneck.inference import (
+    MODEL_REGISTRY,
+    MODEL_TYPE_MAP,
+    ModelRegistry,
+    ModelType,
+    load_attributes_to_class_model,
+    load_image_to_attributes_model,
+)
+from src.concept_bottleneck.train import MODEL_PATH
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg")
+MANIFEST_NAME = "manifest.json"
+PREDICTIONS_NAME = "predictions.npz"
+
+
+class ImageFiles(Dataset[tuple[torch.Tensor, bool]]):
+    def __init__(
+        self,
+        paths: typing.Sequence[pathlib.Path],
+        transform: typing.Callable[
+            [Image.Image], torch.Tensor
+        ] = DEFAULT_IMAGE_TRANSFORM,
+        loader: ImageLoader = pil_loader,
+    ):
+        super().__init__()
+        self.paths = paths
+        self.transform = transform
+        self.loader = loader
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx: int) -> tuple[torch.Tensor, bool]:
+        # A broken file should not abort a run over tens of thousands of
+        # images; it is scored as a blank image and flagged as invalid.
+        try:
+            return self.transform(self.loader(str(self.paths[idx]))), True
+        except (OSError, ValueError):
+            return self.transform(Image.new("RGB", (299, 299))), False
+
+
+def find_images(root: pathlib.Path) -> list[pathlib.Path]:
+    return sorted(
+        path
+        for path in root.rglob("*")
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+def score_images(  # pylint: disable=too-many-arguments,too-many-locals
+    paths: typing.Sequence[pathlib.Path],
+    output_dir: pathlib.Path,
+    model_type: ModelType = "independent",
+    batch_size: int = 64,
+    num_workers: int = 4,
+    chunk_size: int = 1024,
+    device: str | None = None,
+    draft_decode: bool = False,
+    registry: ModelRegistry = MODEL_REGISTRY,
+    model_path: pathlib.Path = MODEL_PATH,
+):
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    image_model_name, class_model_name = MODEL_TYPE_MAP[model_type]
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    check_manifest(output_dir, paths, model_type, chunk_size, draft_decode, model_path)
+
+    chunks = [
+        range(start, min(start + chunk_size, len(paths)))
+        for start in range(0, len(paths), chunk_size)
+    ]
+    pending_chunks = [
+        (chunk_id, chunk)
+        for chunk_id, chunk in enumerate(chunks)
+        if not get_chunk_path(output_dir, chunk_id).exists()
+    ]
+    num_pending_images = sum(len(chunk) for _, chunk in pending_chunks)
+    print(
+        f"{len(pending_chunks)}/{len(chunks)} chunks, {num_pending_images} images to score"
+    )
+
+    image_to_attributes_model = registry.get(
+        image_model_name,
+        device,
+        functools.partial(load_image_to_attributes_model, model_path=model_path),
+        checkpoint=model_path / image_model_name,
+    )
+    attributes_to_class_model = registry.get(
+        class_model_name,
+        device,
+        functools.partial(load_attributes_to_class_model, model_path=model_path),
+        checkpoint=model_path / class_model_name,
+    )
+
+    # Batches never cross chunk boundaries so that each chunk can be written
+    # as soon as its last batch is scored.
+    batches = [
+        list(chunk[start : start + batch_size])
+        for _, chunk in pending_chunks
+        for start in range(0, len(chunk), batch_size)
+    ]
+    dataloader = DataLoader(
+        ImageFiles(paths, loader=draft_loader if draft_decode else pil_loader),
+        batch_sampler=batches,
+        num_workers=num_workers,
+        pin_memory=device != "cpu",
+    )
+    batch_iter = iter(dataloader)
+
+    scored = 0
+    start_time = time.perf_counter()
+    with torch.inference_mode():
+        for chunk_id, chunk in pending_chunks:
+            concept_probabilities = np.empty((len(chunk), NUM_ATTRIBUTES), np.float32)
+            class_probabilities = np.empty((len(chunk), NUM_CLASSES), np.float32)
+            valid = np.empty(len(chunk), np.bool_)
+
+            start = 0
+            while start < len(chunk):
+                images, is_valid = next(batch_iter)
+                concepts = torch.sigmoid(image_to_attributes_model(images.to(device)))
+                classes = torch.softmax(attributes_to_class_model(concepts), dim=1)
+
+                end = start + len(images)
+                concept_probabilities[start:end] = concepts.cpu().numpy()
+                class_probabilities[start:end] = classes.cpu().numpy()
+                valid[start:end] = is_valid.numpy()
+                start = end
+
+            save_chunk(
+                get_chunk_path(output_dir, chunk_id),
+                paths=np.array([str(paths[idx]) for idx in chunk]),
+                concept_probabilities=concept_probabilities,
+                class_probabilities=class_probabilities,
+                valid=valid,
+            )
+
+            scored += len(chunk)
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"Chunk {chunk_id + 1}/{len(chunks)}: {scored / elapsed:.2f} images/sec"
+            )
+
+    merge_chunks(output_dir, len(chunks))
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        "images": scored,
+        "seconds": elapsed,
+        "images_per_second": scored / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def check_manifest(  # pylint: disable=too-many-arguments
+    output_dir: pathlib.Path,
+    paths: typing.Sequence[pathlib.Path],
+    model_type: ModelType,
+    chunk_size: int,
+    draft_decode: bool = False,
+    model_path: pathlib.Path = MODEL_PATH,
+):
+    # Chunks may only be reused when they were produced from the same image
+    # list, checkpoints, decoding and chunking.
+    model_names = MODEL_TYPE_MAP[model_type]
+    manifest = {
+        "model_type": model_type,
+        "model_names": model_names,
+        "checkpoint_hashes": [hash_file(model_path / name) for name in model_names],
+        "draft_decode": draft_decode,
+        "chunk_size": chunk_size,
+        "num_images": len(paths),
+        "paths_hash": hashlib.sha256(
+            "\n".join(str(path) for path in paths).encode("utf-8")
+        ).hexdigest(),
+    }
+    manifest_path = output_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path, encoding="utf-8") as f:
+            previous_manifest = json.load(f)
+        if previous_manifest != json.loads(json.dumps(manifest)):
+            raise ValueError(
+                f"{output_dir} holds results of a different run; use a new output directory."
+            )
+    else:
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+
+def get_chunk_path(output_dir: pathlib.Path, chunk_id: int):
+    return output_dir / f"chunk-{chunk_id:05d}.npz"
+
+
+def save_chunk(filepath: pathlib.Path, **arrays: npt.NDArray[typing.Any]):
+    with atomic_write(filepath) as temp_filepath, open(temp_filepath, "wb") as f:
+        np.savez(f, **typing.cast(dict[str, typing.Any], arrays))
+
+
+def merge_chunks(output_dir: pathlib.Path, num_chunks: int):
+    columns: dict[str, list[npt.NDArray[typing.Any]]] = {}
+    for chunk_id in range(num_chunks):
+        with np.load(get_chunk_path(output_dir, chunk_id)) as chunk:
+            for name in chunk.files:
+                columns.setdefault(name, []).append(chunk[name])
+
+    save_chunk(
+        output_dir / PREDICTIONS_NAME,
+        attribute_names=np.array(load_attribute_names()),
+        class_names=np.array(load_class_names()),
+        **{name: np.concatenate(arrays) for name, arrays in columns.items()},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Score a folder of JPEG images with a concept bottleneck model."
+    )
+    parser.add_argument("images", type=pathlib.Path)
+    parser.add_argument("output", type=pathlib.Path)
+    parser.add_argument(
+        "--model-type", choices=tuple(MODEL_TYPE_MAP), default="independent"
+    )
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--device", default=None)
+    parser.add_argument(
+        "--draft-decode",
+        action="store_true",
+        help="decode large JPEG images at a reduced scale",
+    )
+    args = parser.parse_args()
+
+    paths = find_images(args.images)
+    stats = score_images(
+        paths,
+        args.output,
+        model_type=args.model_type,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        chunk_size=args.chunk_size,
+        device=args.device,
+        draft_decode=args.draft_decode,
+    )
+    print(f"Scored {stats['images']} images in {stats['seconds']:.2f}s")
+    print(f"Throughput: {stats['images_per_second']:.2f} images/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import contextlib
+import functools
+import hashlib
+import os
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+CACHE_PATH = pathlib.Path(__file__).parent.resolve() / "data" / "cache"
+
+
+def hash_file(filepath: pathlib.Path) -> str:
+    stat = filepath.stat()
+    return _hash_file(filepath.resolve(), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_file(
+    filepath: pathlib.Path, size: int, mtime_ns: int  # pylint: disable=unused-argument
+) -> str:
+    # The size and modification time are part of the cache key so that a
+    # rewritten file is hashed again.
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def hash_config(*config: object) -> str:
+    return hashlib.sha256(repr(config).encode("utf-8")).hexdigest()[:16]
+
+
+def load_or_build_array(
+    filepath: pathlib.Path,
+    shape: tuple[int, ...],
+    dtype: npt.DTypeLike,
+    build: typing.Callable[[npt.NDArray[typing.Any]], None],
+) -> npt.NDArray[typing.Any]:
+    if not filepath.exists():
+        with atomic_write(filepath) as temp_filepath:
+            array = np.lib.format.open_memmap(
+                temp_filepath, mode="w+", dtype=dtype, shape=shape
+            )
+            build(array)
+            array.flush()
+            del array
+
+    return np.load(filepath, mmap_mode="r")
+
+
+@contextlib.contextmanager
+def atomic_write(
+    filepath: pathlib.Path, fsync: bool = False
+) -> typing.Generator[pathlib.Path, None, None]:
+    # Yields a temporary file that is renamed to `filepath` once the block
+    # completes, so that an interrupted build never leaves a truncated file
+    # behind. The name is unique per process for concurrent builds. With
+    # `fsync`, the data also reaches the disk before the rename, so that a
+    # power loss cannot leave an empty file under the final name.
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    temp_filepath = filepath.with_name(f"{filepath.name}.{os.getpid()}.tmp")
+    try:
+        yield temp_filepath
+        if fsync:
+            with open(temp_filepath, "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(temp_filepath, filepath)
+    finally:
+        temp_filepath.unlink(missing_ok=True)
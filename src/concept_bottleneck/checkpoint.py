@@ -0,0 +1,180 @@
+import pathlib
+import queue
+import random
+import re
+import threading
+import typing
+
+import numpy as np
+import torch
+
+from src.concept_bottleneck.cache import atomic_write
+
+CHECKPOINT_PATH = pathlib.Path(__file__).parent.resolve() / "data" / "checkpoints"
+
+CHECKPOINT_PATTERN = re.compile(r"checkpoint-(\d+)\.pt")
+BEST_CHECKPOINT_NAME = "best.pt"
+
+T = typing.TypeVar("T")
+
+
+class CheckpointManager:
+    # Snapshots are copied to the CPU in the training thread, which only costs
+    # a memory copy, and serialized to disk by a background thread. Every file
+    # is written to a temporary path and renamed, so a crash never leaves a
+    # truncated checkpoint behind. `write` saves model files the same way. An
+    # interrupted run continues from Checkpointing(resume_from=latest()).
+    def __init__(
+        self,
+        directory: pathlib.Path,
+        keep_last: int = 2,
+        every: int = 1,
+        max_pending: int = 2,
+    ):
+        self.directory = directory
+        self.keep_last = keep_last
+        self.every = every
+
+        self._queue: queue.Queue[tuple[pathlib.Path, typing.Any] | None] = queue.Queue(
+            maxsize=max_pending
+        )
+        self._error: BaseException | None = None
+
+        directory.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(
+        self,
+        epoch: int,
+        model: torch.nn.Module,
+        optimizer: torch.optim.Optimizer | None = None,
+        is_best: bool = False,
+        **state: typing.Any,
+    ):
+        checkpoint = snapshot(
+            {
+                "epoch": epoch,
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict() if optimizer else None,
+                "rng": get_rng_state(),
+                **state,
+            }
+        )
+        self._put(self.directory / f"checkpoint-{epoch:05d}.pt", checkpoint)
+        if is_best:
+            self._put(self.directory / BEST_CHECKPOINT_NAME, checkpoint)
+
+    def write(self, filepath: pathlib.Path, obj: typing.Any):
+        # Writes any object, e.g. a model state dict, in the background.
+        self._put(filepath, snapshot(obj))
+
+    def latest(self) -> pathlib.Path | None:
+        checkpoints = self._list_checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def wait(self):
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def _put(self, filepath: pathlib.Path, obj: typing.Any):
+        self._raise_error()
+        # Blocks when the writer falls behind, which bounds the memory held by
+        # pending snapshots.
+        self._queue.put((filepath, obj))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                filepath, obj = item
+                atomic_save(obj, filepath)
+                if filepath.parent == self.directory:
+                    self._remove_old_checkpoints()
+            except BaseException as e:  # pylint: disable=broad-except
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Failed to write a checkpoint.") from error
+
+    def _list_checkpoints(self):
+        return sorted(
+            path
+            for path in self.directory.iterdir()
+            if CHECKPOINT_PATTERN.fullmatch(path.name)
+        )
+
+    def _remove_old_checkpoints(self):
+        for path in self._list_checkpoints()[: -self.keep_last or None]:
+            path.unlink(missing_ok=True)
+
+
+class Checkpointing(typing.NamedTuple):
+    # Where run_epochs writes checkpoints, the optimizer whose state they
+    # include, and the checkpoint to resume from. The optimizer and resume
+    # path also apply without a manager, e.g. in processes that only read.
+    manager: CheckpointManager | None = None
+    optimizer: torch.optim.Optimizer | None = None
+    resume_from: pathlib.Path | None = None
+
+
+def snapshot(obj: T) -> T:
+    # state_dict() returns references to the live parameters and optimizer
+    # buffers, so they have to be copied before training continues.
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)  # type: ignore
+    if isinstance(obj, dict):
+        return type(obj)(  # type: ignore
+            (key, snapshot(value)) for key, value in obj.items()  # type: ignore
+        )
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)  # type: ignore
+    return obj
+
+
+def atomic_save(obj: typing.Any, filepath: pathlib.Path):
+    with atomic_write(filepath, fsync=True) as temp_filepath:
+        torch.save(obj, temp_filepath)
+
+
+def get_rng_state() -> dict[str, typing.Any]:
+    return {
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+        "numpy": np.random.get_state(),
+        "python": random.getstate(),
+    }
+
+
+def set_rng_state(state: dict[str, typing.Any]):
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+
+
+def load_checkpoint(
+    filepath: pathlib.Path,
+    model: torch.nn.Module,
+    optimizer: torch.optim.Optimizer | None = None,
+) -> dict[str, typing.Any]:
+    # Restores the model, optimizer and RNG states in place and returns the
+    # whole checkpoint for the remaining training state.
+    checkpoint = torch.load(filepath, map_location="cpu", weights_only=False)
+    model.load_state_dict(checkpoint["model"])
+    if optimizer is not None and checkpoint["optimizer"] is not None:
+        optimizer.load_state_dict(checkpoint["optimizer"])
+    set_rng_state(checkpoint["rng"])
+    return checkpoint
@@ -0,0 +1,51 @@
+import argparse
+
+import torch
+
+from src.concept_bottleneck.backends import BACKENDS, check_parity, measure_latency
+from src.concept_bottleneck.inference import (
+    INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+    load_image_to_attributes_model,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the inference backends with the eager model."
+    )
+    parser.add_argument(
+        "--model-name", default=INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME
+    )
+    parser.add_argument(
+        "--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS)
+    )
+    parser.add_argument("--num-images", type=int, default=256)
+    parser.add_argument("--num-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+
+    models = {
+        backend: load_image_to_attributes_model(
+            args.model_name, "cpu", backend, args.num_threads
+        )
+        for backend in dict.fromkeys(("eager", *args.backends))
+    }
+
+    parity = check_parity(models, num_images=args.num_images)
+    for backend, model in models.items():
+        latency = measure_latency(model)
+        print(
+            f"{backend}: {latency['median_ms']:.1f} ms median,",
+            f"{latency['p90_ms']:.1f} ms p90",
+        )
+        if backend in parity:
+            print(
+                f"  max abs diff {parity[backend]['max_abs_diff']:.2e},",
+                f"agreement {parity[backend]['prediction_agreement']:.4%}",
+            )
+
+
+if __name__ == "__main__":
+    main()
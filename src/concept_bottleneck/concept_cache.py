@@ -0,0 +1,152 @@
+import functools
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+
+from src.concept_bottleneck.cache import (
+    CACHE_PATH,
+    hash_config,
+    hash_file,
+    load_or_build_array,
+)
+from src.concept_bottleneck.dataset import (
+    DATA_PATH,
+    DEFAULT_IMAGE_TRANSFORM,
+    NUM_ATTRIBUTES,
+    CUB200ImageToAttributes,
+    download_and_extract,
+    load_image_class_labels,
+    load_train_test_split,
+)
+from src.concept_bottleneck.inference import (
+    INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+    ModelLoader,
+    load_image_to_attributes_model,
+)
+from src.concept_bottleneck.train import MODEL_PATH
+
+
+class CUB200CachedConceptsToClass(Dataset[tuple[npt.NDArray[np.float32], np.int_]]):
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        train: bool,
+        model_name: str = INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+        download: bool = True,
+        transform: typing.Callable[
+            [Image.Image], torch.Tensor
+        ] = DEFAULT_IMAGE_TRANSFORM,
+        batch_size: int = 64,
+        num_workers: int = 2,
+        load_model: ModelLoader | None = None,
+        model_path: pathlib.Path = MODEL_PATH,
+        data_path: pathlib.Path = DATA_PATH,
+    ):
+        super().__init__()
+        if download:
+            download_and_extract()
+
+        concept_logits = load_concept_logits(
+            model_name,
+            train,
+            transform=transform,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            load_model=load_model,
+            model_path=model_path,
+            data_path=data_path,
+        )
+        # The whole split fits in a few MB, so the sigmoid is applied once here
+        # instead of on every item.
+        self.concept_probabilities = (1 / (1 + np.exp(-concept_logits))).astype(
+            np.float32
+        )
+
+        train_test_split = load_train_test_split(data_path)
+        self.image_class_labels = load_image_class_labels(data_path)[
+            train_test_split == train
+        ]
+
+        assert len(self.concept_probabilities) == len(self.image_class_labels)
+
+    def __len__(self):
+        return len(self.image_class_labels)
+
+    def __getitem__(self, idx: int) -> tuple[npt.NDArray[np.float32], np.int_]:
+        return (
+            self.concept_probabilities[idx],
+            self.image_class_labels[idx] - 1,  # convert from 1-indexed to 0-indexed
+        )
+
+
+def load_concept_logits(  # pylint: disable=too-many-arguments
+    model_name: str,
+    train: bool,
+    transform: typing.Callable[[Image.Image], torch.Tensor] = DEFAULT_IMAGE_TRANSFORM,
+    batch_size: int = 64,
+    num_workers: int = 2,
+    device: str | None = None,
+    load_model: ModelLoader | None = None,
+    model_path: pathlib.Path = MODEL_PATH,
+    data_path: pathlib.Path = DATA_PATH,
+) -> npt.NDArray[np.float32]:
+    # The logits are cached next to the dataset, in CACHE_PATH for the archive,
+    # and keyed by the checkpoint contents, the split and the transform.
+    key = "-".join(
+        (
+            hash_file(model_path / model_name),
+            "train" if train else "test",
+            hash_config(transform),
+        )
+    )
+    filepath = data_path.parent / CACHE_PATH.name / f"concept_logits-{key}.npy"
+    load_model = load_model or functools.partial(
+        load_image_to_attributes_model, model_path=model_path
+    )
+
+    def build(array: npt.NDArray[np.float32]):
+        dataset = CUB200ImageToAttributes(
+            train, download=False, transform=transform, data_path=data_path
+        )
+        dataloader = DataLoader(dataset, batch_size=batch_size, num_workers=num_workers)
+        compute_concept_logits(
+            load_model(
+                model_name,
+                device or ("cuda" if torch.cuda.is_available() else "cpu"),
+            ),
+            dataloader,
+            array,
+        )
+
+    return load_or_build_array(
+        filepath,
+        (get_split_size(train, data_path), NUM_ATTRIBUTES),
+        np.float32,
+        build,
+    )
+
+
+def compute_concept_logits(
+    model: torch.nn.Module,
+    dataloader: DataLoader[tuple[torch.Tensor, typing.Any]],
+    out: npt.NDArray[np.float32],
+):
+    model.eval()
+    device = next(model.parameters()).device
+
+    start = 0
+    with torch.inference_mode():
+        for x, _ in dataloader:
+            logits = model(x.to(device))
+            out[start : start + len(logits)] = logits.cpu().numpy()
+            start += len(logits)
+
+    assert start == len(out)
+
+
+def get_split_size(train: bool, data_path: pathlib.Path = DATA_PATH) -> int:
+    return int(np.count_nonzero(load_train_test_split(data_path) == train))
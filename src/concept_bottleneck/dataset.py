@@ -1,3 +1,4 @@
+import functools
 import os
 import pathlib
 import typing
@@ -6,11 +7,18 @@ import numpy as np
 import numpy.typing as npt
 import torch
 from PIL import Image
-from torch.utils.data import Dataset
+from torch.utils.data import DataLoader, Dataset
 from torchvision import transforms
 from torchvision.datasets.folder import pil_loader
 from torchvision.datasets.utils import download_and_extract_archive
 
+from src.concept_bottleneck.cache import (
+    CACHE_PATH,
+    atomic_write,
+    hash_config,
+    load_or_build_array,
+)
+
 URL = "https://data.caltech.edu/records/65de6-vp158/files/CUB_200_2011.tgz"
 MD5 = "97eceeb196236b17998738112f37df78"
 ROOT = pathlib.Path(__file__).parent.resolve() / "data"
@@ -32,29 +40,70 @@ DEFAULT_IMAGE_TRANSFORM = transforms.Compose(
     ]
 )
 
+# The deterministic part of DEFAULT_IMAGE_TRANSFORM. Its uint8 output is what
+# the preprocessed image store keeps on disk.
+PREPROCESS_IMAGE_TRANSFORM = transforms.Compose(
+    [
+        transforms.Resize(299),
+        transforms.CenterCrop(299),
+        transforms.PILToTensor(),
+    ]
+)
+
+NORMALIZE_IMAGE_TRANSFORM = transforms.Normalize(
+    mean=[0.485, 0.456, 0.406],
+    std=[0.229, 0.224, 0.225],
+)
+
+ImageLoader = typing.Callable[[str], Image.Image]
+
+
+def draft_loader(file: str | typing.BinaryIO, size: int = 299) -> Image.Image:
+    # A drop-in replacement for pil_loader in front of DEFAULT_IMAGE_TRANSFORM.
+    # libjpeg decodes at 1/2, 1/4 or 1/8 scale in the DCT domain as long as the
+    # shorter side stays at least `size`, so large photos are not decoded at
+    # full resolution only to be shrunk by Resize. The result differs from
+    # pil_loader by a few intensity levels. Not meant for random crops, which
+    # would upsample the reduced image.
+    with Image.open(file) as image:
+        image.draft("RGB", (size, size))
+        return image.convert("RGB")
+
 
 class CUB200ImageToAttributes(Dataset[tuple[torch.Tensor, npt.NDArray[np.float32]]]):
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         train: bool,
         download: bool = True,
         transform: typing.Callable[
             [Image.Image], torch.Tensor
         ] = DEFAULT_IMAGE_TRANSFORM,
+        preprocessed: bool = False,
+        loader: ImageLoader = pil_loader,
+        data_path: pathlib.Path = DATA_PATH,
     ):
         super().__init__()
         self.transform = transform
+        self.loader = loader
+        self.data_path = data_path
 
         if download:
             download_and_extract()
 
-        train_test_split = load_train_test_split()
+        self.preprocessed_images = (
+            _get_preprocessed_images(transform, loader, data_path)
+            if preprocessed
+            else None
+        )
+
+        train_test_split = load_train_test_split(data_path)
+        self.image_ids = np.flatnonzero(train_test_split == train)
         self.image_paths = tuple(
             path
-            for is_train, path in zip(train_test_split, load_image_paths())
+            for is_train, path in zip(train_test_split, load_image_paths(data_path))
             if is_train == train
         )
-        self.image_attribute_labels = load_image_attribute_labels()[
+        self.image_attribute_labels = load_image_attribute_labels(data_path)[
             train_test_split == train
         ]
 
@@ -64,22 +113,29 @@ class CUB200ImageToAttributes(Dataset[tuple[torch.Tensor, npt.NDArray[np.float32
         return len(self.image_paths)
 
     def __getitem__(self, idx: int) -> tuple[torch.Tensor, npt.NDArray[np.float32]]:
-        image_path = DATA_PATH / "images" / self.image_paths[idx]
-        image = pil_loader(str(image_path))
+        if self.preprocessed_images is not None:
+            image = self.preprocessed_images[self.image_ids[idx]]
+        else:
+            image_path = self.data_path / "images" / self.image_paths[idx]
+            image = self.transform(self.loader(str(image_path)))
 
         attributes = self.image_attribute_labels[idx]
-        return self.transform(image), attributes
+        return image, attributes
 
 
 class CUB200AttributesToClass(Dataset[tuple[npt.NDArray[np.float32], np.int_]]):
-    def __init__(self, train: bool, download: bool = True):
+    def __init__(
+        self, train: bool, download: bool = True, data_path: pathlib.Path = DATA_PATH
+    ):
         super().__init__()
         if download:
             download_and_extract()
 
-        train_test_split = load_train_test_split()
-        self.image_class_labels = load_image_class_labels()[train_test_split == train]
-        self.image_attribute_labels = load_image_attribute_labels()[
+        train_test_split = load_train_test_split(data_path)
+        self.image_class_labels = load_image_class_labels(data_path)[
+            train_test_split == train
+        ]
+        self.image_attribute_labels = load_image_attribute_labels(data_path)[
             train_test_split == train
         ]
 
@@ -94,27 +150,41 @@ class CUB200AttributesToClass(Dataset[tuple[npt.NDArray[np.float32], np.int_]]):
 
 
 class CUB200ImageToClass(Dataset[tuple[torch.Tensor, np.int_]]):
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         train: bool,
         download: bool = True,
         transform: typing.Callable[
             [Image.Image], torch.Tensor
         ] = DEFAULT_IMAGE_TRANSFORM,
+        preprocessed: bool = False,
+        loader: ImageLoader = pil_loader,
+        data_path: pathlib.Path = DATA_PATH,
     ):
         super().__init__()
         self.transform = transform
+        self.loader = loader
+        self.data_path = data_path
 
         if download:
             download_and_extract()
 
-        train_test_split = load_train_test_split()
+        self.preprocessed_images = (
+            _get_preprocessed_images(transform, loader, data_path)
+            if preprocessed
+            else None
+        )
+
+        train_test_split = load_train_test_split(data_path)
+        self.image_ids = np.flatnonzero(train_test_split == train)
         self.image_paths = tuple(
             path
-            for is_train, path in zip(train_test_split, load_image_paths())
+            for is_train, path in zip(train_test_split, load_image_paths(data_path))
             if is_train == train
         )
-        self.image_class_labels = load_image_class_labels()[train_test_split == train]
+        self.image_class_labels = load_image_class_labels(data_path)[
+            train_test_split == train
+        ]
 
         assert len(self.image_paths) == len(self.image_class_labels)
 
@@ -122,72 +192,237 @@ class CUB200ImageToClass(Dataset[tuple[torch.Tensor, np.int_]]):
         return len(self.image_class_labels)
 
     def __getitem__(self, idx: int) -> tuple[torch.Tensor, np.int_]:
-        image_path = DATA_PATH / "images" / self.image_paths[idx]
-        image = pil_loader(str(image_path))
+        if self.preprocessed_images is not None:
+            image = self.preprocessed_images[self.image_ids[idx]]
+        else:
+            image_path = self.data_path / "images" / self.image_paths[idx]
+            image = self.transform(self.loader(str(image_path)))
 
         return (
-            self.transform(image),
+            image,
             self.image_class_labels[idx] - 1,
         )  # convert from 1-indexed to 0-indexed
 
 
+# Resized and cropped images of the whole archive, stored once per transform as
+# one uint8 array. Items are not normalized; batches should go through
+# `normalize_image_batch` or `collate_preprocessed_images`.
+class PreprocessedImages:
+    def __init__(
+        self,
+        transform: typing.Callable[
+            [Image.Image], torch.Tensor
+        ] = PREPROCESS_IMAGE_TRANSFORM,
+    ):
+        self.filepath = build_preprocessed_images(transform)
+        self._images: npt.NDArray[np.uint8] | None = None
+
+    def __getitem__(self, image_id: int) -> torch.Tensor:
+        # The memory map is opened lazily so that DataLoader workers each open
+        # their own instead of receiving a pickled copy of the whole array.
+        images = self._images
+        if images is None:
+            images = self._images = typing.cast(
+                npt.NDArray[np.uint8], np.load(self.filepath, mmap_mode="r")
+            )
+        return torch.from_numpy(np.array(images[image_id]))
+
+    def __getstate__(self):
+        return {**self.__dict__, "_images": None}
+
+
+def _get_preprocessed_images(
+    transform: typing.Callable[[Image.Image], torch.Tensor],
+    loader: ImageLoader,
+    data_path: pathlib.Path,
+):
+    if (
+        transform is not DEFAULT_IMAGE_TRANSFORM
+        or loader is not pil_loader
+        or data_path != DATA_PATH
+    ):
+        raise ValueError(
+            "Preprocessed images are only available for DEFAULT_IMAGE_TRANSFORM, "
+            "pil_loader and the archive."
+        )
+    return PreprocessedImages()
+
+
+class _ArchiveImages(Dataset[torch.Tensor]):
+    def __init__(self, transform: typing.Callable[[Image.Image], torch.Tensor]):
+        super().__init__()
+        self.transform = transform
+        self.image_paths = load_image_paths()
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, idx: int) -> torch.Tensor:
+        image_path = DATA_PATH / "images" / self.image_paths[idx]
+        return self.transform(pil_loader(str(image_path)))
+
+
+def build_preprocessed_images(
+    transform: typing.Callable[
+        [Image.Image], torch.Tensor
+    ] = PREPROCESS_IMAGE_TRANSFORM,
+    batch_size: int = 64,
+    num_workers: int = 2,
+):
+    filepath = CACHE_PATH / f"images-{hash_config(transform)}.npy"
+    if filepath.exists():
+        return filepath
+
+    images = _ArchiveImages(transform)
+    sample = images[0]
+    if sample.dtype != torch.uint8:
+        raise ValueError(
+            "Preprocessed images must be uint8 tensors from a deterministic transform."
+        )
+
+    def build(array: npt.NDArray[np.uint8]):
+        dataloader = DataLoader(images, batch_size=batch_size, num_workers=num_workers)
+        start = 0
+        for batch in dataloader:
+            array[start : start + len(batch)] = batch.numpy()
+            start += len(batch)
+
+    load_or_build_array(filepath, (len(images), *sample.shape), np.uint8, build)
+    return filepath
+
+
+def normalize_image_batch(images: torch.Tensor) -> torch.Tensor:
+    return NORMALIZE_IMAGE_TRANSFORM(images.float().div_(255))
+
+
+def collate_preprocessed_images(
+    batch: list[tuple[torch.Tensor, typing.Any]]
+) -> tuple[torch.Tensor, typing.Any]:
+    images, labels = typing.cast(
+        tuple[torch.Tensor, typing.Any], torch.utils.data.default_collate(batch)
+    )
+    return normalize_image_batch(images), labels
+
+
 def download_and_extract():
     if not (DATA_PATH / "images").exists():
         download_and_extract_archive(url=URL, download_root=str(ROOT), md5=MD5)
 
 
-def load_train_test_split():
-    filepath = DATA_PATH / "train_test_split.txt"
-    return np.loadtxt(filepath, usecols=1, dtype=np.int_)
+def load_train_test_split(data_path: pathlib.Path = DATA_PATH):
+    return load_metadata(data_path)["train_test_split"]
+
+
+def load_image_attribute_labels(data_path: pathlib.Path = DATA_PATH):
+    return load_metadata(data_path)["image_attribute_labels"]
 
 
-def load_image_attribute_labels():
-    filepath = DATA_PATH / "attributes" / "image_attribute_labels.txt"
-    data = np.loadtxt(filepath, usecols=(2, 3), dtype=np.int_)
-    labels = calibrate_image_attribute_labels(data[:, 0], data[:, 1])
-    return labels.reshape((NUM_IMAGES, NUM_ATTRIBUTES))
+# Calibrate labels according to certainty, indexed by [label, certainty]:
+# 1: not visible, 2: guessing, 3: probably, 4: definitely
+# Certainty 0 does not exist and maps to NaN.
+CALIBRATION_TABLE = np.array(
+    [
+        [np.nan, 0, 0, 0, 0],
+        [np.nan, 1, 1, 1, 1],
+    ],
+    dtype=np.float32,
+)
 
 
 def calibrate_image_attribute_labels(
     labels: npt.NDArray[np.int_], certainties: npt.NDArray[np.int_]
-):
-    # Calibrate labels according to certainty:
-    # 1: not visible, 2: guessing, 3: probably, 4: definitely
-    convert_map = {
-        0: {1: 0, 2: 0, 3: 0, 4: 0},
-        1: {1: 1, 2: 1, 3: 1, 4: 1},
-    }
+) -> npt.NDArray[np.float32]:
+    assert np.all((0 <= CALIBRATION_TABLE[0, 1:]) & (CALIBRATION_TABLE[0, 1:] < 0.5))
+    assert np.all((0.5 <= CALIBRATION_TABLE[1, 1:]) & (CALIBRATION_TABLE[1, 1:] <= 1))
+    # Certainty 0 would silently calibrate to NaN.
+    assert np.all((1 <= certainties) & (certainties < CALIBRATION_TABLE.shape[1]))
 
-    assert all(0 <= converted < 0.5 for converted in convert_map[0].values())
-    assert all(0.5 <= converted <= 1 for converted in convert_map[1].values())
+    return CALIBRATION_TABLE[labels, certainties]
 
-    return np.fromiter(
-        (
-            convert_map[label][certainty]
-            for label, certainty in zip(labels, certainties)
-        ),
-        dtype=np.float32,
+
+def load_image_paths(data_path: pathlib.Path = DATA_PATH) -> list[str]:
+    return load_metadata(data_path)["image_paths"].tolist()
+
+
+def load_image_class_labels(data_path: pathlib.Path = DATA_PATH):
+    return load_metadata(data_path)["image_class_labels"]
+
+
+METADATA_FILES = (
+    "images.txt",
+    "train_test_split.txt",
+    "image_class_labels.txt",
+    "attributes/image_attribute_labels.txt",
+)
+
+
+def load_metadata(
+    data_path: pathlib.Path = DATA_PATH,
+) -> dict[str, npt.NDArray[typing.Any]]:
+    # The index is keyed by the size and modification time of the source files,
+    # so it is rebuilt whenever one of them changes.
+    stats = tuple((data_path / name).stat() for name in METADATA_FILES)
+    key = hash_config(
+        str(data_path), tuple((stat.st_size, stat.st_mtime_ns) for stat in stats)
     )
+    return _load_metadata(key, data_path)
 
 
-def load_image_paths():
-    filepath = DATA_PATH / "images.txt"
-    with open(filepath, encoding="utf-8") as f:
-        return [line.split()[1] for line in f.readlines()]
+@functools.lru_cache(maxsize=1)
+def _load_metadata(
+    key: str, data_path: pathlib.Path
+) -> dict[str, npt.NDArray[typing.Any]]:
+    # The index is cached next to the dataset, in CACHE_PATH for the archive.
+    filepath = data_path.parent / CACHE_PATH.name / f"metadata-{key}.npz"
 
+    if not filepath.exists():
+        with atomic_write(filepath) as temp_filepath, open(temp_filepath, "wb") as f:
+            np.savez(f, **typing.cast(dict[str, typing.Any], parse_metadata(data_path)))
 
-def load_image_class_labels():
-    filepath = DATA_PATH / "image_class_labels.txt"
-    return np.loadtxt(filepath, usecols=1, dtype=np.int_)
+    with np.load(filepath) as data:
+        metadata = {name: data[name] for name in data.files}
 
+    # The arrays are shared by every caller in the process.
+    for array in metadata.values():
+        array.setflags(write=False)
+    return metadata
 
-def load_attribute_names():
-    filepath = DATA_PATH.parent / "attributes.txt"
-    with open(filepath, encoding="utf-8") as f:
-        return [line.split()[1] for line in f.readlines()]
+
+def parse_metadata(
+    data_path: pathlib.Path = DATA_PATH,
+) -> dict[str, npt.NDArray[typing.Any]]:
+    with open(data_path / "images.txt", encoding="utf-8") as f:
+        image_paths = np.array([line.split()[1] for line in f.readlines()])
+
+    image_attribute_labels = np.loadtxt(
+        data_path / "attributes" / "image_attribute_labels.txt",
+        usecols=(2, 3),
+        dtype=np.int_,
+    )
+
+    return {
+        "image_paths": image_paths,
+        "train_test_split": np.loadtxt(
+            data_path / "train_test_split.txt", usecols=1, dtype=np.int_
+        ),
+        "image_class_labels": np.loadtxt(
+            data_path / "image_class_labels.txt", usecols=1, dtype=np.int_
+        ),
+        "image_attribute_labels": calibrate_image_attribute_labels(
+            image_attribute_labels[:, 0], image_attribute_labels[:, 1]
+        ).reshape((len(image_paths), NUM_ATTRIBUTES)),
+    }
+
+
+def load_attribute_names(data_path: pathlib.Path = DATA_PATH):
+    return list(_load_names(data_path.parent / "attributes.txt"))
+
+
+def load_class_names(data_path: pathlib.Path = DATA_PATH):
+    return list(_load_names(data_path / "classes.txt"))
 
 
-def load_class_names():
-    filepath = DATA_PATH / "classes.txt"
+@functools.lru_cache(maxsize=None)
+def _load_names(filepath: pathlib.Path) -> tuple[str, ...]:
     with open(filepath, encoding="utf-8") as f:
-        return [line.split()[1] for line in f.readlines()]
+        return tuple(line.split()[1] for line in f.readlines())
@@ -0,0 +1,344 @@
+import argparse
+import contextlib
+import os
+import typing
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler, RandomSampler, Subset
+
+from src.concept_bottleneck.checkpoint import (
+    CHECKPOINT_PATH,
+    Checkpointing,
+    CheckpointManager,
+)
+from src.concept_bottleneck.dataset import CUB200ImageToClass
+from src.concept_bottleneck.engine import (
+    TrainingEngine,
+    enable_activation_checkpointing,
+)
+from src.concept_bottleneck.inference import (
+    JOINT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+)
+from src.concept_bottleneck.networks import JointImageToClass
+from src.concept_bottleneck.train import (
+    LOG_PATH,
+    MODEL_PATH,
+    TestFn,
+    TrainingMonitor,
+    run_epochs,
+)
+
+# Unlike TrainFn, the training function gets the dataloader of its process,
+# which only holds its share of the training set.
+DistributedTrainFn = typing.Callable[
+    [torch.nn.Module, DataLoader[typing.Any]], tuple[float, float] | None
+]
+
+M = typing.TypeVar("M", bound=torch.nn.Module)
+T = typing.TypeVar("T")
+
+
+class DistributedDataLoader(typing.Generic[T]):
+    # Each process iterates over a disjoint shard of the dataset. `dataset` is
+    # the shard, so that the train and test functions compute their metrics
+    # over the samples they have actually seen.
+    def __init__(self, dataloader: DataLoader[T], seed: int = 0):
+        self.sampler: typing.Iterable[int]
+        if isinstance(dataloader.sampler, RandomSampler):
+            # Reshuffled every pass. Shards are padded to the same length, as
+            # every process has to run the same number of training steps.
+            self.sampler = DistributedSampler(dataloader.dataset, seed=seed)
+        else:
+            # Unpadded, so that evaluations count every sample exactly once.
+            self.sampler = range(
+                dist.get_rank(), len(dataloader.dataset), dist.get_world_size()  # type: ignore
+            )
+        self.dataloader = DataLoader(
+            dataloader.dataset,
+            batch_size=dataloader.batch_size,
+            sampler=self.sampler,
+            num_workers=dataloader.num_workers,
+            collate_fn=dataloader.collate_fn,
+            pin_memory=dataloader.pin_memory,
+            drop_last=dataloader.drop_last,
+        )
+        self.epoch = 0
+
+    @property
+    def dataset(self) -> Subset[T]:
+        return Subset(self.dataloader.dataset, list(self.sampler))
+
+    def __len__(self):
+        return len(self.dataloader)
+
+    def __iter__(self) -> typing.Iterator[T]:
+        if isinstance(self.sampler, DistributedSampler):
+            self.sampler.set_epoch(self.epoch)
+            self.epoch += 1
+        return iter(self.dataloader)
+
+
+def is_main_process():
+    return not dist.is_initialized() or dist.get_rank() == 0
+
+
+def all_reduce_metrics(
+    metrics: tuple[float, float] | None, num_samples: int
+) -> tuple[float, float] | None:
+    # Averages the loss and accuracy of every process, weighted by the number
+    # of samples each of them has seen. Every process gets the same result, so
+    # they all take the same early stopping decision.
+    if metrics is None:
+        return None
+    loss, accuracy = metrics
+    totals = torch.tensor(
+        [loss * num_samples, accuracy * num_samples, num_samples],
+        dtype=torch.float64,
+    )
+    dist.all_reduce(totals)
+    return (totals[0] / totals[2]).item(), (totals[1] / totals[2]).item()
+
+
+def broadcast_buffers(model: torch.nn.Module):
+    # DistributedDataParallel only broadcasts the buffers of the first process
+    # before each training forward, so the BatchNorm running statistics updated
+    # by the last training step still differ between processes. The test
+    # function evaluates the unwrapped model, which DDP never synchronizes.
+    for buffer in model.buffers():
+        dist.broadcast(buffer, src=0)
+
+
+def run_distributed_epochs(  # pylint: disable=too-many-arguments
+    epochs: int,
+    model: M,
+    train: DistributedTrainFn,
+    test: TestFn,
+    training_dataloader: DataLoader[typing.Any],
+    test_dataloader: DataLoader[typing.Any],
+    on_better_accuracy: typing.Callable[[M, float], None],
+    monitor: TrainingMonitor | None = None,
+    checkpointing: Checkpointing | None = None,
+    **kwargs: typing.Any,
+):
+    # Runs `run_epochs` in every process of the initialized process group.
+    # Gradients are all-reduced by DistributedDataParallel, while the model
+    # files, checkpoints and logs are only written by the first process.
+    # Resuming reads `checkpointing.resume_from` in every process, so across
+    # hosts it has to be on a shared filesystem.
+    ddp_model = DistributedDataParallel(model)
+    distributed_training_dataloader = DistributedDataLoader(training_dataloader)
+    num_training_samples = len(distributed_training_dataloader.dataset)
+    # The distributed dataloaders stand in for the DataLoaders they wrap.
+    training_loader = typing.cast(
+        DataLoader[typing.Any], distributed_training_dataloader
+    )
+    test_loader = typing.cast(
+        DataLoader[typing.Any], DistributedDataLoader(test_dataloader)
+    )
+
+    main_process = is_main_process()
+    checkpointing = checkpointing or Checkpointing()
+    monitor = monitor if main_process else None
+    if monitor is not None:
+        training_loader = monitor.instrument(training_loader)
+        test_loader = monitor.instrument(test_loader)
+
+    def train_fn(_: torch.nn.Module):
+        metrics = train(ddp_model, training_loader)  # type: ignore
+        return all_reduce_metrics(metrics, num_training_samples)
+
+    def test_fn(model: torch.nn.Module, dataloader: DataLoader[typing.Any]):
+        broadcast_buffers(model)
+        return all_reduce_metrics(test(model, dataloader), len(dataloader.dataset))  # type: ignore
+
+    def on_better_accuracy_fn(model: M, accuracy: float):
+        if main_process:
+            on_better_accuracy(model, accuracy)
+
+    return run_epochs(
+        epochs,
+        model,
+        train_fn,
+        test_fn,  # type: ignore
+        training_loader,  # type: ignore
+        test_loader,  # type: ignore
+        on_better_accuracy_fn,
+        monitor=monitor,
+        checkpointing=(
+            checkpointing if main_process else checkpointing._replace(manager=None)
+        ),
+        **kwargs,
+    )
+
+
+def launch(  # pylint: disable=too-many-arguments
+    worker: typing.Callable[..., None],
+    args: tuple[typing.Any, ...] = (),
+    nprocs: int = 1,
+    num_nodes: int = 1,
+    node_rank: int = 0,
+    master_addr: str = "127.0.0.1",
+    master_port: int = 29500,
+):
+    # Spawns `nprocs` processes on this host, each calling `worker(*args)`
+    # inside a gloo process group of `nprocs * num_nodes` processes. For
+    # several hosts, run it on each of them with its own `node_rank` and the
+    # address of the host with node rank 0. `worker` has to be importable,
+    # so it cannot be defined in a notebook.
+    mp.spawn(  # type: ignore
+        _run_worker,
+        args=(worker, args, nprocs, num_nodes, node_rank, master_addr, master_port),
+        nprocs=nprocs,
+    )
+
+
+def _run_worker(  # pylint: disable=too-many-arguments
+    local_rank: int,
+    worker: typing.Callable[..., None],
+    args: tuple[typing.Any, ...],
+    nprocs: int,
+    num_nodes: int,
+    node_rank: int,
+    master_addr: str,
+    master_port: int,
+):
+    # Splits the cores of the host between its processes instead of letting
+    # each of them start a thread per core.
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // nprocs))
+    dist.init_process_group(
+        "gloo",
+        init_method=f"tcp://{master_addr}:{master_port}",
+        rank=node_rank * nprocs + local_rank,
+        world_size=num_nodes * nprocs,
+    )
+    try:
+        if is_main_process():
+            worker(*args)
+        else:
+            # Only the first process prints its progress.
+            with open(os.devnull, "w", encoding="utf-8") as f:
+                with contextlib.redirect_stdout(f):
+                    worker(*args)
+    finally:
+        dist.destroy_process_group()
+
+
+def train_joint_model(  # pylint: disable=too-many-arguments
+    epochs: int,
+    batch_size: int,
+    num_workers: int,
+    learning_rate: float,
+    patience: int | None,
+    resume: bool,
+    micro_batch_size: int | None = None,
+    mixed_precision: bool = False,
+    activation_checkpointing: bool = False,
+):
+    # The distributed counterpart of joint_image_to_class.ipynb. The batch size
+    # is per process, so the effective batch size grows with the world size.
+
+    # The first process downloads the dataset and builds the metadata cache.
+    if not is_main_process():
+        dist.barrier()
+    training_data = CUB200ImageToClass(train=True)
+    test_data = CUB200ImageToClass(train=False)
+    if is_main_process():
+        dist.barrier()
+
+    training_dataloader = DataLoader(
+        training_data, batch_size=batch_size, num_workers=num_workers, shuffle=True
+    )
+    test_dataloader = DataLoader(
+        test_data, batch_size=batch_size, num_workers=num_workers
+    )
+
+    # Every process starts from the same weights, as DistributedDataParallel
+    # broadcasts them from the first one.
+    model = JointImageToClass()
+    if activation_checkpointing:
+        enable_activation_checkpointing(model)
+    optimizer = torch.optim.SGD(model.parameters(), lr=learning_rate, momentum=0.9)
+    engine = TrainingEngine(
+        optimizer,
+        "class",
+        micro_batch_size=micro_batch_size,
+        mixed_precision=mixed_precision,
+        log_every=100,
+    )
+    checkpoints = CheckpointManager(CHECKPOINT_PATH / "joint_image_to_class")
+
+    def on_better_accuracy(model: JointImageToClass, accuracy: float):
+        print(f"Saving models with accuracy {100 * accuracy:>0.4f}%")
+        checkpoints.write(
+            MODEL_PATH / JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+            model.inception.state_dict(),
+        )
+        checkpoints.write(
+            MODEL_PATH / JOINT_ATTRIBUTES_TO_CLASS_MODEL_NAME, model.mlp.state_dict()
+        )
+
+    run_distributed_epochs(
+        epochs,
+        model,
+        engine.train,
+        engine.test,
+        training_dataloader,
+        test_dataloader,
+        on_better_accuracy,
+        monitor=TrainingMonitor(
+            log_path=LOG_PATH / "joint_image_to_class_distributed.jsonl"
+        ),
+        checkpointing=Checkpointing(
+            checkpoints, optimizer, checkpoints.latest() if resume else None
+        ),
+        patience=patience,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train the joint model with data-parallel CPU processes."
+    )
+    parser.add_argument("--nprocs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--num-nodes", type=int, default=1)
+    parser.add_argument("--node-rank", type=int, default=0)
+    parser.add_argument("--master-addr", default="127.0.0.1")
+    parser.add_argument("--master-port", type=int, default=29500)
+    parser.add_argument("--epochs", type=int, default=150)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--num-workers", type=int, default=2)
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument("--patience", type=int, default=20)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--micro-batch-size", type=int, default=None)
+    parser.add_argument("--mixed-precision", action="store_true")
+    parser.add_argument("--activation-checkpointing", action="store_true")
+    args = parser.parse_args()
+
+    launch(
+        train_joint_model,
+        (
+            args.epochs,
+            args.batch_size,
+            args.num_workers,
+            args.learning_rate,
+            args.patience,
+            args.resume,
+            args.micro_batch_size,
+            args.mixed_precision,
+            args.activation_checkpointing,
+        ),
+        nprocs=args.nprocs,
+        num_nodes=args.num_nodes,
+        node_rank=args.node_rank,
+        master_addr=args.master_addr,
+        master_port=args.master_port,
+    )
+
+
+if __name__ == "__main__":
+    main()
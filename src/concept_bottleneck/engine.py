@@ -0,0 +1,232 @@
+import contextlib
+import typing
+
+import torch
+import torch.utils.checkpoint
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader
+from torchvision.models import Inception3
+
+# "attributes" trains multi-label concept logits, "class" trains class logits.
+Task = typing.Literal["attributes", "class"]
+
+INCEPTION_BLOCK_NAMES = (
+    "Mixed_5b",
+    "Mixed_5c",
+    "Mixed_5d",
+    "Mixed_6a",
+    "Mixed_6b",
+    "Mixed_6c",
+    "Mixed_6d",
+    "Mixed_6e",
+    "Mixed_7a",
+    "Mixed_7b",
+    "Mixed_7c",
+)
+
+
+class TrainingEngine:  # pylint: disable=too-many-instance-attributes
+    # The train and test loops shared by the independent, sequential and joint
+    # notebooks. `train` and `test` have the signature of the notebooks' train
+    # and test functions minus the arguments kept here, so they fit TestFn and
+    # DistributedTrainFn directly.
+    #
+    # Each batch from the dataloader is one optimizer step. It is split into
+    # chunks of at most `micro_batch_size` samples whose gradients are
+    # accumulated, which caps the activation memory independently of the
+    # effective batch size. Metrics stay on the device until the end of the
+    # epoch, and so does the running loss recorded every `log_every` steps,
+    # which is printed then instead of waiting for the device at every log.
+    # `mixed_precision` runs the forward pass under bf16 autocast, which is
+    # fast on CPUs with AVX-512 BF16 or AMX.
+    #
+    # For the attributes task, `test` also prints the total accuracy, the
+    # share of images whose 312 attributes are all correct.
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        optimizer: torch.optim.Optimizer,
+        task: Task,
+        device: str = "cpu",
+        micro_batch_size: int | None = None,
+        mixed_precision: bool = False,
+        aux_loss_weight: float = 0.4,
+        log_every: int | None = None,
+    ):
+        self.optimizer = optimizer
+        self.task = task
+        self.device = device
+        self.micro_batch_size = micro_batch_size
+        self.mixed_precision = mixed_precision
+        self.aux_loss_weight = aux_loss_weight
+        self.log_every = log_every
+
+        self.loss_fn = (
+            torch.nn.BCEWithLogitsLoss()
+            if task == "attributes"
+            else torch.nn.CrossEntropyLoss()
+        )
+
+    def train(  # pylint: disable=too-many-locals
+        self, model: torch.nn.Module, dataloader: DataLoader[typing.Any]
+    ):
+        model.train()
+        size = len(dataloader.dataset)  # type: ignore
+        total_loss = torch.zeros((), device=self.device)
+        correct = torch.zeros((), device=self.device)
+        seen = 0
+        progress: list[tuple[int, torch.Tensor]] = []
+
+        for step, (x, y) in enumerate(dataloader):
+            x = x.to(self.device)
+            y = y.to(self.device)
+
+            self.optimizer.zero_grad()
+            chunks = self._split(x, y)
+            for i, (x_chunk, y_chunk) in enumerate(chunks):
+                # Gradients are only all-reduced after the last chunk.
+                with self._no_sync(model, i < len(chunks) - 1):
+                    with self._autocast():
+                        outputs = model(x_chunk)
+                    logits, loss = self._compute_loss(outputs, y_chunk)
+                    # Weighted so that the accumulated gradient is the one of
+                    # the mean loss over the whole batch.
+                    (loss * len(x_chunk) / len(x)).backward()
+
+                total_loss += loss.detach() * len(x_chunk)
+                correct += self._count_correct(logits.detach(), y_chunk)
+            self.optimizer.step()
+            seen += len(x)
+
+            if self.log_every is not None and step % self.log_every == 0:
+                progress.append((seen, total_loss / seen))
+
+        # A single device sync for the metrics and the progress of the epoch.
+        metrics = typing.cast(
+            list[float],
+            torch.stack(
+                [total_loss, correct, *(running_loss for _, running_loss in progress)]
+            ).tolist(),
+        )
+        for (seen, _), running_loss in zip(progress, metrics[2:]):
+            print(f"loss: {running_loss:>7f} [{seen:>5d}/{size:>5d}]")
+        return metrics[0] / size, metrics[1] / size
+
+    def test(self, model: torch.nn.Module, dataloader: DataLoader[typing.Any]):
+        model.eval()
+        size = len(dataloader.dataset)  # type: ignore
+        total_loss = torch.zeros((), device=self.device)
+        correct = torch.zeros((), device=self.device)
+        all_correct = torch.zeros((), device=self.device)
+
+        with torch.inference_mode():
+            for x, y in dataloader:
+                x = x.to(self.device)
+                y = y.to(self.device)
+
+                with self._autocast():
+                    outputs = model(x)
+                logits, loss = self._compute_loss(outputs, y)
+                total_loss += loss * len(x)
+                correct += self._count_correct(logits, y)
+                if self.task == "attributes":
+                    all_correct += ((logits >= 0) == (y >= 0.5)).all(dim=1).sum()
+
+        loss, num_correct, num_all_correct = typing.cast(
+            list[float], torch.stack([total_loss, correct, all_correct]).tolist()
+        )
+        if self.task == "attributes":
+            print(f"Total accuracy: {100 * num_all_correct / size:>0.4f}%")
+        return loss / size, num_correct / size
+
+    def _split(self, x: torch.Tensor, y: torch.Tensor):
+        if self.micro_batch_size is None or len(x) <= self.micro_batch_size:
+            return [(x, y)]
+        return list(
+            zip(
+                torch.split(x, self.micro_batch_size),
+                torch.split(y, self.micro_batch_size),
+            )
+        )
+
+    def _autocast(self):
+        return torch.autocast(
+            device_type=torch.device(self.device).type,
+            dtype=torch.bfloat16,
+            enabled=self.mixed_precision,
+        )
+
+    def _no_sync(self, model: torch.nn.Module, no_sync: bool):
+        if no_sync and isinstance(model, DistributedDataParallel):
+            return model.no_sync()
+        return contextlib.nullcontext()
+
+    def _compute_loss(self, outputs: typing.Any, y: torch.Tensor):
+        # Inception returns the auxiliary logits as well while training. The
+        # losses are computed in fp32 even under autocast.
+        if isinstance(outputs, tuple):
+            logits, aux_logits = typing.cast(tuple[torch.Tensor, torch.Tensor], outputs)
+            logits = logits.float()
+            loss = self.loss_fn(logits, y) + self.aux_loss_weight * self.loss_fn(
+                aux_logits.float(), y
+            )
+            return logits, loss
+        logits = typing.cast(torch.Tensor, outputs).float()
+        return logits, self.loss_fn(logits, y)
+
+    def _count_correct(self, logits: torch.Tensor, y: torch.Tensor):
+        if self.task == "attributes":
+            # The fraction of correct attributes, summed over the samples.
+            return ((logits >= 0) == (y >= 0.5)).float().mean(dim=1).sum()
+        return (logits.argmax(dim=1) == y).sum()
+
+
+def enable_activation_checkpointing(model: torch.nn.Module):
+    # Recomputes the activations inside every Inception block during the
+    # backward pass instead of keeping them, trading compute for memory. Only
+    # the block forwards are replaced, so the state dict keys do not change.
+    for module in model.modules():
+        if isinstance(module, Inception3):
+            for name in INCEPTION_BLOCK_NAMES:
+                block = getattr(module, name)
+                block.forward = _get_checkpointed_forward(block, block.forward)
+    return model
+
+
+def _get_checkpointed_forward(
+    block: torch.nn.Module, forward: typing.Callable[[torch.Tensor], torch.Tensor]
+):
+    def checkpointed_forward(x: torch.Tensor):
+        if not (block.training and torch.is_grad_enabled()):
+            return forward(x)
+
+        recomputing = False
+
+        def run(x: torch.Tensor):
+            nonlocal recomputing
+            if not recomputing:
+                recomputing = True
+                return forward(x)
+            # The recomputation must not update the BatchNorm running
+            # statistics a second time.
+            with _preserve_batch_norm_statistics(block):
+                return forward(x)
+
+        return torch.utils.checkpoint.checkpoint(run, x, use_reentrant=False)
+
+    return checkpointed_forward
+
+
+@contextlib.contextmanager
+def _preserve_batch_norm_statistics(module: torch.nn.Module):
+    buffers = [
+        (buffer, buffer.clone())
+        for m in module.modules()
+        if isinstance(m, (torch.nn.BatchNorm1d, torch.nn.BatchNorm2d))
+        for buffer in m.buffers()
+    ]
+    try:
+        yield
+    finally:
+        with torch.no_grad():
+            for buffer, value in buffers:
+                buffer.copy_(value)
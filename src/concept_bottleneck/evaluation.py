@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import pathlib
+import time
+import typing
+
+import torch
+from torch.utils.data import DataLoader
+from torchvision.datasets.folder import pil_loader
+
+from src.concept_bottleneck.backends import BACKENDS, Backend
+from src.concept_bottleneck.dataset import (
+    CUB200ImageToClass,
+    draft_loader,
+    load_attribute_names,
+    load_image_attribute_labels,
+    load_train_test_split,
+)
+from src.concept_bottleneck.inference import (
+    MODEL_TYPE_MAP,
+    ModelType,
+    add_model_types_argument,
+    load_attributes_to_class_model,
+    load_image_to_attributes_model,
+)
+
+
+class EvaluationResult(typing.NamedTuple):
+    model_type: ModelType
+    loss: float
+    class_accuracy: float
+    # The accuracy of each thresholded concept prediction of the backbone.
+    attribute_accuracies: list[float]
+
+
+def group_by_backbone(
+    model_types: typing.Iterable[ModelType],
+) -> dict[str, list[ModelType]]:
+    # The independent and sequential heads both consume the concepts of the
+    # independent image-to-attributes model.
+    groups: dict[str, list[ModelType]] = {}
+    for model_type in model_types:
+        groups.setdefault(MODEL_TYPE_MAP[model_type][0], []).append(model_type)
+    return groups
+
+
+def load_models(
+    model_types: typing.Iterable[ModelType],
+    device: str,
+    backend: Backend = "eager",
+) -> tuple[dict[str, torch.nn.Module], dict[ModelType, torch.nn.Module]]:
+    groups = group_by_backbone(model_types)
+    backbones = {
+        name: load_image_to_attributes_model(name, device, backend) for name in groups
+    }
+    heads: dict[ModelType, torch.nn.Module] = {
+        model_type: load_attributes_to_class_model(
+            MODEL_TYPE_MAP[model_type][1], device
+        )
+        for model_types in groups.values()
+        for model_type in model_types
+    }
+    return backbones, heads
+
+
+def evaluate_models(  # pylint: disable=too-many-arguments,too-many-locals
+    backbones: typing.Mapping[str, torch.nn.Module],
+    heads: typing.Mapping[ModelType, torch.nn.Module],
+    dataloader: DataLoader[tuple[torch.Tensor, typing.Any]],
+    attribute_labels: torch.Tensor,
+    device: str,
+    mixed_precision: bool = False,
+) -> list[EvaluationResult]:
+    # Evaluates every head in one pass over the dataloader, which has to keep
+    # the order of `attribute_labels`. Each backbone runs once per batch and
+    # its concepts are fanned out to all heads that share it. Metrics are
+    # accumulated on the device and only read back at the end. With
+    # `mixed_precision`, the backbones run under bf16 autocast as in
+    # TrainingEngine, and the heads in fp32.
+    groups = group_by_backbone(heads)
+    for model in (*backbones.values(), *heads.values()):
+        model.eval()
+
+    losses = {model_type: torch.zeros((), device=device) for model_type in heads}
+    correct = {model_type: torch.zeros((), device=device) for model_type in heads}
+    attributes_correct = {
+        name: torch.zeros(attribute_labels.shape[1], device=device) for name in groups
+    }
+
+    start = 0
+    with torch.inference_mode():
+        for x, y in dataloader:
+            x, y = x.to(device), y.to(device)
+            attributes = attribute_labels[start : start + len(x)].to(device)
+            start += len(x)
+
+            for name, model_types in groups.items():
+                with torch.autocast(
+                    device_type=torch.device(device).type,
+                    dtype=torch.bfloat16,
+                    enabled=mixed_precision,
+                ):
+                    logits = backbones[name](x).float()
+                attributes_correct[name] += ((logits > 0) == (attributes > 0.5)).sum(0)
+
+                concepts = torch.sigmoid(logits)
+                for model_type in model_types:
+                    class_logits = heads[model_type](concepts)
+                    losses[model_type] += torch.nn.functional.cross_entropy(
+                        class_logits, y, reduction="sum"
+                    )
+                    correct[model_type] += (class_logits.argmax(dim=1) == y).sum()
+
+    assert start == len(attribute_labels)
+
+    return [
+        EvaluationResult(
+            model_type=model_type,
+            loss=losses[model_type].item() / start,
+            class_accuracy=correct[model_type].item() / start,
+            attribute_accuracies=(
+                attributes_correct[MODEL_TYPE_MAP[model_type][0]] / start
+            ).tolist(),
+        )
+        for model_type in heads
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate the concept and class accuracy of every model type "
+        "on the test split in one pass."
+    )
+    add_model_types_argument(parser)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    parser.add_argument("--backend", choices=BACKENDS, default="eager")
+    parser.add_argument("--mixed-precision", action="store_true")
+    parser.add_argument(
+        "--draft-decode",
+        action="store_true",
+        help="decode large JPEG images at a reduced scale",
+    )
+    parser.add_argument("--output", type=pathlib.Path, default=None)
+    args = parser.parse_args()
+
+    dataset = CUB200ImageToClass(
+        train=False, loader=draft_loader if args.draft_decode else pil_loader
+    )
+    dataloader = DataLoader(
+        dataset, batch_size=args.batch_size, num_workers=args.num_workers
+    )
+    attribute_labels = torch.from_numpy(
+        load_image_attribute_labels()[load_train_test_split() == 0]
+    )
+    backbones, heads = load_models(args.model_types, args.device, args.backend)
+
+    start = time.perf_counter()
+    results = evaluate_models(
+        backbones,
+        heads,
+        dataloader,
+        attribute_labels,
+        args.device,
+        mixed_precision=args.mixed_precision,
+    )
+    seconds = time.perf_counter() - start
+
+    for result in results:
+        attribute_accuracy = sum(result.attribute_accuracies) / len(
+            result.attribute_accuracies
+        )
+        print(
+            f"{result.model_type}: Test Loss: {result.loss:.4f},",
+            f"Class Accuracy: {100 * result.class_accuracy:>0.2f}%,",
+            f"Attribute Accuracy: {100 * attribute_accuracy:>0.2f}%",
+        )
+    print(
+        f"Evaluated {len(heads)} models with {len(backbones)} backbones",
+        f"on {len(dataset)} images in {seconds:.2f}s",
+    )
+
+    if args.output is not None:
+        attribute_names = load_attribute_names()
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    {
+                        **result._asdict(),
+                        "attribute_accuracies": dict(
+                            zip(attribute_names, result.attribute_accuracies)
+                        ),
+                    }
+                    for result in results
+                ],
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
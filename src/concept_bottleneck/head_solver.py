@@ -0,0 +1,208 @@
+import argparse
+import pathlib
+import time
+import typing
+
+import torch
+from torch.utils.data import Dataset
+
+from src.concept_bottleneck.checkpoint import atomic_save
+from src.concept_bottleneck.concept_cache import CUB200CachedConceptsToClass
+from src.concept_bottleneck.dataset import NUM_CLASSES, CUB200AttributesToClass
+from src.concept_bottleneck.inference import (
+    INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+    SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+)
+from src.concept_bottleneck.networks import get_mlp
+from src.concept_bottleneck.tensor_loader import TensorBatchLoader
+from src.concept_bottleneck.train import MODEL_PATH
+
+# The heads trained on whole concept vectors. The joint head is trained
+# together with its backbone.
+HeadType = typing.Literal["independent", "sequential"]
+
+HEAD_MODEL_NAMES: dict[HeadType, str] = {
+    "independent": INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    "sequential": SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+}
+
+
+class SolverResult(typing.NamedTuple):
+    iterations: int
+    loss: float
+    gradient_norm: float
+    converged: bool
+    seconds: float
+
+
+def fit_head(  # pylint: disable=too-many-arguments
+    model: torch.nn.Module,
+    x: torch.Tensor,
+    y: torch.Tensor,
+    weight_decay: float = 1e-4,
+    max_iterations: int = 1000,
+    tolerance: float = 1e-5,
+) -> SolverResult:
+    # Minimizes the mean cross entropy plus an L2 penalty over the whole
+    # training set with L-BFGS. get_mlp() is a single linear layer, which
+    # makes this a convex multinomial logistic regression: the solver
+    # converges to the same optimum from any start in a few hundred
+    # iterations, instead of hundreds of SGD epochs. It stops when the largest
+    # gradient entry drops below `tolerance`.
+    start = time.perf_counter()
+    model.train()
+
+    linear_layers = [m for m in model.modules() if isinstance(m, torch.nn.Linear)]
+    if len(linear_layers) == 1:
+        init_linear_layer(linear_layers[0], x, y, weight_decay)
+
+    parameters = [p for p in model.parameters() if p.requires_grad]
+    optimizer = torch.optim.LBFGS(
+        parameters,
+        lr=1,
+        max_iter=max_iterations,
+        tolerance_grad=tolerance,
+        tolerance_change=0,
+        history_size=20,
+        line_search_fn="strong_wolfe",
+    )
+    loss_fn = torch.nn.CrossEntropyLoss()
+
+    def closure():
+        optimizer.zero_grad()
+        loss = loss_fn(model(x), y) + weight_decay / 2 * sum(
+            (p**2).sum() for p in parameters
+        )
+        loss.backward()
+        return loss
+
+    optimizer.step(closure)  # type: ignore
+
+    loss = closure()
+    gradient_norm = max(
+        p.grad.abs().max().item() for p in parameters if p.grad is not None
+    )
+    model.eval()
+
+    return SolverResult(
+        iterations=optimizer.state[parameters[0]]["n_iter"],
+        loss=loss.item(),
+        gradient_norm=gradient_norm,
+        converged=gradient_norm <= tolerance,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def init_linear_layer(
+    layer: torch.nn.Linear, x: torch.Tensor, y: torch.Tensor, ridge: float
+):
+    # Ridge regression onto the one-hot labels, solved in closed form. Its
+    # scores already rank the classes sensibly, which is a much better start
+    # than a random layer.
+    x = x.double()
+    targets = torch.nn.functional.one_hot(y, layer.out_features).double()
+    x_mean, targets_mean = x.mean(dim=0), targets.mean(dim=0)
+    x_centered = x - x_mean
+    gram = x_centered.T @ x_centered + ridge * len(x) * torch.eye(
+        x.shape[1], dtype=x.dtype
+    )
+    # torch.linalg has no type stubs.
+    weight = typing.cast(
+        torch.Tensor,
+        torch.linalg.solve(gram, x_centered.T @ (targets - targets_mean)),
+    )
+
+    with torch.no_grad():
+        layer.weight.copy_(weight.T)
+        layer.bias.copy_(targets_mean - x_mean @ weight)
+
+
+def evaluate_head(model: torch.nn.Module, x: torch.Tensor, y: torch.Tensor):
+    model.eval()
+    with torch.inference_mode():
+        logits = model(x)
+        loss = torch.nn.functional.cross_entropy(logits, y).item()
+        accuracy = (logits.argmax(dim=1) == y).float().mean().item()
+    return loss, accuracy
+
+
+def load_head_data(
+    head_type: HeadType, train: bool
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # Ground-truth concepts for the independent head, and the cached concept
+    # predictions of the image-to-attributes model for the sequential head.
+    dataset: Dataset[typing.Any] = (
+        CUB200AttributesToClass(train=train)
+        if head_type == "independent"
+        else CUB200CachedConceptsToClass(
+            train=train, model_name=INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME
+        )
+    )
+    x, y = TensorBatchLoader.from_dataset(dataset).tensors
+    return x.float(), y.long()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit a concept-to-class head with a full-batch solver."
+    )
+    parser.add_argument(
+        "--head-type", choices=tuple(HEAD_MODEL_NAMES), default="independent"
+    )
+    parser.add_argument("--weight-decay", type=float, default=1e-4)
+    parser.add_argument("--max-iterations", type=int, default=1000)
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        "--output",
+        type=pathlib.Path,
+        default=None,
+        help="defaults to <head checkpoint>.lbfgs.pth in the model directory",
+    )
+    output.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="replace the head's checkpoint used by the app",
+    )
+    args = parser.parse_args()
+
+    training_x, training_y = load_head_data(args.head_type, train=True)
+    test_x, test_y = load_head_data(args.head_type, train=False)
+    assert int(training_y.max()) < NUM_CLASSES
+
+    model = get_mlp()
+    result = fit_head(
+        model,
+        training_x,
+        training_y,
+        weight_decay=args.weight_decay,
+        max_iterations=args.max_iterations,
+        tolerance=args.tolerance,
+    )
+    print(
+        f"{'Converged' if result.converged else 'Stopped'} after",
+        f"{result.iterations} iterations in {result.seconds:.2f}s,",
+        f"loss {result.loss:.6f}, max gradient {result.gradient_norm:.2e}",
+    )
+
+    _, training_accuracy = evaluate_head(model, training_x, training_y)
+    test_loss, test_accuracy = evaluate_head(model, test_x, test_y)
+    print(
+        f"Training Accuracy: {100 * training_accuracy:>0.4f}%,",
+        f"Test Loss: {test_loss:.4f}, Test Accuracy: {100 * test_accuracy:>0.4f}%",
+    )
+
+    model_name = HEAD_MODEL_NAMES[args.head_type]
+    if args.output is not None:
+        filepath = args.output
+    elif args.overwrite:
+        filepath = MODEL_PATH / model_name
+    else:
+        filepath = MODEL_PATH / f"{pathlib.Path(model_name).stem}.lbfgs.pth"
+    atomic_save(model.state_dict(), filepath)
+    print(f"Model saved to {filepath}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,28 @@
+import argparse
+import collections
+import concurrent.futures
+import functools
+import io
+import pathlib
+import threading
+import typing
 import urllib.parse
 
+import numpy as np
+import numpy.typing as npt
 import torch
-from torchvision.datasets.folder import pil_loader
+from PIL import Image
 
+from src.concept_bottleneck.backends import Backend, build_backend
+from src.concept_bottleneck.cache import CACHE_PATH, hash_bytes, hash_file
 from src.concept_bottleneck.dataset import (
     DEFAULT_IMAGE_TRANSFORM,
+    draft_loader,
     load_attribute_names,
     load_class_names,
 )
 from src.concept_bottleneck.networks import get_inception, get_mlp
+from src.concept_bottleneck.prediction_cache import PredictionCache
 from src.concept_bottleneck.train import MODEL_PATH
 
 INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME = "independent_image_to_attributes.pth"
@@ -17,25 +31,123 @@ SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME = "sequential_attributes_to_class.pth"
 JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME = "joint_image_to_attributes.pth"
 JOINT_ATTRIBUTES_TO_CLASS_MODEL_NAME = "joint_attributes_to_class.pth"
 
+ModelType = typing.Literal["independent", "sequential", "joint"]
 
-class ImageToAttributesModel:
-    def __init__(self):
-        self.model_name: str | None = None
-        self.model: torch.nn.Module | None = None
+MODEL_TYPE_MAP: dict[ModelType, tuple[str, str]] = {
+    "independent": (
+        INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+        INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    ),
+    "sequential": (
+        INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+        SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    ),
+    "joint": (
+        JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+        JOINT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    ),
+}
+
+# Enough for both Inception checkpoints and all MLP heads to stay resident.
+DEFAULT_MEMORY_BUDGET = 512 * 1024**2
+
+ModelLoader = typing.Callable[[str, str], torch.nn.Module]
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self._models: collections.OrderedDict[
+            tuple[str, str, str, str, str], torch.nn.Module
+        ] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(  # pylint: disable=too-many-arguments
+        self,
+        name: str,
+        device: str,
+        load: ModelLoader,
+        variant: str = "",
+        checkpoint: pathlib.Path | None = None,
+    ) -> torch.nn.Module:
+        # Variants are different builds of the same checkpoint, e.g. backends.
+        # `checkpoint` is the file read by `load`. Its path and hash are part of
+        # the key, so that models from different model paths are kept apart and
+        # a rewritten checkpoint is loaded again.
+        source = (name, device, variant, str(checkpoint))
+        key = (*source, "" if checkpoint is None else hash_file(checkpoint))
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+
+            # Older versions of the checkpoint are never used again.
+            for stale_key in [k for k in self._models if k[:4] == source]:
+                del self._models[stale_key]
+
+            model = load(name, device)
+            self._models[key] = model
+            self._evict()
+            return model
+
+    def memory_usage(self) -> int:
+        return sum(get_model_size(model) for model in self._models.values())
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def _evict(self):
+        # The most recently used model always stays, even if it alone exceeds
+        # the budget.
+        while len(self._models) > 1 and self.memory_usage() > self.memory_budget:
+            self._models.popitem(last=False)
 
-    def predict(self, model_name: str, image_uri: str) -> dict[str, float]:
-        device = "cuda" if torch.cuda.is_available() else "cpu"
 
-        if self.model is None or self.model_name != model_name:
-            self.model_name = model_name
-            self.model = load_image_to_attributes_model(model_name, device)
+def get_model_size(model: torch.nn.Module) -> int:
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in (*model.parameters(), *model.buffers())
+    )
 
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+class ImageToAttributesModel:
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        registry: ModelRegistry = MODEL_REGISTRY,
+        prediction_cache: PredictionCache | None = None,
+        backend: Backend = "eager",
+        num_threads: int | None = None,
+        draft_decode: bool = False,
+        model_path: pathlib.Path = MODEL_PATH,
+    ):
+        self.registry = registry
+        self.prediction_cache = prediction_cache
+        self.backend: Backend = backend
+        self.num_threads = num_threads
+        self.draft_decode = draft_decode
+        self.model_path = model_path
+
+    def predict(self, model_name: str, image_uri: str) -> dict[str, float]:
         path = urllib.parse.unquote(urllib.parse.urlparse(image_uri).path)
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+
+        if self.prediction_cache is None:
+            probabilities = self._predict(model_name, image_bytes)
+        else:
+            key = (hash_bytes(image_bytes), *self._cache_key(model_name))
+            cached = self.prediction_cache.get(*key)
+            if cached is not None:
+                probabilities = cached
+            else:
+                probabilities = self._predict(model_name, image_bytes)
+                self.prediction_cache.put(*key, probabilities)
 
-        image: torch.Tensor = DEFAULT_IMAGE_TRANSFORM(pil_loader(path))  # type: ignore
-        image_batch = image.unsqueeze(0)
-        logits = self.model(image_batch.to(device))
-        probabilities = torch.sigmoid(logits)[0]
         attribute_names = load_attribute_names()
 
         return {
@@ -43,32 +155,131 @@ class ImageToAttributesModel:
             for attribute_name, probability in zip(attribute_names, probabilities)
         }
 
+    def _cache_key(self, model_name: str) -> tuple[str, str]:
+        # Backends differ by rounding at least, and draft decoding changes the
+        # pixels, so their predictions are cached apart. The int8 backend loads
+        # its own quantized checkpoint.
+        checkpoint = get_checkpoint_path(
+            model_name, self.model_path, self.backend == "int8"
+        )
+        variant = f"{self.backend}-draft" if self.draft_decode else self.backend
+        return hash_file(checkpoint), variant
+
+    def _predict(self, model_name: str, image_bytes: bytes) -> npt.NDArray[np.float32]:
+        image = decode_image(image_bytes, draft=self.draft_decode)
+        return self.predict_batch(model_name, image.unsqueeze(0))[0]
+
+    def predict_batch(
+        self, model_name: str, images: torch.Tensor
+    ) -> npt.NDArray[np.float32]:
+        device = get_device(quantized=self.backend == "int8")
+
+        model = self.registry.get(
+            model_name,
+            device,
+            functools.partial(
+                load_image_to_attributes_model,
+                backend=self.backend,
+                num_threads=self.num_threads,
+                model_path=self.model_path,
+            ),
+            variant=self.backend,
+            checkpoint=get_checkpoint_path(
+                model_name, self.model_path, self.backend == "int8"
+            ),
+        )
+
+        with torch.inference_mode():
+            logits = model(images.to(device))
+            return torch.sigmoid(logits).cpu().numpy()
+
 
-def load_image_to_attributes_model(name: str, device: str) -> torch.nn.Module:
-    model = get_inception()
+def decode_image(image_bytes: bytes, draft: bool = False) -> torch.Tensor:
+    if draft:
+        return DEFAULT_IMAGE_TRANSFORM(draft_loader(io.BytesIO(image_bytes)))  # type: ignore
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return DEFAULT_IMAGE_TRANSFORM(image.convert("RGB"))  # type: ignore
 
-    model.load_state_dict(torch.load(MODEL_PATH / name))
+
+def decode_images(
+    images: typing.Sequence[bytes], draft: bool = False, num_threads: int | None = None
+) -> torch.Tensor:
+    # Pillow releases the GIL while decoding and resizing, so threads decode a
+    # batch in parallel without the overhead of worker processes.
+    with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+        return torch.stack(
+            list(executor.map(functools.partial(decode_image, draft=draft), images))
+        )
+
+
+def load_image_to_attributes_model(
+    name: str,
+    device: str,
+    backend: Backend = "eager",
+    num_threads: int | None = None,
+    model_path: pathlib.Path = MODEL_PATH,
+) -> torch.nn.Module:
+    if backend == "int8":
+        return load_quantized_model(name, model_path)
+
+    model = get_inception(pretrained=False)
+
+    model.load_state_dict(torch.load(model_path / name, map_location=device))
 
     model = model.to(device)
     model.eval()
+
+    onnx_path = (
+        CACHE_PATH / f"{pathlib.Path(name).stem}-{hash_file(model_path / name)}.onnx"
+        if backend == "onnx"
+        else None
+    )
+    return build_backend(model, backend, device, onnx_path, num_threads)
+
+
+def get_device(quantized: bool = False):
+    # Quantized kernels only run on the CPU.
+    return "cuda" if torch.cuda.is_available() and not quantized else "cpu"
+
+
+def get_quantized_model_name(name: str):
+    return f"{pathlib.Path(name).stem}.int8.pt"
+
+
+def get_checkpoint_path(
+    name: str, model_path: pathlib.Path = MODEL_PATH, quantized: bool = False
+):
+    # The file a model is loaded from, the int8 TorchScript one if quantized.
+    return model_path / (get_quantized_model_name(name) if quantized else name)
+
+
+def load_quantized_model(
+    name: str, model_path: pathlib.Path = MODEL_PATH
+) -> torch.nn.Module:
+    model = typing.cast(
+        torch.nn.Module,
+        torch.jit.load(
+            str(get_checkpoint_path(name, model_path, quantized=True)),
+            map_location="cpu",
+        ),
+    )
+    model.eval()
     return model
 
 
 class AttributesToClassModel:
-    def __init__(self):
-        self.model_name: str | None = None
-        self.model: torch.nn.Module | None = None
+    def __init__(
+        self,
+        registry: ModelRegistry = MODEL_REGISTRY,
+        quantized: bool = False,
+        model_path: pathlib.Path = MODEL_PATH,
+    ):
+        self.registry = registry
+        self.quantized = quantized
+        self.model_path = model_path
 
     def predict(self, model_name: str, attributes: list[float]):
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-
-        if self.model is None or self.model_name != model_name:
-            self.model_name = model_name
-            self.model = load_attributes_to_class_model(model_name, device)
-
-        class_batch = torch.tensor([attributes]).to(device)
-        logits = self.model(class_batch)  # pylint: disable=not-callable
-        probabilities = torch.softmax(logits, dim=1)[0]
+        probabilities = self.predict_batch(model_name, torch.tensor([attributes]))[0]
         class_names = load_class_names()
 
         return {
@@ -76,12 +287,51 @@ class AttributesToClassModel:
             for class_name, probability in zip(class_names, probabilities)
         }
 
+    def predict_batch(
+        self, model_name: str, attributes: torch.Tensor
+    ) -> npt.NDArray[np.float32]:
+        device = get_device(self.quantized)
+
+        model = self.registry.get(
+            model_name,
+            device,
+            functools.partial(
+                load_attributes_to_class_model,
+                quantized=self.quantized,
+                model_path=self.model_path,
+            ),
+            variant="int8" if self.quantized else "",
+            checkpoint=get_checkpoint_path(model_name, self.model_path, self.quantized),
+        )
+
+        with torch.inference_mode():
+            logits = model(attributes.to(device))
+            return torch.softmax(logits, dim=1).cpu().numpy()
+
+
+def load_attributes_to_class_model(
+    name: str,
+    device: str,
+    quantized: bool = False,
+    model_path: pathlib.Path = MODEL_PATH,
+) -> torch.nn.Module:
+    if quantized:
+        return load_quantized_model(name, model_path)
 
-def load_attributes_to_class_model(name: str, device: str) -> torch.nn.Module:
     model = get_mlp()
 
-    model.load_state_dict(torch.load(MODEL_PATH / name))
+    model.load_state_dict(torch.load(model_path / name, map_location=device))
 
     model = model.to(device)
     model.eval()
     return model
+
+
+def add_model_types_argument(parser: argparse.ArgumentParser):
+    # For commands that run several model types, all of them by default.
+    parser.add_argument(
+        "--model-types",
+        nargs="+",
+        choices=tuple(MODEL_TYPE_MAP),
+        default=list(MODEL_TYPE_MAP),
+    )
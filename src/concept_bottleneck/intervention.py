@@ -0,0 +1,182 @@
+import argparse
+import json
+import pathlib
+import time
+import typing
+
+import torch
+
+from src.concept_bottleneck.concept_cache import load_concept_logits
+from src.concept_bottleneck.dataset import (
+    download_and_extract,
+    load_image_attribute_labels,
+    load_image_class_labels,
+    load_train_test_split,
+)
+from src.concept_bottleneck.inference import (
+    MODEL_TYPE_MAP,
+    ModelType,
+    add_model_types_argument,
+    load_attributes_to_class_model,
+)
+from src.concept_bottleneck.rerun import split_first_linear_layer
+
+InterventionPolicy = typing.Literal["random", "uncertainty"]
+
+INTERVENTION_POLICIES: tuple[InterventionPolicy, ...] = ("random", "uncertainty")
+
+# The number of intervened concepts shown in the printed table.
+DEFAULT_REPORTED_KS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 312)
+
+
+class InterventionCurve(typing.NamedTuple):
+    model_type: ModelType
+    policy: InterventionPolicy
+    # The test accuracy after replacing k concepts with their ground truth,
+    # indexed by k from 0 to the number of concepts.
+    accuracies: list[float]
+
+
+def get_intervention_order(
+    probabilities: torch.Tensor,
+    policy: InterventionPolicy,
+    generator: torch.Generator | None = None,
+) -> torch.Tensor:
+    # The order in which the concepts of every image are corrected: at random,
+    # or the predictions closest to 0.5 first.
+    if policy == "random":
+        scores = torch.rand(probabilities.shape, generator=generator)
+    elif policy == "uncertainty":
+        scores = (probabilities - 0.5).abs()
+    else:
+        raise ValueError(f"Unknown intervention policy: {policy}")
+    return scores.argsort(dim=1, stable=True).to(probabilities.device)
+
+
+def compute_intervention_accuracies(  # pylint: disable=too-many-arguments,too-many-locals
+    model: torch.nn.Module,
+    probabilities: torch.Tensor,
+    ground_truth: torch.Tensor,
+    labels: torch.Tensor,
+    order: torch.Tensor,
+    batch_size: int = 64,
+) -> torch.Tensor:
+    # Replacing one concept only adds a scaled weight column to the output of
+    # the head's first linear layer, as in RerunEngine. A cumulative sum of
+    # these columns along the intervention order gives that output for every
+    # k at once, and the rest of the head runs on all of them in one forward.
+    model.eval()
+    first_layer, head = split_first_linear_layer(model)
+    columns = first_layer.weight.detach().T
+
+    correct = torch.zeros(probabilities.shape[1] + 1, dtype=torch.long)
+    with torch.inference_mode():
+        for start in range(0, len(probabilities), batch_size):
+            batch = slice(start, start + batch_size)
+            p, batch_order = probabilities[batch], order[batch]
+            deltas = (ground_truth[batch] - p).gather(1, batch_order)
+
+            # (batch, k, hidden): the output of the first layer, followed by
+            # its change from correcting each concept in order. Summing them
+            # up in place gives the output after correcting the first k.
+            hidden = p.new_empty(len(p), len(columns) + 1, columns.shape[1])
+            hidden[:, 0] = first_layer(p)
+            torch.mul(columns[batch_order], deltas.unsqueeze(2), out=hidden[:, 1:])
+            hidden = hidden.cumsum_(dim=1)
+
+            logits = head(hidden.flatten(0, 1)).view(len(p), hidden.shape[1], -1)
+            predictions = logits.argmax(dim=2)
+            correct += (predictions == labels[batch].unsqueeze(1)).sum(dim=0).cpu()
+
+    return correct / len(probabilities)
+
+
+def load_test_concepts(
+    model_type: ModelType,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    # The concept probabilities predicted by the model's image-to-attributes
+    # backbone on the test split, the calibrated ground-truth concepts, and the
+    # 0-indexed class labels.
+    download_and_extract()
+    train_test_split = load_train_test_split()
+    logits = load_concept_logits(MODEL_TYPE_MAP[model_type][0], train=False)
+    return (
+        torch.sigmoid(torch.from_numpy(logits)),
+        torch.from_numpy(load_image_attribute_labels()[train_test_split == 0]),
+        torch.from_numpy(load_image_class_labels()[train_test_split == 0] - 1).long(),
+    )
+
+
+def evaluate_interventions(
+    model_types: typing.Sequence[ModelType] = tuple(MODEL_TYPE_MAP),
+    policies: typing.Sequence[InterventionPolicy] = INTERVENTION_POLICIES,
+    seed: int = 0,
+    batch_size: int = 64,
+    device: str = "cpu",
+) -> list[InterventionCurve]:
+    curves: list[InterventionCurve] = []
+    for model_type in model_types:
+        probabilities, ground_truth, labels = (
+            tensor.to(device) for tensor in load_test_concepts(model_type)
+        )
+        model = load_attributes_to_class_model(MODEL_TYPE_MAP[model_type][1], device)
+
+        for policy in policies:
+            order = get_intervention_order(
+                probabilities, policy, torch.Generator().manual_seed(seed)
+            )
+            accuracies = compute_intervention_accuracies(
+                model, probabilities, ground_truth, labels, order, batch_size
+            )
+            curves.append(InterventionCurve(model_type, policy, accuracies.tolist()))
+
+    return curves
+
+
+def format_curves(
+    curves: typing.Sequence[InterventionCurve],
+    ks: typing.Sequence[int] = DEFAULT_REPORTED_KS,
+) -> str:
+    lines = [f"{'model':<12}{'policy':<13}" + "".join(f"{k:>8d}" for k in ks)]
+    for curve in curves:
+        lines.append(
+            f"{curve.model_type:<12}{curve.policy:<13}"
+            + "".join(f"{100 * curve.accuracies[k]:>7.2f}%" for k in ks)
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure test accuracy as predicted concepts are replaced "
+        "by their ground truth."
+    )
+    add_model_types_argument(parser)
+    parser.add_argument(
+        "--policies",
+        nargs="+",
+        choices=INTERVENTION_POLICIES,
+        default=list(INTERVENTION_POLICIES),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    parser.add_argument("--output", type=pathlib.Path, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    curves = evaluate_interventions(
+        args.model_types, args.policies, args.seed, args.batch_size, args.device
+    )
+    print(format_curves(curves))
+    print(f"Evaluated {len(curves)} curves in {time.perf_counter() - start:.2f}s")
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump([curve._asdict() for curve in curves], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,50 @@
+import typing
+
 import torch
+from torchvision.models import Inception3, inception_v3
+from torchvision.models.quantization import QuantizableInception3
+from torchvision.models.quantization import inception_v3 as quantizable_inception_v3
 from torchvision.ops import MLP
 
 from src.concept_bottleneck.dataset import NUM_ATTRIBUTES, NUM_CLASSES
 
 
-def get_inception() -> torch.nn.Module:
-    model = torch.hub.load(
-        "pytorch/vision:v0.10.0",
-        "inception_v3",
-        weights="IMAGENET1K_V1",
+def get_inception(pretrained: bool = True) -> torch.nn.Module:
+    if pretrained:
+        model = typing.cast(
+            Inception3,
+            torch.hub.load(
+                "pytorch/vision:v0.10.0",
+                "inception_v3",
+                weights="IMAGENET1K_V1",
+            ),
+        )
+    else:
+        # Same architecture as the pretrained hub model, built locally for
+        # loading our own checkpoints without any network access.
+        model = inception_v3(
+            weights=None, aux_logits=True, transform_input=True, init_weights=False
+        )
+
+    assert model.AuxLogits is not None
+    model.AuxLogits.fc = torch.nn.Linear(in_features=768, out_features=NUM_ATTRIBUTES)
+    model.fc = torch.nn.Linear(in_features=2048, out_features=NUM_ATTRIBUTES)
+
+    return model
+
+
+def get_quantizable_inception() -> QuantizableInception3:
+    # Same architecture as get_inception() with quant/dequant stubs and
+    # fusable blocks, so our fp32 checkpoints load into it directly.
+    model = quantizable_inception_v3(
+        weights=None,
+        quantize=False,
+        aux_logits=True,
+        transform_input=True,
+        init_weights=False,
     )
 
+    assert model.AuxLogits is not None
     model.AuxLogits.fc = torch.nn.Linear(in_features=768, out_features=NUM_ATTRIBUTES)
     model.fc = torch.nn.Linear(in_features=2048, out_features=NUM_ATTRIBUTES)
 
@@ -19,3 +53,18 @@ def get_inception() -> torch.nn.Module:
 
 def get_mlp() -> torch.nn.Module:
     return MLP(in_channels=NUM_ATTRIBUTES, hidden_channels=[NUM_CLASSES])
+
+
+class JointImageToClass(torch.nn.Module):
+    def __init__(self, pretrained: bool = True):
+        super().__init__()
+        self.inception = get_inception(pretrained=pretrained)
+        self.mlp = get_mlp()
+
+    def forward(self, x):  # type: ignore
+        if self.training:
+            x, _ = self.inception(x)
+        else:
+            x = self.inception(x)
+        x = self.mlp(torch.sigmoid(x))
+        return x
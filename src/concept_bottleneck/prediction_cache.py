@@ -0,0 +1,114 @@
+import pathlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import numpy.typing as npt
+
+from src.concept_bottleneck.cache import CACHE_PATH
+
+PREDICTION_CACHE_PATH = CACHE_PATH / "predictions.sqlite3"
+
+# A concept probability vector takes about 1.2 KB, so the default bound keeps
+# the cache at roughly 12 MB.
+DEFAULT_MAX_ENTRIES = 10_000
+
+# Bumped whenever the table changes. Older caches are dropped rather than
+# migrated, since their rows cannot be attributed to a variant.
+SCHEMA_VERSION = 1
+
+
+class PredictionCache:
+    def __init__(
+        self,
+        filepath: pathlib.Path = PREDICTION_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        # The connection is shared by the UI's worker threads, guarded by the lock.
+        self._connection = sqlite3.connect(filepath, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._connection:
+            (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+            if version != SCHEMA_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS predictions")
+                self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+            # The variant tells apart predictions of the same checkpoint that
+            # may differ, e.g. from another backend.
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS predictions (
+                    image_hash TEXT NOT NULL,
+                    checkpoint_hash TEXT NOT NULL,
+                    variant TEXT NOT NULL,
+                    probabilities BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (image_hash, checkpoint_hash, variant)
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS predictions_last_used "
+                + "ON predictions (last_used)"
+            )
+
+    def get(
+        self, image_hash: str, checkpoint_hash: str, variant: str
+    ) -> npt.NDArray[np.float32] | None:
+        key = (image_hash, checkpoint_hash, variant)
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT probabilities FROM predictions "
+                + "WHERE image_hash = ? AND checkpoint_hash = ? AND variant = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._connection.execute(
+                "UPDATE predictions SET last_used = ? "
+                + "WHERE image_hash = ? AND checkpoint_hash = ? AND variant = ?",
+                (time.time(), *key),
+            )
+        return np.frombuffer(row[0], dtype=np.float32).copy()
+
+    def put(
+        self,
+        image_hash: str,
+        checkpoint_hash: str,
+        variant: str,
+        probabilities: npt.NDArray[np.float32],
+    ):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                (
+                    image_hash,
+                    checkpoint_hash,
+                    variant,
+                    probabilities.astype(np.float32).tobytes(),
+                    time.time(),
+                ),
+            )
+            # Evict the least recently used entries beyond the bound.
+            self._connection.execute(
+                "DELETE FROM predictions WHERE rowid IN ("
+                + "SELECT rowid FROM predictions ORDER BY last_used DESC "
+                + "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM predictions"
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
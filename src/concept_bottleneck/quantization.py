@@ -0,0 +1,244 @@
+import argparse
+import json
+import pathlib
+import typing
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+
+from src.concept_bottleneck.cache import atomic_write
+from src.concept_bottleneck.dataset import (
+    NUM_ATTRIBUTES,
+    CUB200ImageToAttributes,
+    load_image_class_labels,
+    load_train_test_split,
+)
+from src.concept_bottleneck.inference import (
+    MODEL_TYPE_MAP,
+    ModelType,
+    get_quantized_model_name,
+    load_attributes_to_class_model,
+    load_image_to_attributes_model,
+)
+from src.concept_bottleneck.networks import get_quantizable_inception
+from src.concept_bottleneck.train import MODEL_PATH
+
+QUANTIZATION_ENGINE = "fbgemm"
+
+
+def quantize_attributes_to_class_model(model: torch.nn.Module) -> torch.nn.Module:
+    # The heads are only linear layers, whose cost is dominated by loading the
+    # weights, so dynamic quantization needs no calibration data. The eager
+    # mode quantization API is deprecated in torch 2 but is all torch 1.13 has.
+    return typing.cast(
+        torch.nn.Module,
+        torch.ao.quantization.quantize_dynamic(  # pyright: ignore[reportDeprecated]
+            model.eval(), {torch.nn.Linear}, dtype=torch.qint8
+        ),
+    )
+
+
+def quantize_image_to_attributes_model(
+    model: torch.nn.Module, calibration_dataloader: DataLoader[typing.Any]
+) -> torch.nn.Module:
+    torch.backends.quantized.engine = QUANTIZATION_ENGINE
+
+    quantizable_model = get_quantizable_inception()
+    quantizable_model.load_state_dict(model.state_dict())
+    quantizable_model.eval()
+    # The auxiliary classifier only runs in training mode, so its observers
+    # would never see calibration data.
+    quantizable_model.AuxLogits = None
+    quantizable_model.fuse_model()
+    # Module.__setattr__ is only typed for tensors and submodules.
+    quantizable_model.qconfig = (  # pyright: ignore[reportArgumentType]
+        torch.ao.quantization.get_default_qconfig(QUANTIZATION_ENGINE)
+    )
+    torch.ao.quantization.prepare(  # pyright: ignore[reportDeprecated]
+        quantizable_model, inplace=True
+    )
+
+    # The observers record the activation ranges used to pick the int8 scales.
+    with torch.inference_mode():
+        for images, _ in calibration_dataloader:
+            quantizable_model(images)
+
+    return typing.cast(
+        torch.nn.Module,
+        torch.ao.quantization.convert(  # pyright: ignore[reportDeprecated]
+            quantizable_model
+        ),
+    )
+
+
+def save_quantized_model(
+    model: torch.nn.Module, example: torch.Tensor, filepath: pathlib.Path
+):
+    # Quantized modules are saved as TorchScript, so loading them does not
+    # need to rebuild the fused and observed architecture first.
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)  # type: ignore
+    with atomic_write(filepath) as temp_filepath:
+        torch.jit.save(traced, str(temp_filepath))
+
+
+def evaluate_drift(  # pylint: disable=too-many-locals
+    image_models: tuple[torch.nn.Module, torch.nn.Module],
+    class_models: tuple[torch.nn.Module, torch.nn.Module],
+    dataloader: DataLoader[typing.Any],
+    class_labels: torch.Tensor,
+) -> dict[str, typing.Any]:
+    # Compares fp32 (first) and int8 (second) models on the same batches.
+    attribute_correct = torch.zeros(2, NUM_ATTRIBUTES, dtype=torch.long)
+    class_correct = [0, 0]
+    agreement = 0
+    start = 0
+
+    with torch.inference_mode():
+        for images, attributes in dataloader:
+            labels = class_labels[start : start + len(images)]
+            start += len(images)
+
+            predictions: list[torch.Tensor] = []
+            for i, (image_model, class_model) in enumerate(
+                zip(image_models, class_models)
+            ):
+                concepts = torch.sigmoid(image_model(images))
+                attribute_correct[i] += ((concepts > 0.5) == attributes.bool()).sum(
+                    dim=0
+                )
+
+                prediction = class_model(concepts).argmax(dim=1)
+                class_correct[i] += (prediction == labels).sum().item()
+                predictions.append(prediction)
+
+            agreement += (predictions[0] == predictions[1]).sum().item()
+
+    fp32_attribute_accuracy, int8_attribute_accuracy = (
+        attribute_correct.double() / start
+    ).numpy()
+    attribute_drift = int8_attribute_accuracy - fp32_attribute_accuracy
+
+    return {
+        "num_images": start,
+        "fp32_attribute_accuracy": float(fp32_attribute_accuracy.mean()),
+        "int8_attribute_accuracy": float(int8_attribute_accuracy.mean()),
+        "max_attribute_accuracy_drop": max(float(-attribute_drift.min()), 0.0),
+        "attribute_accuracy_drift": attribute_drift.tolist(),
+        "fp32_class_accuracy": class_correct[0] / start,
+        "int8_class_accuracy": class_correct[1] / start,
+        "class_prediction_agreement": agreement / start,
+    }
+
+
+def quantize_models(
+    model_type: ModelType,
+    num_calibration_images: int = 512,
+    batch_size: int = 32,
+    num_workers: int = 2,
+):
+    # Saves the int8 models, and returns the fp32 and int8 image and class
+    # models as the pairs taken by evaluate_drift.
+    image_model_name, class_model_name = MODEL_TYPE_MAP[model_type]
+    image_model = load_image_to_attributes_model(image_model_name, "cpu")
+    class_model = load_attributes_to_class_model(class_model_name, "cpu")
+
+    # The calibration and test subsets are decoded on the fly, as building the
+    # preprocessed store of the whole archive is not worth it for them.
+    training_dataset = CUB200ImageToAttributes(train=True)
+    calibration_indices = np.random.default_rng(0).choice(
+        len(training_dataset),
+        min(num_calibration_images, len(training_dataset)),
+        replace=False,
+    )
+    calibration_dataloader = DataLoader(
+        Subset(training_dataset, calibration_indices.tolist()),
+        batch_size=batch_size,
+        num_workers=num_workers,
+    )
+
+    quantized_image_model = quantize_image_to_attributes_model(
+        image_model, calibration_dataloader
+    )
+    quantized_class_model = quantize_attributes_to_class_model(class_model)
+
+    save_quantized_model(
+        quantized_image_model,
+        torch.rand(1, 3, 299, 299),
+        MODEL_PATH / get_quantized_model_name(image_model_name),
+    )
+    save_quantized_model(
+        quantized_class_model,
+        torch.rand(1, NUM_ATTRIBUTES),
+        MODEL_PATH / get_quantized_model_name(class_model_name),
+    )
+    return (image_model, quantized_image_model), (class_model, quantized_class_model)
+
+
+def evaluate_test_drift(
+    image_models: tuple[torch.nn.Module, torch.nn.Module],
+    class_models: tuple[torch.nn.Module, torch.nn.Module],
+    num_test_images: int | None = None,
+    batch_size: int = 32,
+    num_workers: int = 2,
+):
+    test_dataset = CUB200ImageToAttributes(train=False)
+    test_indices = range(min(num_test_images or len(test_dataset), len(test_dataset)))
+    class_labels = torch.from_numpy(
+        load_image_class_labels()[load_train_test_split() == 0] - 1
+    )[list(test_indices)]
+    test_dataloader = DataLoader(
+        Subset(test_dataset, test_indices),
+        batch_size=batch_size,
+        num_workers=num_workers,
+    )
+    return evaluate_drift(image_models, class_models, test_dataloader, class_labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Quantize a model to int8 and report its accuracy drift."
+    )
+    parser.add_argument(
+        "--model-type", choices=tuple(MODEL_TYPE_MAP), default="independent"
+    )
+    parser.add_argument("--num-calibration-images", type=int, default=512)
+    parser.add_argument("--num-test-images", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--num-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    image_models, class_models = quantize_models(
+        args.model_type,
+        num_calibration_images=args.num_calibration_images,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+    )
+    report = evaluate_test_drift(
+        image_models,
+        class_models,
+        num_test_images=args.num_test_images,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+    )
+
+    report_path = MODEL_PATH / f"{args.model_type}_quantization_report.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(
+        f"Attribute accuracy: {100 * report['fp32_attribute_accuracy']:.4f}% (fp32),",
+        f"{100 * report['int8_attribute_accuracy']:.4f}% (int8),",
+        f"max drop {100 * report['max_attribute_accuracy_drop']:.4f}%",
+    )
+    print(
+        f"Class accuracy: {100 * report['fp32_class_accuracy']:.4f}% (fp32),",
+        f"{100 * report['int8_class_accuracy']:.4f}% (int8),",
+        f"agreement {100 * report['class_prediction_agreement']:.4f}%",
+    )
+    print(f"Report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import functools
+import pathlib
+import threading
+import typing
+
+import torch
+
+from src.concept_bottleneck.dataset import NUM_ATTRIBUTES
+from src.concept_bottleneck.inference import (
+    MODEL_REGISTRY,
+    ModelRegistry,
+    load_attributes_to_class_model,
+)
+from src.concept_bottleneck.train import MODEL_PATH
+
+# Rank-1 updates accumulate rounding errors, so the hidden pre-activation is
+# recomputed from scratch after this many of them.
+REFRESH_INTERVAL = 1000
+
+
+class RerunEngine:
+    # The first layer of the attributes-to-class head is linear, so editing a
+    # single concept only adds one scaled weight column to its cached output.
+    def __init__(
+        self,
+        registry: ModelRegistry = MODEL_REGISTRY,
+        model_path: pathlib.Path = MODEL_PATH,
+    ):
+        self.registry = registry
+        self.model_path = model_path
+        self.model_name: str | None = None
+
+        self.concepts = torch.zeros(NUM_ATTRIBUTES)
+        self._weight = torch.zeros(0, NUM_ATTRIBUTES)
+        self._bias = torch.zeros(0)
+        self._head: torch.nn.Module = torch.nn.Identity()
+        self._hidden = torch.zeros(0)
+        self._updates = 0
+        self._lock = threading.Lock()
+
+    def set_model(self, model_name: str):
+        with self._lock:
+            if self.model_name == model_name:
+                return
+
+            model = self.registry.get(
+                model_name,
+                "cpu",
+                functools.partial(
+                    load_attributes_to_class_model, model_path=self.model_path
+                ),
+                checkpoint=self.model_path / model_name,
+            )
+            first_layer, head = split_first_linear_layer(model)
+
+            self.model_name = model_name
+            self._weight = first_layer.weight.detach()
+            # None without a bias, although the stubs type it as a Parameter.
+            bias = typing.cast(torch.Tensor | None, first_layer.bias)
+            self._bias = (
+                bias.detach()
+                if bias is not None
+                else torch.zeros(first_layer.out_features)
+            )
+            self._head = head
+            self._refresh()
+
+    def set_concepts(self, concepts: typing.Sequence[float]):
+        with self._lock:
+            self.concepts.copy_(torch.as_tensor(concepts, dtype=torch.float32))
+            self._refresh()
+
+    def set_concept(self, index: int, value: float):
+        with self._lock:
+            delta = value - self.concepts[index].item()
+            if delta == 0:
+                return
+
+            self.concepts[index] = value
+            if self.model_name is None:
+                return
+
+            self._updates += 1
+            if self._updates >= REFRESH_INTERVAL:
+                self._refresh()
+            else:
+                self._hidden.add_(self._weight[:, index], alpha=delta)
+
+    def predict(self) -> torch.Tensor:
+        with self._lock, torch.inference_mode():
+            logits = self._head(self._hidden.unsqueeze(0))
+            return torch.softmax(logits, dim=1)[0]
+
+    def _refresh(self):
+        if self.model_name is None:
+            return
+        self._hidden = torch.addmv(self._bias, self._weight, self.concepts)
+        self._updates = 0
+
+
+def split_first_linear_layer(
+    model: torch.nn.Module,
+) -> tuple[torch.nn.Linear, torch.nn.Module]:
+    if not isinstance(model, torch.nn.Sequential) or not isinstance(
+        model[0], torch.nn.Linear
+    ):
+        raise ValueError("The model must be a Sequential starting with a Linear layer.")
+    first_layer, *rest = model
+    return typing.cast(torch.nn.Linear, first_layer), torch.nn.Sequential(*rest)
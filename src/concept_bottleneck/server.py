@@ -0,0 +1,337 @@
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import json
+import pathlib
+import threading
+import time
+import traceback
+import typing
+import urllib.parse
+
+import numpy as np
+import numpy.typing as npt
+import torch
+from PIL import UnidentifiedImageError
+
+from src.concept_bottleneck.backends import BACKENDS, Backend
+from src.concept_bottleneck.dataset import (
+    NUM_ATTRIBUTES,
+    load_attribute_names,
+    load_class_names,
+)
+from src.concept_bottleneck.inference import (
+    MODEL_REGISTRY,
+    MODEL_TYPE_MAP,
+    AttributesToClassModel,
+    ImageToAttributesModel,
+    ModelRegistry,
+    ModelType,
+    decode_image,
+)
+from src.concept_bottleneck.train import MODEL_PATH
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT = 0.005
+
+BatchRunner = typing.Callable[[str, torch.Tensor], npt.NDArray[np.float32]]
+
+
+class _Request(typing.NamedTuple):
+    key: str
+    item: torch.Tensor
+    future: concurrent.futures.Future[npt.NDArray[np.float32]]
+    arrival: float
+
+
+class MicroBatcher:
+    # Collects concurrent requests for the same model into one forward pass. A
+    # batch runs as soon as it is full or its oldest request has waited for
+    # max_wait seconds.
+    def __init__(
+        self,
+        run_batch: BatchRunner,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue: collections.deque[_Request] = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self, key: str, item: torch.Tensor
+    ) -> concurrent.futures.Future[npt.NDArray[np.float32]]:
+        future: concurrent.futures.Future[
+            npt.NDArray[np.float32]
+        ] = concurrent.futures.Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot submit requests to a closed batcher.")
+            self._queue.append(_Request(key, item, future, time.monotonic()))
+            self._condition.notify_all()
+        return future
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            try:
+                results = self.run_batch(
+                    batch[0].key, torch.stack([request.item for request in batch])
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                for request in batch:
+                    request.future.set_exception(e)
+            else:
+                for request, result in zip(batch, results):
+                    request.future.set_result(result)
+
+    def _next_batch(self) -> list[_Request] | None:
+        with self._condition:
+            while True:
+                self._condition.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return None
+
+                # Requests are served in arrival order, so the oldest request
+                # decides which model the next batch is for.
+                key = self._queue[0].key
+                deadline = self._queue[0].arrival + self.max_wait
+                remaining = deadline - time.monotonic()
+                if (
+                    remaining <= 0
+                    or self._closed
+                    or self._count(key) >= self.max_batch_size
+                ):
+                    return self._pop(key)
+                self._condition.wait(remaining)
+
+    def _count(self, key: str):
+        return sum(request.key == key for request in self._queue)
+
+    def _pop(self, key: str):
+        batch: list[_Request] = []
+        rest: collections.deque[_Request] = collections.deque()
+        for request in self._queue:
+            if request.key == key and len(batch) < self.max_batch_size:
+                batch.append(request)
+            else:
+                rest.append(request)
+        self._queue = rest
+        return batch
+
+
+class InferenceService:
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        model_type: ModelType = "independent",
+        registry: ModelRegistry = MODEL_REGISTRY,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        backend: Backend = "eager",
+        draft_decode: bool = False,
+        model_path: pathlib.Path = MODEL_PATH,
+    ):
+        self.model_type: ModelType = model_type
+        self.draft_decode = draft_decode
+        self.attribute_names = load_attribute_names()
+        self.attribute_indices = {
+            name: i for i, name in enumerate(self.attribute_names)
+        }
+        self.class_names = load_class_names()
+
+        self.image_batcher = MicroBatcher(
+            ImageToAttributesModel(
+                registry, backend=backend, model_path=model_path
+            ).predict_batch,
+            max_batch_size,
+            max_wait,
+        )
+        self.class_batcher = MicroBatcher(
+            AttributesToClassModel(
+                registry, quantized=backend == "int8", model_path=model_path
+            ).predict_batch,
+            max_batch_size,
+            max_wait,
+        )
+
+    def set_model_type(self, model_type: str):
+        self.model_type = get_model_type(model_type)
+
+    def predict(self, image_bytes: bytes, model_type: str | None = None):
+        image_model_name, class_model_name = MODEL_TYPE_MAP[
+            get_model_type(model_type or self.model_type)
+        ]
+
+        # Decoding runs on the calling request thread, so only the forward
+        # passes are serialized by the batchers.
+        image = decode_image(image_bytes, draft=self.draft_decode)
+        concepts = self.image_batcher.submit(image_model_name, image).result()
+        classes = self.class_batcher.submit(
+            class_model_name, torch.from_numpy(concepts)
+        ).result()
+
+        return {
+            "concepts": dict(zip(self.attribute_names, concepts.tolist())),
+            "classes": dict(zip(self.class_names, classes.tolist())),
+        }
+
+    def rerun(
+        self,
+        concepts: typing.Sequence[float],
+        edits: typing.Mapping[str, float] | None = None,
+        model_type: str | None = None,
+    ):
+        _, class_model_name = MODEL_TYPE_MAP[
+            get_model_type(model_type or self.model_type)
+        ]
+
+        if len(concepts) != NUM_ATTRIBUTES:
+            raise ValueError(
+                f"Expected {NUM_ATTRIBUTES} concepts, got {len(concepts)}."
+            )
+        attributes = torch.tensor(concepts, dtype=torch.float32)
+        for name, value in (edits or {}).items():
+            if name not in self.attribute_indices:
+                raise ValueError(f"Unknown concept: {name}")
+            attributes[self.attribute_indices[name]] = value
+
+        classes = self.class_batcher.submit(class_model_name, attributes).result()
+        return {"classes": dict(zip(self.class_names, classes.tolist()))}
+
+    def close(self):
+        self.image_batcher.close()
+        self.class_batcher.close()
+
+
+def get_model_type(model_type: str) -> ModelType:
+    if model_type not in MODEL_TYPE_MAP:
+        raise ValueError(f"Unknown model type: {model_type}")
+    return model_type
+
+
+class InferenceServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: InferenceService):
+        super().__init__(address, InferenceRequestHandler)
+        self.service = service
+
+
+class InferenceRequestHandler(http.server.BaseHTTPRequestHandler):
+    @property
+    def service(self) -> InferenceService:
+        return typing.cast(InferenceServer, self.server).service
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        url = urllib.parse.urlparse(self.path)
+        if url.path == "/models":
+            self._respond(
+                200,
+                {
+                    "model_type": self.service.model_type,
+                    "model_types": list(MODEL_TYPE_MAP),
+                },
+            )
+        else:
+            self._respond(404, {"error": f"Not found: {url.path}"})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        service = self.service
+
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            if url.path == "/predict":
+                # The body is the raw image file.
+                self._respond(200, service.predict(body, query.get("model_type")))
+            elif url.path == "/rerun":
+                request = json.loads(body)
+                self._respond(
+                    200,
+                    service.rerun(
+                        request["concepts"],
+                        request.get("edits"),
+                        request.get("model_type", query.get("model_type")),
+                    ),
+                )
+            elif url.path == "/model":
+                service.set_model_type(json.loads(body)["model_type"])
+                self._respond(200, {"model_type": service.model_type})
+            else:
+                self._respond(404, {"error": f"Not found: {url.path}"})
+        except (ValueError, KeyError, TypeError, UnidentifiedImageError) as e:
+            self._respond(400, {"error": str(e)})
+        except Exception as e:  # pylint: disable=broad-except
+            traceback.print_exc()
+            self._respond(500, {"error": str(e)})
+
+    def _respond(self, status: int, content: typing.Any):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve concept bottleneck predictions over HTTP."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--model-type", choices=tuple(MODEL_TYPE_MAP), default="independent"
+    )
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1000)
+    parser.add_argument("--backend", choices=BACKENDS, default="eager")
+    parser.add_argument("--num-threads", type=int, default=None)
+    parser.add_argument(
+        "--draft-decode",
+        action="store_true",
+        help="decode large JPEG images at a reduced scale",
+    )
+    args = parser.parse_args()
+
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+
+    service = InferenceService(
+        model_type=args.model_type,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait_ms / 1000,
+        backend=args.backend,
+        draft_decode=args.draft_decode,
+    )
+    with InferenceServer((args.host, args.port), service) as server:
+        print(f"Serving on http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import io
+import pathlib
+import random
+import typing
+
+import numpy as np
+import numpy.typing as npt
+import torch
+from PIL import Image
+from torch.utils.data import IterableDataset, get_worker_info
+
+from src.concept_bottleneck.cache import atomic_write
+from src.concept_bottleneck.dataset import (
+    DATA_PATH,
+    DEFAULT_IMAGE_TRANSFORM,
+    ROOT,
+    download_and_extract,
+    load_image_attribute_labels,
+    load_image_class_labels,
+    load_image_paths,
+    load_train_test_split,
+)
+
+SHARD_PATH = ROOT / "shards"
+INDEX_NAME = "index.npz"
+
+DEFAULT_SHARD_SIZE = 64 << 20
+
+Target = typing.Literal["attributes", "class"]
+
+
+# IterableDataset inherits the abstract __getitem__ of Dataset, which
+# iterable datasets never implement.
+class CUB200ShardedImages(  # pylint: disable=abstract-method
+    IterableDataset[tuple[torch.Tensor, typing.Any]]
+):
+    # Streams a split from the shards written by `pack_shards`. Each worker
+    # reads whole shards front to back, so the disk only sees large sequential
+    # reads. Samples are shuffled by visiting the shards in a random order and
+    # drawing from a buffer of `shuffle_buffer_size` still encoded images.
+    #
+    # Items are the same as CUB200ImageToAttributes or CUB200ImageToClass,
+    # depending on `target`.
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        train: bool,
+        target: Target = "class",
+        transform: typing.Callable[
+            [Image.Image], torch.Tensor
+        ] = DEFAULT_IMAGE_TRANSFORM,
+        shuffle: bool = False,
+        shuffle_buffer_size: int = 1000,
+        shard_path: pathlib.Path = SHARD_PATH,
+        download: bool = True,
+        data_path: pathlib.Path = DATA_PATH,
+    ):
+        super().__init__()
+        if shuffle_buffer_size < 1:
+            raise ValueError("shuffle_buffer_size must be at least 1.")
+        self.target = target
+        self.transform = transform
+        self.shuffle = shuffle
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.directory = get_split_path(shard_path, train)
+
+        if not (self.directory / INDEX_NAME).exists():
+            pack_shards(
+                train, shard_path=shard_path, download=download, data_path=data_path
+            )
+        self.index = load_shard_index(train, shard_path)
+
+    def __len__(self):
+        return len(self.index["offsets"])
+
+    def __iter__(self) -> typing.Iterator[tuple[torch.Tensor, typing.Any]]:
+        worker_info = get_worker_info()
+        worker_id = 0 if worker_info is None else worker_info.id
+        num_workers = 1 if worker_info is None else worker_info.num_workers
+
+        # The workers of a DataLoader share its base seed, which changes every
+        # epoch, so they agree on the shard order without any coordination.
+        if worker_info is None:
+            seed = int(torch.empty((), dtype=torch.int64).random_().item())
+        else:
+            seed = worker_info.seed - worker_info.id
+
+        shards = list(range(self.index["num_shards"].item()))
+        if self.shuffle:
+            random.Random(seed).shuffle(shards)
+
+        records = self._read_shards(shards[worker_id::num_workers])
+        if self.shuffle:
+            records = shuffle_buffer(
+                records, self.shuffle_buffer_size, random.Random(seed + worker_id)
+            )
+
+        for idx, data in records:
+            image = self.transform(Image.open(io.BytesIO(data)).convert("RGB"))
+            label = (
+                self.index["attribute_labels"][idx]
+                if self.target == "attributes"
+                else self.index["class_labels"][idx]
+            )
+            yield image, label
+
+    def _read_shards(self, shards: typing.Iterable[int]):
+        for shard in shards:
+            indices = np.flatnonzero(self.index["shards"] == shard)
+            with open(self.directory / get_shard_name(shard), "rb") as f:
+                for idx in indices:
+                    yield idx, f.read(self.index["lengths"][idx])
+
+
+T = typing.TypeVar("T")
+
+
+def shuffle_buffer(
+    items: typing.Iterable[T], buffer_size: int, rng: random.Random
+) -> typing.Iterator[T]:
+    buffer: list[T] = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        i = rng.randrange(buffer_size)
+        yield buffer[i]
+        buffer[i] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def get_split_path(shard_path: pathlib.Path, train: bool):
+    return shard_path / ("train" if train else "test")
+
+
+def get_shard_name(shard: int):
+    return f"shard-{shard:05d}.bin"
+
+
+def pack_shards(  # pylint: disable=too-many-arguments
+    train: bool,
+    shard_path: pathlib.Path = SHARD_PATH,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    seed: int = 0,
+    download: bool = True,
+    data_path: pathlib.Path = DATA_PATH,
+):
+    # Concatenates the JPEG files of a split into shards of about `shard_size`
+    # bytes, with an index of the offset, length and labels of every image.
+    # The archive is sorted by class, so the images are packed in a random
+    # order and a shuffle buffer only has to mix neighbouring shards. The index
+    # is written last and marks a complete split.
+    if download:
+        download_and_extract()
+
+    directory = get_split_path(shard_path, train)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    split = load_train_test_split(data_path) == train
+    image_paths = np.array(load_image_paths(data_path))[split]
+    order = np.random.default_rng(seed).permutation(len(image_paths))
+
+    shards, offsets, lengths = _write_shards(
+        directory, data_path / "images", image_paths[order], shard_size
+    )
+    with atomic_write(directory / INDEX_NAME) as temp_filepath, open(
+        temp_filepath, "wb"
+    ) as f:
+        np.savez(
+            f,
+            num_shards=np.array(shards[-1] + 1 if len(shards) else 1),
+            shards=shards,
+            offsets=offsets,
+            lengths=lengths,
+            image_ids=np.flatnonzero(split)[order],
+            class_labels=load_image_class_labels(data_path)[split][order] - 1,
+            attribute_labels=load_image_attribute_labels(data_path)[split][order],
+        )
+    return directory
+
+
+def _write_shards(
+    directory: pathlib.Path,
+    image_directory: pathlib.Path,
+    image_paths: npt.NDArray[np.str_],
+    shard_size: int,
+) -> tuple[npt.NDArray[np.int32], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    # Writes the images in order and returns the shard, offset and length of
+    # every one of them. Each shard is planned from the file sizes and written
+    # in one go.
+    filepaths = [image_directory / image_path for image_path in image_paths]
+    lengths = np.array([filepath.stat().st_size for filepath in filepaths], np.int64)
+    shards = np.empty(len(filepaths), dtype=np.int32)
+    offsets = np.empty(len(filepaths), dtype=np.int64)
+
+    shard, offset = 0, 0
+    for i, length in enumerate(lengths.tolist()):
+        if offset > 0 and offset + length > shard_size:
+            shard, offset = shard + 1, 0
+        shards[i], offsets[i] = shard, offset
+        offset += length
+
+    for shard in range(shard + 1):
+        with atomic_write(directory / get_shard_name(shard)) as temp_filepath, open(
+            temp_filepath, "wb"
+        ) as f:
+            for i in np.flatnonzero(shards == shard).tolist():
+                with open(filepaths[i], "rb") as image_file:
+                    f.write(image_file.read())
+    return shards, offsets, lengths
+
+
+def load_shard_index(
+    train: bool, shard_path: pathlib.Path = SHARD_PATH
+) -> dict[str, npt.NDArray[typing.Any]]:
+    with np.load(get_split_path(shard_path, train) / INDEX_NAME) as index:
+        return {name: index[name] for name in index.files}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pack the CUB images into shards for sequential streaming."
+    )
+    parser.add_argument("--shard-path", type=pathlib.Path, default=SHARD_PATH)
+    parser.add_argument("--shard-size-mb", type=int, default=DEFAULT_SHARD_SIZE >> 20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for train in (True, False):
+        directory = pack_shards(
+            train,
+            shard_path=args.shard_path,
+            shard_size=args.shard_size_mb << 20,
+            seed=args.seed,
+        )
+        index = load_shard_index(train, args.shard_path)
+        print(
+            f"Packed {len(index['offsets'])} images into",
+            f"{index['num_shards'].item()} shards in {directory}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import itertools
+import json
+import pathlib
+import time
+import typing
+
+import torch
+
+from src.concept_bottleneck.checkpoint import atomic_save
+from src.concept_bottleneck.head_solver import HEAD_MODEL_NAMES, load_head_data
+from src.concept_bottleneck.networks import get_mlp
+from src.concept_bottleneck.tensor_loader import TensorBatchLoader
+from src.concept_bottleneck.train import MODEL_PATH
+
+
+class SweepConfig(typing.NamedTuple):
+    learning_rate: float
+    epochs: int
+    batch_size: int = 16
+    momentum: float = 0.9
+    weight_decay: float = 0.0
+
+
+class SweepResult(typing.NamedTuple):
+    config: SweepConfig
+    training_loss: float
+    test_accuracy: float
+    best_test_accuracy: float
+    best_epoch: int
+
+
+class StackedHeads:
+    # K get_mlp() heads, i.e. K linear layers, trained side by side on the
+    # same batches. Their weights are laid out as one (in, K * out) matrix so
+    # that the forward pass of every head is a single matrix multiplication,
+    # and SGD with momentum is applied to all of them in place, with per-head
+    # hyperparameters. Each head follows exactly the updates torch.optim.SGD
+    # would make.
+    def __init__(self, configs: typing.Sequence[SweepConfig], seed: int = 0):
+        layers: list[torch.nn.Linear] = []
+        for i in range(len(configs)):
+            torch.manual_seed(seed + i)
+            layers.append(get_linear_layer(get_mlp()))
+
+        # (in, K, out) and (1, K, out)
+        self.weight = torch.stack([layer.weight.detach().T for layer in layers], 1)
+        self.bias = torch.stack([layer.bias.detach() for layer in layers]).unsqueeze(0)
+        self.weight.requires_grad_()
+        self.bias.requires_grad_()
+
+        # One value per head, broadcast over both parameters.
+        self.learning_rates = torch.tensor([c.learning_rate for c in configs])
+        self.momentums = torch.tensor([c.momentum for c in configs])
+        self.weight_decays = torch.tensor([c.weight_decay for c in configs])
+        self.learning_rates = self.learning_rates.view(1, -1, 1)
+        self.momentums = self.momentums.view(1, -1, 1)
+        self.weight_decays = self.weight_decays.view(1, -1, 1)
+        self.has_weight_decay = any(c.weight_decay for c in configs)
+        self.momentum_buffers: list[torch.Tensor] | None = None
+
+    def __len__(self):
+        return self.bias.shape[1]
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        # (batch, in) @ (in, K * out) -> (batch, K, out)
+        in_features, num_heads, out_features = self.weight.shape
+        logits = torch.addmm(
+            self.bias.view(1, -1), x, self.weight.view(in_features, -1)
+        )
+        return logits.view(len(x), num_heads, out_features)
+
+    def loss(self, x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+        # The mean cross entropy of every head. Their sum has the gradient of
+        # each head's own loss with respect to its own parameters.
+        logits = self(x)
+        losses = torch.nn.functional.cross_entropy(
+            logits.view(-1, logits.shape[2]),
+            y.repeat_interleave(len(self)),
+            reduction="none",
+        )
+        return losses.view(len(x), len(self)).mean(dim=0)
+
+    def accuracy(self, x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return (self(x).argmax(dim=2) == y.unsqueeze(1)).float().mean(dim=0)
+
+    @torch.no_grad()
+    def step(self):
+        # Every update is a pass over the whole (in, K, out) weight, which is
+        # what a step costs at small batch sizes, so they are fused where
+        # possible.
+        parameters = (self.weight, self.bias)
+        gradients = [typing.cast(torch.Tensor, p.grad) for p in parameters]
+        for p, gradient in zip(parameters, gradients):
+            p.grad = None
+            if self.has_weight_decay:
+                gradient.addcmul_(p, self.weight_decays)
+
+        if self.momentum_buffers is None:
+            self.momentum_buffers = gradients
+        else:
+            for buffer, gradient in zip(self.momentum_buffers, gradients):
+                torch.addcmul(gradient, buffer, self.momentums, out=buffer)
+
+        for p, buffer in zip(parameters, self.momentum_buffers):
+            p.addcmul_(buffer, self.learning_rates, value=-1)
+
+    def select(self, keep: torch.Tensor):
+        # Drops the heads that are done training from the stack.
+        self.weight = self.weight.detach()[:, keep].requires_grad_()
+        self.bias = self.bias.detach()[:, keep].requires_grad_()
+        self.learning_rates = self.learning_rates[:, keep]
+        self.momentums = self.momentums[:, keep]
+        self.weight_decays = self.weight_decays[:, keep]
+        self.has_weight_decay = bool(self.weight_decays.any())
+        if self.momentum_buffers is not None:
+            self.momentum_buffers = [b[:, keep] for b in self.momentum_buffers]
+
+
+def to_state_dict(weight: torch.Tensor, bias: torch.Tensor) -> dict[str, torch.Tensor]:
+    # The state dict of a get_mlp() head from one slice of the stack.
+    model = get_mlp()
+    layer = get_linear_layer(model)
+    with torch.no_grad():
+        layer.weight.copy_(weight.T)
+        layer.bias.copy_(bias)
+    return model.state_dict()
+
+
+def get_linear_layer(model: torch.nn.Module) -> torch.nn.Linear:
+    layers = [m for m in model.modules() if isinstance(m, torch.nn.Linear)]
+    if len(layers) != 1:
+        raise ValueError("Only heads with a single linear layer can be stacked.")
+    return layers[0]
+
+
+def run_sweep(  # pylint: disable=too-many-locals
+    configs: typing.Sequence[SweepConfig],
+    training_data: tuple[torch.Tensor, torch.Tensor],
+    test_data: tuple[torch.Tensor, torch.Tensor],
+    seed: int = 0,
+) -> tuple[list[SweepResult], list[dict[str, torch.Tensor]]]:
+    # Trains every configuration and returns, in the same order, its results
+    # and the state dict of its epoch with the best test accuracy, as
+    # run_epochs keeps. Configurations with the same batch size share one
+    # stack, and so the order of their batches. Those that only differ in
+    # their number of epochs also share one head, whose results are read off
+    # at the last epoch of each of them.
+    results: list[SweepResult | None] = [None] * len(configs)
+    best_state_dicts: list[dict[str, torch.Tensor]] = [{}] * len(configs)
+    test_x, test_y = test_data
+
+    batch_sizes = sorted({config.batch_size for config in configs})
+    for batch_size in batch_sizes:
+        indices = [i for i, c in enumerate(configs) if c.batch_size == batch_size]
+        keys = [configs[i]._replace(epochs=0) for i in indices]
+        trajectories = list(dict.fromkeys(keys))
+        heads = StackedHeads(trajectories, seed=seed)
+        # The head and number of epochs of every configuration, and the last
+        # epoch of every head.
+        head_ids = torch.tensor([trajectories.index(key) for key in keys])
+        epochs = torch.tensor([configs[i].epochs for i in indices])
+        head_epochs = torch.tensor(
+            [
+                max(configs[i].epochs for i, key in zip(indices, keys) if key == head)
+                for head in trajectories
+            ]
+        )
+        remaining = torch.arange(len(trajectories))
+        positions = torch.arange(len(trajectories))
+
+        loader = TensorBatchLoader(
+            training_data,
+            batch_size=batch_size,
+            shuffle=True,
+            generator=torch.Generator().manual_seed(seed),
+        )
+        training_losses = torch.zeros(len(indices))
+        test_accuracies = torch.zeros(len(indices))
+        best_accuracies = torch.zeros(len(indices))
+        best_epochs = torch.zeros(len(indices), dtype=torch.long)
+        best_weight = heads.weight.detach()[:, head_ids].clone()
+        best_bias = heads.bias.detach()[:, head_ids].clone()
+
+        for epoch in range(1, int(epochs.max()) + 1):
+            epoch_loss = torch.zeros(len(heads))
+            for x, y in loader:
+                loss = heads.loss(x, y)
+                loss.sum().backward()
+                heads.step()
+                epoch_loss += loss.detach() * len(x)
+
+            # The configurations that are still training, and the position
+            # of their head in the stack.
+            active = epochs >= epoch
+            stacked = positions[head_ids[active]]
+            accuracies = heads.accuracy(test_x, test_y)[stacked]
+            training_losses[active] = epoch_loss[stacked] / len(loader.dataset)
+            test_accuracies[active] = accuracies
+
+            improved = accuracies > best_accuracies[active]
+            improved_configs = active.nonzero().squeeze(1)[improved]
+            best_accuracies[improved_configs] = accuracies[improved]
+            best_epochs[improved_configs] = epoch
+            best_weight[:, improved_configs] = heads.weight.detach()[
+                :, stacked[improved]
+            ]
+            best_bias[:, improved_configs] = heads.bias.detach()[:, stacked[improved]]
+
+            unfinished = head_epochs[remaining] > epoch
+            if not unfinished.all():
+                heads.select(unfinished)
+                remaining = remaining[unfinished]
+                positions[remaining] = torch.arange(len(remaining))
+
+        for j, i in enumerate(indices):
+            results[i] = SweepResult(
+                config=configs[i],
+                training_loss=training_losses[j].item(),
+                test_accuracy=test_accuracies[j].item(),
+                best_test_accuracy=best_accuracies[j].item(),
+                best_epoch=int(best_epochs[j]),
+            )
+            best_state_dicts[i] = to_state_dict(best_weight[:, j], best_bias[0, j])
+
+    return typing.cast(list[SweepResult], results), best_state_dicts
+
+
+def format_results(results: typing.Sequence[SweepResult]) -> str:
+    lines = [
+        f"{'lr':>8} {'epochs':>6} {'batch':>5} {'momentum':>8} {'decay':>8}"
+        f" {'loss':>8} {'final':>8} {'best':>8} {'at':>5}"
+    ]
+    for result in sorted(results, key=lambda r: r.best_test_accuracy, reverse=True):
+        config = result.config
+        lines.append(
+            f"{config.learning_rate:>8g} {config.epochs:>6d} {config.batch_size:>5d}"
+            f" {config.momentum:>8g} {config.weight_decay:>8g}"
+            f" {result.training_loss:>8.4f} {100 * result.test_accuracy:>7.2f}%"
+            f" {100 * result.best_test_accuracy:>7.2f}% {result.best_epoch:>5d}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train a grid of concept-to-class heads side by side."
+    )
+    parser.add_argument(
+        "--head-type", choices=tuple(HEAD_MODEL_NAMES), default="independent"
+    )
+    parser.add_argument(
+        "--learning-rates", type=float, nargs="+", default=[0.001, 0.01, 0.05]
+    )
+    parser.add_argument("--epochs", type=int, nargs="+", default=[100, 300, 500])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16])
+    parser.add_argument("--momentums", type=float, nargs="+", default=[0.9])
+    parser.add_argument("--weight-decays", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=pathlib.Path, default=None)
+    args = parser.parse_args()
+
+    configs = [
+        SweepConfig(*values)
+        for values in itertools.product(
+            args.learning_rates,
+            args.epochs,
+            args.batch_sizes,
+            args.momentums,
+            args.weight_decays,
+        )
+    ]
+
+    start = time.perf_counter()
+    results, state_dicts = run_sweep(
+        configs,
+        load_head_data(args.head_type, train=True),
+        load_head_data(args.head_type, train=False),
+        seed=args.seed,
+    )
+    print(format_results(results))
+    print(f"{len(configs)} configurations in {time.perf_counter() - start:.2f}s")
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    {**result._asdict(), "config": result.config._asdict()}
+                    for result in results
+                ],
+                f,
+                indent=2,
+            )
+
+    best = max(range(len(results)), key=lambda i: results[i].best_test_accuracy)
+    filepath = MODEL_PATH / HEAD_MODEL_NAMES[args.head_type]
+    atomic_save(state_dicts[best], filepath)
+    print(f"Best configuration {results[best].config} saved to {filepath}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import contextlib
+import pathlib
+import shutil
+import tempfile
+import typing
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.concept_bottleneck.dataset import (
+    DATA_PATH,
+    NUM_ATTRIBUTES,
+    NUM_CLASSES,
+    load_class_names,
+)
+from src.concept_bottleneck.inference import MODEL_TYPE_MAP
+from src.concept_bottleneck.networks import get_inception, get_mlp
+
+
+class Environment(typing.NamedTuple):
+    data_path: pathlib.Path
+    model_path: pathlib.Path
+
+
+def make_synthetic_cub(data_path: pathlib.Path, num_images: int = 256, seed: int = 0):
+    # Mimics the layout of the CUB archive with random labels and smooth
+    # random images of a typical CUB size.
+    rng = np.random.default_rng(seed)
+    data_path.mkdir(parents=True)
+    shutil.copy(DATA_PATH / "classes.txt", data_path / "classes.txt")
+    shutil.copy(DATA_PATH.parent / "attributes.txt", data_path.parent)
+
+    class_names = load_class_names()
+    class_labels = np.sort(rng.integers(1, NUM_CLASSES + 1, num_images))
+    image_paths = [
+        f"{class_names[label - 1]}/image_{idx:05d}.jpg"
+        for idx, label in enumerate(class_labels)
+    ]
+    for image_path in image_paths:
+        filepath = data_path / "images" / image_path
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        pixels = rng.integers(0, 256, (30, 40, 3), dtype=np.uint8)
+        Image.fromarray(pixels).resize((500, 375), Image.Resampling.BILINEAR).save(
+            filepath
+        )
+
+    ids = np.arange(1, num_images + 1)
+    with open(data_path / "images.txt", "w", encoding="utf-8") as f:
+        f.writelines(f"{idx} {path}\n" for idx, path in zip(ids, image_paths))
+    np.savetxt(
+        data_path / "train_test_split.txt",
+        np.c_[ids, rng.integers(0, 2, num_images)],
+        fmt="%d",
+    )
+    np.savetxt(data_path / "image_class_labels.txt", np.c_[ids, class_labels], fmt="%d")
+
+    (data_path / "attributes").mkdir()
+    np.savetxt(
+        data_path / "attributes" / "image_attribute_labels.txt",
+        np.c_[
+            np.repeat(ids, NUM_ATTRIBUTES),
+            np.tile(np.arange(1, NUM_ATTRIBUTES + 1), num_images),
+            rng.integers(0, 2, num_images * NUM_ATTRIBUTES),
+            rng.integers(1, 5, num_images * NUM_ATTRIBUTES),
+            np.zeros(num_images * NUM_ATTRIBUTES),
+        ],
+        fmt="%d",
+    )
+
+
+def make_synthetic_models(model_path: pathlib.Path):
+    model_path.mkdir(parents=True)
+    for image_model_name, class_model_name in MODEL_TYPE_MAP.values():
+        torch.save(
+            get_inception(pretrained=False).state_dict(), model_path / image_model_name
+        )
+        torch.save(get_mlp().state_dict(), model_path / class_model_name)
+
+
+@contextlib.contextmanager
+def synthetic_environment(num_images: int = 256):
+    # A temporary dataset, metadata cache and checkpoints filled with random
+    # data, so the benchmarks run without the archive or trained models.
+    # Absolute timings are only comparable with baselines from the same mode.
+    with tempfile.TemporaryDirectory() as directory:
+        root = pathlib.Path(directory)
+        environment = Environment(root / "data" / DATA_PATH.name, root / "models")
+        make_synthetic_cub(environment.data_path, num_images)
+        make_synthetic_models(environment.model_path)
+        yield environment
@@ -0,0 +1,58 @@
+import math
+import typing
+
+import torch
+from torch.utils.data import DataLoader, Dataset, TensorDataset
+
+
+class TensorBatchLoader:
+    # Batches a dataset that fits in memory, e.g. concept vectors and labels,
+    # straight from tensors held on `device`. Shuffling gathers the whole split
+    # once per epoch and batches are contiguous slices of it, so there is no
+    # per-sample Python, collation or worker IPC. It stands in for a DataLoader
+    # wherever only iteration, len() and `dataset` are used, as in run_epochs
+    # and TrainingEngine.
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        tensors: typing.Sequence[torch.Tensor],
+        batch_size: int = 1,
+        shuffle: bool = False,
+        drop_last: bool = False,
+        device: str | torch.device = "cpu",
+        generator: torch.Generator | None = None,
+    ):
+        if not tensors or any(len(tensor) != len(tensors[0]) for tensor in tensors):
+            raise ValueError("Expected tensors with the same number of rows.")
+
+        self.tensors = tuple(tensor.to(device).contiguous() for tensor in tensors)
+        self.dataset = TensorDataset(*self.tensors)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
+
+    @classmethod
+    def from_dataset(
+        cls, dataset: Dataset[typing.Any], **kwargs: typing.Any
+    ) -> "TensorBatchLoader":
+        # Collates the whole dataset once, into the same tensors a DataLoader
+        # would produce batch by batch.
+        size = len(dataset)  # type: ignore
+        return cls(next(iter(DataLoader(dataset, batch_size=size))), **kwargs)
+
+    def __len__(self):
+        size = len(self.dataset)
+        if self.drop_last:
+            return size // self.batch_size
+        return math.ceil(size / self.batch_size)
+
+    def __iter__(self) -> typing.Iterator[tuple[torch.Tensor, ...]]:
+        tensors = self.tensors
+        if self.shuffle:
+            # randperm on the CPU so that the generator works for any device.
+            indices = torch.randperm(len(self.dataset), generator=self.generator)
+            indices = indices.to(tensors[0].device)
+            tensors = tuple(tensor[indices] for tensor in tensors)
+
+        for start in range(0, len(self) * self.batch_size, self.batch_size):
+            yield tuple(tensor[start : start + self.batch_size] for tensor in tensors)
@@ -1,18 +1,248 @@
+import contextlib
+import json
+import os
 import pathlib
+import time
 import typing
 
 import torch
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Subset
+
+from src.concept_bottleneck.checkpoint import (
+    BEST_CHECKPOINT_NAME,
+    Checkpointing,
+    load_checkpoint,
+    snapshot,
+)
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
 
 MODEL_PATH = pathlib.Path(__file__).parent.resolve() / "models"
+LOG_PATH = pathlib.Path(__file__).parent.resolve() / "data" / "logs"
 
-TrainFn = typing.Callable[[torch.nn.Module], None]
+TrainFn = typing.Callable[[torch.nn.Module], tuple[float, float] | None]
 TestFn = typing.Callable[[torch.nn.Module, DataLoader[typing.Any]], tuple[float, float]]
 
+Event = dict[str, typing.Any]
+EventCallback = typing.Callable[[Event], None]
+Phase = typing.Literal["train", "eval"]
+
 M = typing.TypeVar("M", bound=torch.nn.Module)
+T = typing.TypeVar("T")
+
+
+class Profiling(typing.NamedTuple):
+    # The training epochs to profile, the number of steps profiled in each,
+    # and where the traces are written.
+    epochs: typing.Collection[int] = ()
+    steps: int = 5
+    directory: pathlib.Path = LOG_PATH / "profiles"
+
+
+class TrainingMonitor:
+    # Splits each epoch into time spent waiting for batches and time spent
+    # computing, and reports it as events to a JSONL file and callbacks. Only
+    # batches drawn from dataloaders wrapped by `instrument` are counted.
+    def __init__(
+        self,
+        log_path: pathlib.Path | None = None,
+        callbacks: typing.Sequence[EventCallback] = (),
+        profiling: Profiling | None = None,
+    ):
+        self.log_path = log_path
+        self.callbacks = callbacks
+        self.profiling = profiling or Profiling()
+
+        self._phase: Phase | None = None
+        self._stats: dict[Phase, dict[str, float]] = {}
+        self._profiler: torch.profiler.profile | None = None
+
+        if log_path is not None:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def instrument(self, dataloader: DataLoader[T]) -> "InstrumentedDataLoader[T]":
+        return InstrumentedDataLoader(dataloader, self)
+
+    def emit(self, event: str, **fields: typing.Any):
+        record = {"event": event, "time": time.time(), **fields}
+        if self.log_path is not None:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        for callback in self.callbacks:
+            callback(record)
+
+    @contextlib.contextmanager
+    def phase(self, phase: Phase, epoch: int):
+        stats = self._stats.setdefault(
+            phase, {"seconds": 0.0, "data_wait_seconds": 0.0, "samples": 0}
+        )
+        if phase == "train" and epoch in self.profiling.epochs:
+            self._start_profiler(epoch)
+
+        self._phase = phase
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats["seconds"] += time.perf_counter() - start
+            self._phase = None
+            self._stop_profiler()
+
+    def record_batch(self, data_wait_seconds: float, samples: int):
+        if self._phase is None:
+            return
+        stats = self._stats[self._phase]
+        stats["data_wait_seconds"] += data_wait_seconds
+        stats["samples"] += samples
+        if self._profiler is not None:
+            self._profiler.step()
+
+    def end_epoch(self, epoch: int, **metrics: float):
+        fields: dict[str, typing.Any] = {"epoch": epoch}
+        for phase, stats in self._stats.items():
+            fields[f"{phase}_seconds"] = stats["seconds"]
+            fields[f"{phase}_data_wait_seconds"] = stats["data_wait_seconds"]
+            fields[f"{phase}_compute_seconds"] = (
+                stats["seconds"] - stats["data_wait_seconds"]
+            )
+            fields[f"{phase}_samples"] = stats["samples"]
+            fields[f"{phase}_samples_per_second"] = (
+                stats["samples"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+            )
+        self._stats.clear()
+
+        self.emit("epoch", **fields, **metrics, **get_peak_rss())
+
+    def _start_profiler(self, epoch: int):
+        self.profiling.directory.mkdir(parents=True, exist_ok=True)
+        trace_path = self.profiling.directory / f"epoch-{epoch}.json"
+
+        def on_trace_ready(profiler: torch.profiler.profile):
+            profiler.export_chrome_trace(str(trace_path))
+            self.emit("profile", epoch=epoch, trace_path=str(trace_path))
+
+        # Skips the first step, which includes starting the dataloader workers.
+        self._profiler = torch.profiler.profile(
+            schedule=typing.cast(
+                typing.Callable[[int], torch.profiler.ProfilerAction],
+                torch.profiler.schedule(
+                    wait=1, warmup=1, active=self.profiling.steps, repeat=1
+                ),
+            ),
+            on_trace_ready=on_trace_ready,
+            record_shapes=True,
+        )
+        self._profiler.start()
+
+    def _stop_profiler(self):
+        if self._profiler is not None:
+            self._profiler.stop()
+            self._profiler = None
+
+
+class InstrumentedDataLoader(typing.Generic[T]):
+    def __init__(self, dataloader: DataLoader[T], monitor: TrainingMonitor):
+        self.dataloader = dataloader
+        self.monitor = monitor
 
+    @property
+    def dataset(self):
+        return self.dataloader.dataset
 
-def run_epochs(  # pylint: disable=too-many-arguments
+    def __len__(self):
+        return len(self.dataloader)
+
+    def __iter__(self) -> typing.Iterator[typing.Any]:
+        iterator = iter(self.dataloader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self.monitor.record_batch(
+                time.perf_counter() - start, get_batch_size(batch)
+            )
+            yield batch
+
+
+def get_batch_size(batch: typing.Any) -> int:
+    if isinstance(batch, torch.Tensor):
+        return len(batch)
+    if isinstance(batch, (list, tuple)) and batch:
+        return get_batch_size(batch[0])
+    return 0
+
+
+def get_peak_rss() -> dict[str, int]:
+    # ru_maxrss is in kilobytes on Linux. RUSAGE_CHILDREN only covers children
+    # that have exited, e.g. the workers of finished non-persistent dataloader
+    # iterators, and is the largest of them rather than their sum. Workers
+    # that are still alive are summed from /proc instead.
+    if resource is None:
+        return {}
+    own_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "peak_rss_bytes": own_usage.ru_maxrss * 1024,
+        "peak_children_rss_bytes": children_usage.ru_maxrss * 1024,
+        "peak_live_children_rss_bytes": get_live_children_peak_rss(),
+    }
+
+
+def get_live_children_peak_rss() -> int:
+    # The sum of the VmHWM of every running child process, 0 without /proc.
+    total = 0
+    pid = str(os.getpid())
+    for stat_path in pathlib.Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # The parent PID follows the state, after the parenthesized name.
+            if stat_path.read_text().rsplit(")", 1)[1].split()[1] != pid:
+                continue
+            status = (stat_path.parent / "status").read_text()
+        except OSError:  # The process has exited since it was listed.
+            continue
+        for line in status.splitlines():
+            if line.startswith("VmHWM:"):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+class TrainingState(typing.NamedTuple):
+    epoch: int = 0
+    best_accuracy: float = 0.0
+    best_model: dict[str, torch.Tensor] | None = None
+    evaluations_without_improvement: int = 0
+
+
+def load_training_state(
+    model: torch.nn.Module, checkpointing: Checkpointing
+) -> TrainingState:
+    # Restores the model and optimizer from `checkpointing.resume_from`, if
+    # any, and returns where run_epochs left off.
+    resume_from = checkpointing.resume_from
+    if resume_from is None:
+        return TrainingState()
+
+    checkpoint = load_checkpoint(resume_from, model, checkpointing.optimizer)
+    best_path = resume_from.parent / BEST_CHECKPOINT_NAME
+    print(f"Resumed from {resume_from} after epoch {checkpoint['epoch']}")
+    return TrainingState(
+        epoch=checkpoint["epoch"],
+        best_accuracy=checkpoint["best_accuracy"],
+        best_model=(
+            torch.load(best_path, map_location="cpu", weights_only=False)["model"]
+            if best_path.exists()
+            else None
+        ),
+        evaluations_without_improvement=checkpoint["evaluations_without_improvement"],
+    )
+
+
+def run_epochs(  # pylint: disable=too-many-arguments,too-many-locals
     epochs: int,
     model: M,
     train: TrainFn,
@@ -20,28 +250,114 @@ def run_epochs(  # pylint: disable=too-many-arguments
     training_dataloader: DataLoader[typing.Any],
     test_dataloader: DataLoader[typing.Any],
     on_better_accuracy: typing.Callable[[M, float], None],
+    monitor: TrainingMonitor | None = None,
+    eval_every: int = 1,
+    evaluate_training: bool = True,
+    patience: int | None = None,
+    checkpointing: Checkpointing | None = None,
 ):
-    best_acc = 0.0
-    best_model = None
+    # When `train` returns the loss and accuracy it accumulated, they replace
+    # the extra pass over the training set. `patience` counts evaluations, not
+    # epochs, without a better test accuracy.
+    monitor = monitor or TrainingMonitor()
+    checkpointing = checkpointing or Checkpointing()
+    start = time.perf_counter()
+
+    (
+        start_epoch,
+        best_acc,
+        best_model,
+        evaluations_without_improvement,
+    ) = load_training_state(model, checkpointing)
+    checkpoints = checkpointing.manager
 
-    for epoch in range(epochs):
+    monitor.emit("start", epochs=epochs, start_epoch=start_epoch)
+
+    for epoch in range(start_epoch, epochs):
         print(f"Epoch {epoch + 1}/{epochs}-------------------")
 
-        train(model)
+        with monitor.phase("train", epoch + 1):
+            training_metrics = train(model)
 
-        training_loss, training_acc = test(model, training_dataloader)
-        print(
-            f"Training Loss: {training_loss:.4f}, Training Accuracy: {100 * training_acc:>0.4f}%"
-        )
+        metrics: dict[str, float] = {}
+        is_eval_epoch = (epoch + 1) % eval_every == 0 or epoch + 1 == epochs
+        is_best = False
+
+        if training_metrics is None and evaluate_training and is_eval_epoch:
+            with monitor.phase("eval", epoch + 1):
+                training_metrics = test(model, training_dataloader)
+        if training_metrics is not None:
+            training_loss, training_acc = training_metrics
+            metrics.update(training_loss=training_loss, training_accuracy=training_acc)
+            print(
+                f"Training Loss: {training_loss:.4f},",
+                f"Training Accuracy: {100 * training_acc:>0.4f}%",
+            )
 
-        test_loss, test_acc = test(model, test_dataloader)
-        print(f"Test Loss: {test_loss:.4f}, Test Accuracy: {100 * test_acc:>0.4f}%")
+        if is_eval_epoch:
+            with monitor.phase("eval", epoch + 1):
+                test_loss, test_acc = test(model, test_dataloader)
+            print(f"Test Loss: {test_loss:.4f}, Test Accuracy: {100 * test_acc:>0.4f}%")
+            metrics.update(test_loss=test_loss, test_accuracy=test_acc)
 
-        if test_acc > best_acc:
-            best_acc = test_acc
-            best_model = model.state_dict()
-            on_better_accuracy(model, best_acc)
+            if test_acc > best_acc:
+                is_best = True
+                best_acc = test_acc
+                # state_dict() references the live tensors, which keep changing.
+                best_model = snapshot(model.state_dict())
+                on_better_accuracy(model, best_acc)
+                monitor.emit("best", epoch=epoch + 1, test_accuracy=best_acc)
+                evaluations_without_improvement = 0
+            else:
+                evaluations_without_improvement += 1
+
+        monitor.end_epoch(epoch + 1, **metrics)
+
+        stop = patience is not None and evaluations_without_improvement >= patience
+        if checkpoints is not None and (
+            is_best
+            or stop
+            or (epoch + 1) % checkpoints.every == 0
+            or epoch + 1 == epochs
+        ):
+            checkpoints.save(
+                epoch + 1,
+                model,
+                checkpointing.optimizer,
+                is_best=is_best,
+                best_accuracy=best_acc,
+                evaluations_without_improvement=evaluations_without_improvement,
+            )
+
+        if stop:
+            print(f"Early stopping: no improvement in {patience} evaluations")
+            monitor.emit("early_stop", epoch=epoch + 1)
+            break
+
+    if checkpoints is not None:
+        checkpoints.wait()
 
     print(f"Best Test Accuracy: {100 * best_acc:>0.4f}%")
+    monitor.emit(
+        "end", best_accuracy=best_acc, total_seconds=time.perf_counter() - start
+    )
 
     return best_model
+
+
+def subsample_dataloader(
+    dataloader: DataLoader[T], num_samples: int, seed: int = 0
+) -> DataLoader[T]:
+    # A fixed random subset, so that evaluations on it stay comparable across
+    # epochs.
+    dataset: typing.Sized = dataloader.dataset  # type: ignore
+    indices = torch.randperm(
+        len(dataset), generator=torch.Generator().manual_seed(seed)
+    )[:num_samples]
+    return DataLoader(
+        Subset(dataloader.dataset, typing.cast(list[int], indices.tolist())),
+        batch_size=dataloader.batch_size,
+        num_workers=dataloader.num_workers,
+        collate_fn=dataloader.collate_fn,
+        pin_memory=dataloader.pin_memory,
+    )
@@ -1,175 +1,139 @@
 # pylint: disable=invalid-name
 
-import json
-import threading
-from typing import Literal, TypedDict
-
 from PySide6.QtCore import Property, QObject, Signal, Slot
 from PySide6.QtQml import QmlElement
 
-from src.concept_bottleneck.dataset import load_attribute_names
+from src.concept_bottleneck.dataset import load_attribute_names, load_class_names
 from src.concept_bottleneck.inference import (
-    INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
-    INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
-    JOINT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
-    JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
-    SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
-    AttributesToClassModel,
+    MODEL_TYPE_MAP,
     ImageToAttributesModel,
+    ModelType,
 )
+from src.concept_bottleneck.prediction_cache import PredictionCache
+from src.concept_bottleneck.rerun import RerunEngine
+from src.ui.models import ProbabilityListModel
+from src.ui.scheduler import TaskScheduler
 
 QML_IMPORT_NAME = "InteractiveConceptBottleneck.Ui"
 QML_IMPORT_MAJOR_VERSION = 1
 
-ModelType = Literal["independent", "sequential", "joint"]
-
-
-class State(TypedDict):
-    loading: bool
-    imagePath: str
-    concepts: dict[str, float]
-    selectedConceptPage: int
-    classes: dict[str, float]
-    selectedClassPage: int
-    modelType: ModelType
+PREDICT_PRIORITY = 1
+RERUN_PRIORITY = 0
 
 
 @QmlElement
 class Bridge(QObject):
-    stateChanged = Signal()
+    loadingChanged = Signal()
+    imagePathChanged = Signal()
+    modelTypeChanged = Signal()
+
+    # Results are computed on the scheduler's worker thread. These signals
+    # deliver them to the Qt thread, which owns the list models.
+    _conceptsPredicted = Signal(object)
+    _classesPredicted = Signal(object)
 
     def __init__(self, parent: QObject | None = None):
         super().__init__(parent)
-        self._state: State = {
-            "loading": False,
-            "imagePath": "",
-            "concepts": {},
-            "selectedConceptPage": 0,
-            "classes": {},
-            "selectedClassPage": 0,
-            "modelType": "independent",
-        }
-
-        self.image_to_attributes_model = ImageToAttributesModel()
-        self.attributes_to_class_model = AttributesToClassModel()
-
-    @Property(str, notify=stateChanged)  # type: ignore
-    def state(self):
-        return json.dumps(self._state)
-
-    def _set_state(self, state: State):
-        self._state = state
-        self.stateChanged.emit()
+        self._loading = False
+        self._image_path = ""
+        self._model_type: ModelType = "independent"
+
+        self.concept_names = load_attribute_names()
+        self.concept_indices = {name: i for i, name in enumerate(self.concept_names)}
+        self.class_names = load_class_names()
+
+        self._concept_model = ProbabilityListModel(parent=self)
+        self._class_model = ProbabilityListModel(parent=self)
+        self._conceptsPredicted.connect(self._set_concepts)
+        self._classesPredicted.connect(self._set_classes)
+
+        self.scheduler = TaskScheduler(on_busy_changed=self._set_loading)
+
+        self.image_to_attributes_model = ImageToAttributesModel(
+            prediction_cache=PredictionCache()
+        )
+        self.rerun_engine = RerunEngine()
+
+    @Property(bool, notify=loadingChanged)  # type: ignore
+    def loading(self):
+        return self._loading
+
+    def _set_loading(self, value: bool):
+        self._loading = value
+        self.loadingChanged.emit()
+
+    @Property(str, notify=imagePathChanged)  # type: ignore
+    def imagePath(self):
+        return self._image_path
 
     @Slot(str)
     def setImagePath(self, value: str):
-        if self._state["imagePath"] == value:
+        if self._image_path == value:
             return
-        self._set_state({**self._state, "imagePath": value})
-
-    @Slot()
-    def predict(self):
-        def task():
-            self._set_state({**self._state, "loading": True})
-            self._predict()
-            self._set_state({**self._state, "loading": False})
+        self._cancel_pending()
+        self._image_path = value
+        self.imagePathChanged.emit()
 
-        threading.Thread(target=task).start()
+    @Property(str, notify=modelTypeChanged)  # type: ignore
+    def modelType(self):
+        return self._model_type
 
-    def _predict(self):
-        concepts_with_prob = self.image_to_attributes_model.predict(
-            MODEL_TYPE_MAP[self._state["modelType"]][0], self._state["imagePath"]
-        )
+    @Slot(str)
+    def setModelType(self, value: ModelType):
+        if self._model_type == value:
+            return
+        self._cancel_pending()
+        self._model_type = value
+        self.modelTypeChanged.emit()
 
-        self._set_state({**self._state, "concepts": concepts_with_prob})
+    @Property(QObject, constant=True)  # type: ignore
+    def conceptModel(self):
+        return self._concept_model
 
-        self.rerun()
+    @Property(QObject, constant=True)  # type: ignore
+    def classModel(self):
+        return self._class_model
 
     @Slot()
-    def nextConceptPage(self):
-        self._set_state(
-            {
-                **self._state,
-                "selectedConceptPage": self._state["selectedConceptPage"] + 1,
-            }
-        )
+    def predict(self):
+        # A pending rerun is stale once a new prediction is requested, which
+        # reruns the classes itself.
+        self.scheduler.cancel("rerun")
+        self.scheduler.submit("predict", self._predict, priority=PREDICT_PRIORITY)
 
-    @Slot()
-    def previousConceptPage(self):
-        self._set_state(
-            {
-                **self._state,
-                "selectedConceptPage": self._state["selectedConceptPage"] - 1,
-            }
+    def _predict(self):
+        concepts_with_prob = self.image_to_attributes_model.predict(
+            MODEL_TYPE_MAP[self._model_type][0], self._image_path
         )
 
-    @Slot()
-    def nextClassPage(self):
-        self._set_state(
-            {
-                **self._state,
-                "selectedClassPage": self._state["selectedClassPage"] + 1,
-            }
-        )
+        probabilities = [concepts_with_prob[name] for name in self.concept_names]
+        self.rerun_engine.set_concepts(probabilities)
+        self._conceptsPredicted.emit(probabilities)
 
-    @Slot()
-    def previousClassPage(self):
-        if self._state["selectedClassPage"] == 0:
-            return
-        self._set_state(
-            {
-                **self._state,
-                "selectedClassPage": self._state["selectedClassPage"] - 1,
-            }
-        )
+        self._rerun()
+
+    def _set_concepts(self, probabilities: list[float]):
+        self._concept_model.set_items(self.concept_names, probabilities)
 
     @Slot()
     def rerun(self):
-        def task():
-            self._set_state({**self._state, "loading": True})
-            self._rerun()
-            self._set_state({**self._state, "loading": False})
-
-        threading.Thread(target=task).start()
+        self.scheduler.submit("rerun", self._rerun, priority=RERUN_PRIORITY)
 
     def _rerun(self):
-        concept_names = load_attribute_names()
-        classes_with_prob = self.attributes_to_class_model.predict(
-            MODEL_TYPE_MAP[self._state["modelType"]][1],
-            [self._state["concepts"][name] for name in concept_names],
-        )
+        self.rerun_engine.set_model(MODEL_TYPE_MAP[self._model_type][1])
+        self._classesPredicted.emit(self.rerun_engine.predict().tolist())
+
+    def _set_classes(self, probabilities: list[float]):
+        self._class_model.set_items(self.class_names, probabilities)
 
-        self._set_state({**self._state, "classes": classes_with_prob})
+    def _cancel_pending(self):
+        # Pending tasks were requested for the previous image or model type.
+        self.scheduler.cancel("predict")
+        self.scheduler.cancel("rerun")
 
     @Slot(str, float)
     def setConceptProbability(self, name: str, value: float):
-        if self._state["concepts"][name] == value:
-            return
-        self._set_state(
-            {
-                **self._state,
-                "concepts": {**self._state["concepts"], name: value},
-            }
-        )
-
-    @Slot(str)
-    def setModelType(self, value: ModelType):
-        if self._state["modelType"] == value:
+        if self._concept_model.probability(name) == value:
             return
-        self._set_state({**self._state, "modelType": value})
-
-
-MODEL_TYPE_MAP: dict[ModelType, tuple[str, str]] = {
-    "independent": (
-        INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
-        INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
-    ),
-    "sequential": (
-        INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
-        SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
-    ),
-    "joint": (
-        JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
-        JOINT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
-    ),
-}
+        self.rerun_engine.set_concept(self.concept_indices[name], value)
+        self._concept_model.set_probability(name, value)
@@ -9,8 +9,6 @@ ApplicationWindow {
 
     Bridge { id: bridge }
 
-    property var state: JSON.parse(bridge.state)
-
     visible: true
     width: 680
     height: 720
@@ -28,19 +26,19 @@ ApplicationWindow {
             }
 
             Image {
-                visible: app.state.imagePath.length === 0
+                visible: bridge.imagePath.length === 0
                 anchors.centerIn: parent
                 fillMode: Image.PreserveAspectFit
                 source: "assets/icon-picture.svg"
             }
 
             Image {
-                visible: app.state.imagePath.length !== 0
+                visible: bridge.imagePath.length !== 0
                 height: parent.height
                 width: parent.width
                 anchors.centerIn: parent
                 fillMode: Image.PreserveAspectFit
-                source: app.state.imagePath
+                source: bridge.imagePath
             }
         }
 
@@ -65,13 +63,12 @@ ApplicationWindow {
                 Layout.rightMargin: 4
                 text: "Predict"
                 onClicked: bridge.predict()
-                enabled: app.state.imagePath.length !== 0
+                enabled: bridge.imagePath.length !== 0
             }
         }
 
         RowLayout {
             id: resultTables
-            readonly property var rowsPerPage: 8
 
             Layout.fillWidth: true
 
@@ -94,9 +91,6 @@ ApplicationWindow {
                         id: conceptTable
                         Layout.fillWidth: true
 
-                        property var sortedConcepts: Object.entries(app.state.concepts).sort((a, b) => b[1] - a[1])
-                        property var pagedConcepts: sortedConcepts.reduce((rows, key, index) => (index % resultTables.rowsPerPage === 0 ? rows.push([key]) : rows[rows.length - 1].push(key)) && rows, [])
-
                         spacing: 0
 
                         ColumnLayout {
@@ -109,15 +103,15 @@ ApplicationWindow {
                             }
 
                             Repeater {
-                                model: conceptTable.pagedConcepts[app.state.selectedConceptPage]?.map(concept => concept[0])
+                                model: bridge.conceptModel
 
                                 delegate: Label {
                                     id: conceptLabelRepeater
-                                    required property var modelData
+                                    required property string name
                                     required property var index
 
                                     Layout.fillWidth: true
-                                    text: modelData
+                                    text: name
                                     horizontalAlignment: Text.AlignHCenter
                                     padding: 4
                                     background: Rectangle {
@@ -137,15 +131,16 @@ ApplicationWindow {
                             }
 
                             Repeater {
-                                model: conceptTable.pagedConcepts[app.state.selectedConceptPage]
+                                model: bridge.conceptModel
 
                                 delegate: Label {
                                     id: conceptProbabilityRepeater
-                                    required property var modelData
+                                    required property string name
+                                    required property real probability
                                     required property var index
 
                                     Layout.fillWidth: true
-                                    text: `${(modelData[1] * 100).toFixed(2)}%`
+                                    text: `${(probability * 100).toFixed(2)}%`
                                     horizontalAlignment: Text.AlignHCenter
                                     padding: 4
                                     background: Rectangle {
@@ -170,7 +165,7 @@ ApplicationWindow {
                                                     id: conceptProbabilityTextField
                                                     Layout.fillWidth: true
 
-                                                    text: (conceptProbabilityRepeater.modelData[1] * 100).toFixed(2)
+                                                    text: (conceptProbabilityRepeater.probability * 100).toFixed(2)
                                                     selectByMouse: true
 
                                                     validator: DoubleValidator {
@@ -189,7 +184,7 @@ ApplicationWindow {
                                                 }
                                                 Label { text: "%" }
                                             }
-                                            onAccepted: bridge.setConceptProbability(conceptProbabilityRepeater.modelData[0], Number(conceptProbabilityTextField.text) / 100)
+                                            onAccepted: bridge.setConceptProbability(conceptProbabilityRepeater.name, Number(conceptProbabilityTextField.text) / 100)
                                         }
                                     }
                                 }
@@ -207,20 +202,20 @@ ApplicationWindow {
 
                             Button {
                                 text: "<"
-                                enabled: app.state.selectedConceptPage > 0
-                                onClicked: bridge.previousConceptPage()
+                                enabled: bridge.conceptModel.page > 0
+                                onClicked: bridge.conceptModel.previousPage()
                             }
 
                             Label {
                                 Layout.fillWidth: true
                                 horizontalAlignment: Text.AlignHCenter
-                                text: `${app.state.selectedConceptPage + 1} / ${conceptTable.pagedConcepts.length}`
+                                text: `${bridge.conceptModel.page + 1} / ${bridge.conceptModel.pageCount}`
                             }
 
                             Button {
                                 text: ">"
-                                enabled: app.state.selectedConceptPage + 1 < conceptTable.pagedConcepts.length
-                                onClicked: bridge.nextConceptPage()
+                                enabled: bridge.conceptModel.page + 1 < bridge.conceptModel.pageCount
+                                onClicked: bridge.conceptModel.nextPage()
                             }
                         }
                     }
@@ -246,9 +241,6 @@ ApplicationWindow {
                         id: classTable
                         Layout.fillWidth: true
 
-                        property var sortedClasses: Object.entries(app.state.classes).sort((a, b) => b[1] - a[1])
-                        property var pagedClasses: sortedClasses.reduce((rows, key, index) => (index % resultTables.rowsPerPage === 0 ? rows.push([key]) : rows[rows.length - 1].push(key)) && rows, [])
-
                         spacing: 0
 
                         ColumnLayout {
@@ -261,15 +253,15 @@ ApplicationWindow {
                             }
 
                             Repeater {
-                                model: classTable.pagedClasses[app.state.selectedClassPage]?.map(_class => _class[0])
+                                model: bridge.classModel
 
                                 delegate: Label {
                                     id: classLabelRepeater
-                                    required property var modelData
+                                    required property string name
                                     required property var index
 
                                     Layout.fillWidth: true
-                                    text: modelData
+                                    text: name
                                     horizontalAlignment: Text.AlignHCenter
                                     padding: 4
                                     background: Rectangle {
@@ -289,15 +281,15 @@ ApplicationWindow {
                             }
 
                             Repeater {
-                                model: classTable.pagedClasses[app.state.selectedClassPage]?.map(_class => _class[1])
+                                model: bridge.classModel
 
                                 delegate: Label {
                                     id: classProbabilityRepeater
-                                    required property var modelData
+                                    required property real probability
                                     required property var index
 
                                     Layout.fillWidth: true
-                                    text: `${(modelData * 100).toFixed(2)}%`
+                                    text: `${(probability * 100).toFixed(2)}%`
                                     horizontalAlignment: Text.AlignHCenter
                                     padding: 4
                                     background: Rectangle {
@@ -320,20 +312,20 @@ ApplicationWindow {
 
                             Button {
                                 text: "<"
-                                enabled: app.state.selectedClassPage > 0
-                                onClicked: bridge.previousClassPage()
+                                enabled: bridge.classModel.page > 0
+                                onClicked: bridge.classModel.previousPage()
                             }
 
                             Label {
                                 Layout.fillWidth: true
                                 horizontalAlignment: Text.AlignHCenter
-                                text: `${app.state.selectedClassPage + 1} / ${classTable.pagedClasses.length}`
+                                text: `${bridge.classModel.page + 1} / ${bridge.classModel.pageCount}`
                             }
 
                             Button {
                                 text: ">"
-                                enabled: app.state.selectedClassPage + 1 < classTable.pagedClasses.length
-                                onClicked: bridge.nextClassPage()
+                                enabled: bridge.classModel.page + 1 < bridge.classModel.pageCount
+                                onClicked: bridge.classModel.nextPage()
                             }
                         }
                     }
@@ -344,7 +336,7 @@ ApplicationWindow {
         Button {
             Layout.fillWidth: true
             text: "Rerun"
-            enabled: app.state.imagePath.length !== 0
+            enabled: bridge.imagePath.length !== 0
             onClicked: bridge.rerun()
         }
 
@@ -360,26 +352,26 @@ ApplicationWindow {
 
             RadioButton {
                 text: "Independent"
-                checked: app.state.modelType === "independent"
+                checked: bridge.modelType === "independent"
                 onClicked: bridge.setModelType("independent")
             }
 
             RadioButton {
                 text: "Sequential"
-                checked: app.state.modelType === "sequential"
+                checked: bridge.modelType === "sequential"
                 onClicked: bridge.setModelType("sequential")
             }
 
             RadioButton {
                 text: "Joint"
-                checked: app.state.modelType === "joint"
+                checked: bridge.modelType === "joint"
                 onClicked: bridge.setModelType("joint")
             }
 
             Pane { Layout.fillWidth: true }
 
             BusyIndicator {
-                running: app.state.loading
+                running: bridge.loading
                 Layout.preferredHeight: 40
             }
         }
@@ -0,0 +1,155 @@
+# pylint: disable=invalid-name
+
+import typing
+
+import numpy as np
+import numpy.typing as npt
+from PySide6.QtCore import (
+    Property,
+    QAbstractListModel,
+    QByteArray,
+    QModelIndex,
+    QObject,
+    QPersistentModelIndex,
+    Qt,
+    Signal,
+    Slot,
+)
+
+ROWS_PER_PAGE = 8
+
+NAME_ROLE = Qt.ItemDataRole.UserRole + 1
+PROBABILITY_ROLE = Qt.ItemDataRole.UserRole + 2
+
+
+class ProbabilityListModel(QAbstractListModel):
+    # Exposes the rows of the selected page of name/probability pairs sorted by
+    # descending probability. Updates that keep the page's order only emit
+    # dataChanged for the changed rows instead of resetting the model.
+    pageChanged = Signal()
+    pageCountChanged = Signal()
+
+    def __init__(
+        self, rows_per_page: int = ROWS_PER_PAGE, parent: QObject | None = None
+    ):
+        super().__init__(parent)
+        self.rows_per_page = rows_per_page
+
+        self._names: list[str] = []
+        self._indices: dict[str, int] = {}
+        self._probabilities: npt.NDArray[np.float64] = np.zeros(0)
+        self._order: npt.NDArray[np.int_] = np.zeros(0, dtype=np.int_)
+        self._page = 0
+
+    def rowCount(
+        self, parent: QModelIndex | QPersistentModelIndex = QModelIndex()
+    ) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._page_items())
+
+    def data(
+        self,
+        index: QModelIndex | QPersistentModelIndex,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> typing.Any:
+        if not index.isValid() or not 0 <= index.row() < self.rowCount():
+            return None
+
+        item = int(self._page_items()[index.row()])
+        if role in (NAME_ROLE, Qt.ItemDataRole.DisplayRole):
+            return self._names[item]
+        if role == PROBABILITY_ROLE:
+            return float(self._probabilities[item])
+        return None
+
+    def roleNames(self) -> dict[int, QByteArray]:
+        return {
+            NAME_ROLE: QByteArray(b"name"),
+            PROBABILITY_ROLE: QByteArray(b"probability"),
+        }
+
+    @Property(int, notify=pageChanged)  # type: ignore
+    def page(self):
+        return self._page
+
+    @Property(int, notify=pageCountChanged)  # type: ignore
+    def pageCount(self):
+        return self._page_count()
+
+    @Slot()
+    def nextPage(self):
+        self._set_page(self._page + 1)
+
+    @Slot()
+    def previousPage(self):
+        self._set_page(self._page - 1)
+
+    def probability(self, name: str) -> float:
+        return float(self._probabilities[self._indices[name]])
+
+    def set_items(
+        self, names: typing.Sequence[str], probabilities: typing.Sequence[float]
+    ):
+        if list(names) != self._names:
+            self.beginResetModel()
+            self._names = list(names)
+            self._indices = {name: i for i, name in enumerate(self._names)}
+            self._probabilities = np.asarray(probabilities, dtype=np.float64)
+            self._order = sort_descending(self._probabilities)
+            self._page = min(self._page, max(self._page_count() - 1, 0))
+            self.endResetModel()
+            self.pageCountChanged.emit()
+            self.pageChanged.emit()
+            return
+
+        self._update(np.asarray(probabilities, dtype=np.float64))
+
+    def set_probability(self, name: str, value: float):
+        probabilities = self._probabilities.copy()
+        probabilities[self._indices[name]] = value
+        self._update(probabilities)
+
+    def _update(self, probabilities: npt.NDArray[np.float64]):
+        order = sort_descending(probabilities)
+        page = slice(
+            self._page * self.rows_per_page, (self._page + 1) * self.rows_per_page
+        )
+
+        if not np.array_equal(order[page], self._order[page]):
+            self.beginResetModel()
+            self._probabilities = probabilities
+            self._order = order
+            self.endResetModel()
+            return
+
+        changed_rows = np.flatnonzero(
+            probabilities[order[page]] != self._probabilities[order[page]]
+        )
+        self._probabilities = probabilities
+        self._order = order
+        for row in changed_rows.tolist():
+            index = self.index(row)
+            # Inherited Qt signals are not visible to pylint.
+            self.dataChanged.emit(  # pylint: disable=no-member
+                index, index, [PROBABILITY_ROLE]
+            )
+
+    def _set_page(self, page: int):
+        if page == self._page or not 0 <= page < self._page_count():
+            return
+        self.beginResetModel()
+        self._page = page
+        self.endResetModel()
+        self.pageChanged.emit()
+
+    def _page_count(self) -> int:
+        return -(-len(self._names) // self.rows_per_page)
+
+    def _page_items(self) -> npt.NDArray[np.int_]:
+        start = self._page * self.rows_per_page
+        return self._order[start : start + self.rows_per_page]
+
+
+def sort_descending(probabilities: npt.NDArray[np.float64]) -> npt.NDArray[np.int_]:
+    return np.argsort(-probabilities, kind="stable")
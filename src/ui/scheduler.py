@@ -0,0 +1,94 @@
+import itertools
+import threading
+import traceback
+import typing
+
+Task = typing.Callable[[], None]
+
+
+class TaskScheduler:
+    # Runs tasks one at a time on a single worker thread. Only the latest task
+    # of each kind is kept while waiting, and higher priorities run first.
+    def __init__(self, on_busy_changed: typing.Callable[[bool], None] | None = None):
+        self.on_busy_changed = on_busy_changed
+
+        self._condition = threading.Condition()
+        self._busy_lock = threading.Lock()
+        self._pending: dict[str, tuple[int, int, Task]] = {}
+        self._running: str | None = None
+        self._busy = False
+        self._closed = False
+        self._counter = itertools.count()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        with self._condition:
+            return self._busy
+
+    def submit(self, kind: str, task: Task, priority: int = 0):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot submit tasks to a closed scheduler.")
+            # Supersedes any task of the same kind that has not started yet.
+            self._pending[kind] = (priority, next(self._counter), task)
+            self._condition.notify_all()
+        self._update_busy()
+
+    def cancel(self, kind: str):
+        with self._condition:
+            self._pending.pop(kind, None)
+        self._update_busy()
+
+    def join(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._busy)
+        # Waits for the callback of the last busy change to return as well.
+        with self._busy_lock:
+            pass
+
+    def shutdown(self):
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+
+                kind = min(
+                    self._pending,
+                    key=lambda kind: (-self._pending[kind][0], self._pending[kind][1]),
+                )
+                _, _, task = self._pending.pop(kind)
+                self._running = kind
+
+            try:
+                task()
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._running = None
+                    self._condition.notify_all()
+                self._update_busy()
+
+    def _update_busy(self):
+        # Serializes the callbacks so that they are delivered in the same order
+        # as the busy state changes.
+        with self._busy_lock:
+            with self._condition:
+                busy = bool(self._pending) or self._running is not None
+                changed = busy != self._busy
+                self._busy = busy
+                self._condition.notify_all()
+
+            if changed and self.on_busy_changed is not None:
+                self.on_busy_changed(busy)
@@ -0,0 +1,52 @@
+import typing
+
+import torch
+
+from src.concept_bottleneck.dataset import NUM_ATTRIBUTES, NUM_CLASSES
+
+
+def make_head_data(num_samples: int, seed: int = 0):
+    # Random concept vectors labelled by one fixed random linear function, so
+    # that a single linear head can fit them. Splits drawn with different
+    # seeds share the labelling function on purpose.
+    x = torch.rand(
+        num_samples, NUM_ATTRIBUTES, generator=torch.Generator().manual_seed(seed)
+    )
+    labelling = torch.randn(
+        NUM_ATTRIBUTES, NUM_CLASSES, generator=torch.Generator().manual_seed(0)
+    )
+    return x, (x @ labelling).argmax(dim=1)
+
+
+def make_linear_classifier(
+    training_dataloader: typing.Iterable[tuple[torch.Tensor, ...]],
+    num_features: int = 4,
+):
+    # A linear classifier with the train and test functions of run_epochs.
+    model = torch.nn.Linear(num_features, 2)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    loss_fn = torch.nn.CrossEntropyLoss()
+
+    def train(model: torch.nn.Module):
+        for x, y in training_dataloader:
+            optimizer.zero_grad()
+            loss_fn(model(x), y).backward()
+            optimizer.step()
+
+    def test(
+        model: torch.nn.Module, dataloader: typing.Iterable[tuple[torch.Tensor, ...]]
+    ):
+        correct = 0
+        size = 0
+        with torch.no_grad():
+            for x, y in dataloader:
+                correct += int((model(x).argmax(1) == y).sum().item())
+                size += len(y)
+        return 0.0, correct / size
+
+    return model, train, test
+
+
+def skip_saving(_: torch.nn.Module, __: float):
+    # An on_better_accuracy callback for runs that keep no model files.
+    pass
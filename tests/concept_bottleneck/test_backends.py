@@ -0,0 +1,48 @@
+import copy
+import pathlib
+
+import pytest
+import torch
+
+from src.concept_bottleneck.backends import build_backend
+from src.concept_bottleneck.networks import get_inception
+
+
+@pytest.fixture(name="model", scope="module")
+def fixture_model():
+    torch.manual_seed(0)
+    return get_inception(pretrained=False).eval()
+
+
+@pytest.fixture(name="images", scope="module")
+def fixture_images():
+    return torch.randn(2, 3, 299, 299, generator=torch.Generator().manual_seed(0))
+
+
+def predict(model: torch.nn.Module, images: torch.Tensor):
+    with torch.inference_mode():
+        return torch.sigmoid(model(images))
+
+
+@pytest.mark.parametrize(
+    ("backend", "atol"), [("torchscript", 1e-4), ("channels_last_bf16", 5e-2)]
+)
+def test_backend_parity(
+    model: torch.nn.Module, images: torch.Tensor, backend: str, atol: float
+):
+    expected = predict(model, images)
+    optimized = build_backend(copy.deepcopy(model), backend, "cpu")  # type: ignore
+    actual = predict(optimized, images)
+
+    assert actual.dtype == torch.float32
+    assert torch.allclose(actual, expected, atol=atol)
+
+
+def test_onnx_backend_parity(
+    model: torch.nn.Module, images: torch.Tensor, tmp_path: pathlib.Path
+):
+    pytest.importorskip("onnxruntime")
+
+    expected = predict(model, images)
+    optimized = build_backend(model, "onnx", "cpu", onnx_path=tmp_path / "model.onnx")
+    assert torch.allclose(predict(optimized, images), expected, atol=1e-4)
@@ -0,0 +1,126 @@
+import pathlib
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from src.concept_bottleneck.batch_inference import (
+    PREDICTIONS_NAME,
+    find_images,
+    get_chunk_path,
+    score_images,
+)
+from src.concept_bottleneck.dataset import NUM_ATTRIBUTES, NUM_CLASSES
+from src.concept_bottleneck.inference import MODEL_TYPE_MAP, ModelRegistry
+from src.concept_bottleneck.networks import get_inception, get_mlp
+
+IMAGE_MODEL_NAME, CLASS_MODEL_NAME = MODEL_TYPE_MAP["independent"]
+
+
+@pytest.fixture(name="model_path", scope="module")
+def fixture_model_path(tmp_path_factory: pytest.TempPathFactory):
+    torch.manual_seed(0)
+    model_path = tmp_path_factory.mktemp("models")
+    torch.save(
+        get_inception(pretrained=False).state_dict(), model_path / IMAGE_MODEL_NAME
+    )
+    torch.save(get_mlp().state_dict(), model_path / CLASS_MODEL_NAME)
+    return model_path
+
+
+@pytest.fixture(name="image_paths")
+def fixture_image_paths(tmp_path: pathlib.Path):
+    images_path = tmp_path / "images"
+    (images_path / "b").mkdir(parents=True)
+    for idx, name in enumerate(("a.jpg", "b/c.JPEG", "b/d.jpg")):
+        Image.new("RGB", (40, 30), (80 * idx, 0, 0)).save(images_path / name, "JPEG")
+    (images_path / "b" / "broken.jpg").write_bytes(b"not a jpeg")
+    (images_path / "notes.txt").write_text("not an image", encoding="utf-8")
+    return find_images(images_path)
+
+
+def score(
+    image_paths: list[pathlib.Path],
+    output_dir: pathlib.Path,
+    model_path: pathlib.Path,
+    chunk_size: int = 2,
+):
+    return score_images(
+        image_paths,
+        output_dir,
+        batch_size=2,
+        num_workers=0,
+        chunk_size=chunk_size,
+        device="cpu",
+        registry=ModelRegistry(),
+        model_path=model_path,
+    )
+
+
+def load_predictions(output_dir: pathlib.Path):
+    with np.load(output_dir / PREDICTIONS_NAME) as predictions:
+        return {name: predictions[name] for name in predictions.files}
+
+
+def test_score_images(
+    tmp_path: pathlib.Path, image_paths: list[pathlib.Path], model_path: pathlib.Path
+):
+    assert [path.name for path in image_paths] == [
+        "a.jpg",
+        "broken.jpg",
+        "c.JPEG",
+        "d.jpg",
+    ]
+
+    stats = score(image_paths, tmp_path / "output", model_path)
+    assert stats["images"] == 4
+
+    # The chunks are merged in order, and the broken image is flagged.
+    predictions = load_predictions(tmp_path / "output")
+    assert predictions["paths"].tolist() == [str(path) for path in image_paths]
+    assert predictions["valid"].tolist() == [True, False, True, True]
+    assert predictions["concept_probabilities"].shape == (4, NUM_ATTRIBUTES)
+    assert predictions["class_probabilities"].shape == (4, NUM_CLASSES)
+    assert np.allclose(predictions["class_probabilities"].sum(axis=1), 1, atol=1e-5)
+    assert len(predictions["attribute_names"]) == NUM_ATTRIBUTES
+    assert len(predictions["class_names"]) == NUM_CLASSES
+
+
+def test_score_images_resume(
+    tmp_path: pathlib.Path, image_paths: list[pathlib.Path], model_path: pathlib.Path
+):
+    output_dir = tmp_path / "output"
+    score(image_paths, output_dir, model_path)
+    predictions = load_predictions(output_dir)
+
+    # Only the missing chunk is scored again, and the completed one is kept.
+    get_chunk_path(output_dir, 1).unlink()
+    first_chunk_mtime = get_chunk_path(output_dir, 0).stat().st_mtime_ns
+    stats = score(image_paths, output_dir, model_path)
+
+    assert stats["images"] == 2
+    assert get_chunk_path(output_dir, 0).stat().st_mtime_ns == first_chunk_mtime
+    resumed_predictions = load_predictions(output_dir)
+    for name, array in predictions.items():
+        assert np.array_equal(resumed_predictions[name], array)
+
+
+def test_score_images_manifest_mismatch(
+    tmp_path: pathlib.Path, image_paths: list[pathlib.Path], model_path: pathlib.Path
+):
+    output_dir = tmp_path / "output"
+    score(image_paths[:2], output_dir, model_path)
+
+    with pytest.raises(ValueError):
+        score(image_paths, output_dir, model_path)
+    with pytest.raises(ValueError):
+        score(image_paths[:2], output_dir, model_path, chunk_size=1)
+
+    # A retrained checkpoint under the same name invalidates the chunks.
+    retrained_path = tmp_path / "retrained"
+    retrained_path.mkdir()
+    (retrained_path / IMAGE_MODEL_NAME).symlink_to(model_path / IMAGE_MODEL_NAME)
+    torch.save(get_mlp().state_dict(), retrained_path / CLASS_MODEL_NAME)
+    with pytest.raises(ValueError):
+        score(image_paths[:2], output_dir, retrained_path)
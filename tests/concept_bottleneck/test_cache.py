@@ -0,0 +1,65 @@
+import pathlib
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from src.concept_bottleneck.cache import (
+    atomic_write,
+    hash_config,
+    hash_file,
+    load_or_build_array,
+)
+
+
+def test_hash_file(tmp_path: pathlib.Path):
+    filepath = tmp_path / "file.bin"
+    filepath.write_bytes(b"foo")
+    foo_hash = hash_file(filepath)
+    assert foo_hash == hash_file(filepath)
+
+    filepath.write_bytes(b"foobar")
+    assert hash_file(filepath) != foo_hash
+
+
+def test_hash_config():
+    assert hash_config("foo", 1) == hash_config("foo", 1)
+    assert hash_config("foo", 1) != hash_config("foo", 2)
+
+
+def test_load_or_build_array(tmp_path: pathlib.Path):
+    filepath = tmp_path / "array.npy"
+    build_count = 0
+
+    def build(array: npt.NDArray[np.float32]):
+        nonlocal build_count
+        build_count += 1
+        array[:] = np.arange(12).reshape((3, 4))
+
+    array = load_or_build_array(filepath, (3, 4), np.float32, build)
+    assert array.shape == (3, 4)
+    assert array.dtype == np.float32
+    assert np.all(array == np.arange(12).reshape((3, 4)))
+
+    load_or_build_array(filepath, (3, 4), np.float32, build)
+    assert build_count == 1
+    assert list(tmp_path.iterdir()) == [filepath]
+
+
+def test_atomic_write(tmp_path: pathlib.Path):
+    filepath = tmp_path / "cache" / "file.bin"
+    with atomic_write(filepath) as temp_filepath:
+        temp_filepath.write_bytes(b"foo")
+        assert not filepath.exists()
+    assert filepath.read_bytes() == b"foo"
+
+    # An interrupted write keeps the previous file and leaves nothing behind.
+    with pytest.raises(KeyboardInterrupt), atomic_write(filepath) as temp_filepath:
+        temp_filepath.write_bytes(b"bar")
+        raise KeyboardInterrupt
+    assert filepath.read_bytes() == b"foo"
+    assert list(filepath.parent.iterdir()) == [filepath]
+
+    with atomic_write(filepath, fsync=True) as temp_filepath:
+        temp_filepath.write_bytes(b"baz")
+    assert filepath.read_bytes() == b"baz"
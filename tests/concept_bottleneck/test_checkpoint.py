@@ -0,0 +1,85 @@
+import pathlib
+
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from src.concept_bottleneck.checkpoint import Checkpointing, CheckpointManager, snapshot
+from src.concept_bottleneck.train import run_epochs
+from tests.concept_bottleneck.helpers import skip_saving
+
+
+def test_snapshot():
+    model = torch.nn.Linear(2, 2)
+    state = snapshot(model.state_dict())
+    with torch.no_grad():
+        model.weight.add_(1)
+    assert not torch.equal(state["weight"], model.weight)
+
+
+def test_checkpoint_manager(tmp_path: pathlib.Path):
+    model = torch.nn.Linear(2, 2)
+    checkpoints = CheckpointManager(tmp_path, keep_last=2)
+    for epoch in range(1, 5):
+        checkpoints.save(epoch, model, is_best=epoch == 2)
+    checkpoints.write(tmp_path / "model.pth", model.state_dict())
+    checkpoints.close()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "best.pt",
+        "checkpoint-00003.pt",
+        "checkpoint-00004.pt",
+        "model.pth",
+    ]
+    assert checkpoints.latest() == tmp_path / "checkpoint-00004.pt"
+
+
+def train_model(epochs: int, checkpoints: CheckpointManager, resume: bool = False):
+    torch.manual_seed(0)
+    dataset = TensorDataset(torch.randn(64, 4), torch.randint(0, 2, (64,)))
+    dataloader = DataLoader(dataset, batch_size=8, shuffle=True)
+    model = torch.nn.Sequential(torch.nn.Linear(4, 8), torch.nn.Dropout(0.5))
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9)
+    loss_fn = torch.nn.CrossEntropyLoss()
+
+    def train(model: torch.nn.Module):
+        model.train()
+        for x, y in dataloader:
+            optimizer.zero_grad()
+            loss_fn(model(x), y).backward()
+            optimizer.step()
+
+    # The resumed run continues with the accuracies of the remaining epochs.
+    accuracies = iter([0.1, 0.3, 0.2, 0.4, 0.2, 0.1][3 if resume else 0 :])
+
+    def test(_: torch.nn.Module, __: DataLoader[tuple[torch.Tensor, ...]]):
+        return 0.0, next(accuracies)
+
+    best_model = run_epochs(
+        epochs,
+        model,
+        train,
+        test,
+        dataloader,
+        dataloader,
+        skip_saving,
+        evaluate_training=False,
+        checkpointing=Checkpointing(
+            checkpoints, optimizer, checkpoints.latest() if resume else None
+        ),
+    )
+    return model, best_model
+
+
+def test_resume(tmp_path: pathlib.Path):
+    expected_model, expected_best_model = train_model(
+        6, CheckpointManager(tmp_path / "uninterrupted")
+    )
+
+    checkpoints = CheckpointManager(tmp_path / "interrupted")
+    train_model(3, checkpoints)
+    model, best_model = train_model(6, checkpoints, resume=True)
+
+    assert best_model is not None and expected_best_model is not None
+    for name, value in expected_model.state_dict().items():
+        assert torch.equal(model.state_dict()[name], value)
+        assert torch.equal(best_model[name], expected_best_model[name])
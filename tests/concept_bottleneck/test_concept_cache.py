@@ -0,0 +1,144 @@
+import pathlib
+import typing
+
+import numpy as np
+import pytest
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+from torchvision import transforms
+
+from src.concept_bottleneck.concept_cache import (
+    CUB200CachedConceptsToClass,
+    compute_concept_logits,
+    load_concept_logits,
+)
+from src.concept_bottleneck.dataset import (
+    DATA_PATH,
+    NUM_ATTRIBUTES,
+    load_image_class_labels,
+    load_train_test_split,
+)
+from src.concept_bottleneck.synthetic import make_synthetic_cub
+
+MODEL_NAME = "stub_image_to_attributes.pth"
+
+TRANSFORM = transforms.Compose([transforms.Resize((8, 8)), transforms.ToTensor()])
+
+
+def get_stub_backbone():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.AdaptiveAvgPool2d(1),
+        torch.nn.Flatten(),
+        torch.nn.Linear(3, NUM_ATTRIBUTES),
+    )
+
+
+class StubLoader:
+    def __init__(self):
+        self.names: list[str] = []
+
+    def __call__(self, name: str, device: str) -> torch.nn.Module:
+        self.names.append(name)
+        return get_stub_backbone().to(device)
+
+
+@pytest.fixture(name="data_path")
+def fixture_data_path(tmp_path: pathlib.Path):
+    data_path = tmp_path / "data" / DATA_PATH.name
+    make_synthetic_cub(data_path, num_images=12)
+    return data_path
+
+
+@pytest.fixture(name="model_path")
+def fixture_model_path(tmp_path: pathlib.Path):
+    model_path = tmp_path / "models"
+    model_path.mkdir()
+    (model_path / MODEL_NAME).write_bytes(b"checkpoint")
+    return model_path
+
+
+def test_compute_concept_logits():
+    model = get_stub_backbone()
+    images = torch.rand(7, 3, 4, 4)
+    dataloader = typing.cast(
+        DataLoader[tuple[torch.Tensor, typing.Any]],
+        DataLoader(TensorDataset(images, torch.zeros(7)), batch_size=3),
+    )
+
+    out = np.empty((7, NUM_ATTRIBUTES), np.float32)
+    compute_concept_logits(model, dataloader, out)
+    with torch.inference_mode():
+        assert np.allclose(out, model(images).numpy(), atol=1e-6)
+
+    # The output has to cover the whole dataloader.
+    with pytest.raises(AssertionError):
+        compute_concept_logits(
+            model, dataloader, np.empty((8, NUM_ATTRIBUTES), np.float32)
+        )
+
+
+def test_load_concept_logits(data_path: pathlib.Path, model_path: pathlib.Path):
+    load_model = StubLoader()
+
+    def load(transform: transforms.Compose = TRANSFORM):
+        return load_concept_logits(
+            MODEL_NAME,
+            train=True,
+            transform=transform,
+            num_workers=0,
+            device="cpu",
+            load_model=load_model,
+            model_path=model_path,
+            data_path=data_path,
+        )
+
+    logits = np.array(load())
+    split_size = int(np.count_nonzero(load_train_test_split(data_path) == 1))
+    assert logits.shape == (split_size, NUM_ATTRIBUTES)
+    assert len(load_model.names) == 1
+
+    # The cached logits are reused as long as the checkpoint and transform
+    # stay the same.
+    assert np.array_equal(load(), logits)
+    assert len(load_model.names) == 1
+
+    (model_path / MODEL_NAME).write_bytes(b"retrained checkpoint")
+    load()
+    assert len(load_model.names) == 2
+
+    load(transforms.Compose([transforms.Resize((4, 4)), transforms.ToTensor()]))
+    assert len(load_model.names) == 3
+
+
+@pytest.mark.parametrize("train", [True, False])
+def test_cub200_cached_concepts_to_class(
+    data_path: pathlib.Path, model_path: pathlib.Path, train: bool
+):
+    dataset = CUB200CachedConceptsToClass(
+        train,
+        model_name=MODEL_NAME,
+        download=False,
+        transform=TRANSFORM,
+        num_workers=0,
+        load_model=StubLoader(),
+        model_path=model_path,
+        data_path=data_path,
+    )
+    logits = load_concept_logits(
+        MODEL_NAME,
+        train,
+        transform=TRANSFORM,
+        load_model=StubLoader(),
+        model_path=model_path,
+        data_path=data_path,
+    )
+    train_test_split = load_train_test_split(data_path)
+    class_labels = load_image_class_labels(data_path)[train_test_split == train]
+
+    assert len(dataset) == np.count_nonzero(train_test_split == train)
+    for idx in range(len(dataset)):
+        probabilities, label = dataset[idx]
+        assert probabilities.dtype == np.float32
+        assert np.allclose(probabilities, torch.sigmoid(torch.from_numpy(logits[idx])))
+        assert label == class_labels[idx] - 1
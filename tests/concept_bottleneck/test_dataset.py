@@ -1,23 +1,33 @@
+import pathlib
+
 import numpy as np
 import numpy.typing as npt
 import pytest
+import torch
+from PIL import Image
+from torchvision.datasets.folder import pil_loader
 
 from src.concept_bottleneck.dataset import (
     DATA_PATH,
+    DEFAULT_IMAGE_TRANSFORM,
     NUM_ATTRIBUTES,
     NUM_CLASSES,
     NUM_IMAGES,
+    PREPROCESS_IMAGE_TRANSFORM,
     CUB200AttributesToClass,
     CUB200ImageToAttributes,
     CUB200ImageToClass,
     calibrate_image_attribute_labels,
     download_and_extract,
+    draft_loader,
     load_attribute_names,
     load_class_names,
     load_image_attribute_labels,
     load_image_class_labels,
     load_image_paths,
+    load_metadata,
     load_train_test_split,
+    normalize_image_batch,
 )
 
 download_and_extract()
@@ -116,6 +126,38 @@ class TestCUB200ImageToClass:
             assert 0 <= class_ <= NUM_CLASSES - 1
 
 
+def test_normalize_image_batch():
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 256, (320, 400, 3), dtype=np.uint8))
+
+    preprocessed: torch.Tensor = PREPROCESS_IMAGE_TRANSFORM(image)  # type: ignore
+    assert preprocessed.dtype == torch.uint8
+
+    normalized = normalize_image_batch(preprocessed.unsqueeze(0))[0]
+    expected: torch.Tensor = DEFAULT_IMAGE_TRANSFORM(image)  # type: ignore
+    assert torch.allclose(normalized, expected)
+
+
+def test_draft_loader(tmp_path: pathlib.Path):
+    # A large smooth image, like a photo, that libjpeg can decode at 1/8 scale.
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (30, 40, 3), dtype=np.uint8)
+    filepath = tmp_path / "image.jpg"
+    Image.fromarray(pixels).resize((4000, 3000), Image.Resampling.BICUBIC).save(
+        filepath, quality=90
+    )
+
+    image = draft_loader(str(filepath))
+    assert 299 <= min(image.size) < 3000
+
+    expected: torch.Tensor = DEFAULT_IMAGE_TRANSFORM(pil_loader(str(filepath)))  # type: ignore
+    actual: torch.Tensor = DEFAULT_IMAGE_TRANSFORM(image)  # type: ignore
+    # In normalized units, where one intensity level is about 0.017.
+    assert actual.shape == expected.shape
+    assert (actual - expected).abs().mean() < 0.02
+    assert (actual - expected).abs().max() < 0.15
+
+
 class TestTrainTestSplit:
     class TestImageIds:
         def test_sorted(self, image_ids: npt.NDArray[np.int_]):
@@ -226,6 +268,9 @@ def test_calibrate_image_attribute_labels():
     calibrated = calibrate_image_attribute_labels(arr[:, 0], arr[:, 1])
     assert np.all(calibrated == np.array([0, 0, 0, 0, 1, 1, 1, 1]))
 
+    with pytest.raises(AssertionError):
+        calibrate_image_attribute_labels(np.array([1]), np.array([0]))
+
 
 def test_load_image_attribute_labels():
     image_attribute_labels = load_image_attribute_labels()
@@ -239,6 +284,18 @@ def test_load_image_attribute_labels():
     assert image_attribute_labels[(11662 - 1), (26 - 1)] == 1
 
 
+def test_load_metadata():
+    metadata = load_metadata()
+    assert set(metadata) == {
+        "image_paths",
+        "train_test_split",
+        "image_class_labels",
+        "image_attribute_labels",
+    }
+    assert all(not array.flags.writeable for array in metadata.values())
+    assert load_metadata() is metadata
+
+
 class TestImageClassLabels:
     class TestImageIds:
         def test_sorted(self, image_ids: npt.NDArray[np.int_]):
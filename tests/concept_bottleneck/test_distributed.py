@@ -0,0 +1,67 @@
+import pathlib
+import socket
+import typing
+
+import torch
+import torch.distributed as dist
+from torch.utils.data import DataLoader, TensorDataset
+
+from src.concept_bottleneck.checkpoint import snapshot
+from src.concept_bottleneck.distributed import (
+    is_main_process,
+    launch,
+    run_distributed_epochs,
+)
+
+
+def evaluate(model: torch.nn.Module, dataloader: DataLoader[tuple[torch.Tensor, ...]]):
+    with torch.no_grad():
+        correct = sum((model(x).argmax(1) == y).sum().item() for x, y in dataloader)
+    return 0.0, correct / len(dataloader.dataset)  # type: ignore
+
+
+def train_worker(output_path: pathlib.Path):
+    torch.manual_seed(0)
+    # An odd number of samples, so that the shards have different sizes.
+    dataset = TensorDataset(torch.randn(31, 4), torch.randint(0, 2, (31,)))
+    model = torch.nn.Linear(4, 2)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    loss_fn = torch.nn.CrossEntropyLoss()
+
+    def train(model: torch.nn.Module, dataloader: DataLoader[tuple[torch.Tensor, ...]]):
+        for x, y in dataloader:
+            optimizer.zero_grad()
+            loss_fn(model(x), y).backward()
+            optimizer.step()
+
+    accuracies: list[float] = []
+    best_model = run_distributed_epochs(
+        3,
+        model,
+        train,
+        evaluate,
+        DataLoader(dataset, batch_size=4, shuffle=True),
+        DataLoader(dataset, batch_size=8),
+        lambda _, accuracy: accuracies.append(accuracy),
+        evaluate_training=False,
+    )
+
+    result: dict[str, typing.Any] = {"model": snapshot(model.state_dict())}
+    if is_main_process() and best_model is not None:
+        model.load_state_dict(best_model)
+        result["best_accuracy"] = accuracies[-1]
+        result["expected_accuracy"] = evaluate(model, DataLoader(dataset))[1]
+    torch.save(result, output_path / f"{dist.get_rank()}.pt")
+
+
+def test_run_distributed_epochs(tmp_path: pathlib.Path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    launch(train_worker, (tmp_path,), nprocs=2, master_port=port)
+
+    results = [torch.load(tmp_path / f"{rank}.pt") for rank in range(2)]
+    for name, value in results[0]["model"].items():
+        assert torch.equal(results[1]["model"][name], value)
+    assert results[0]["best_accuracy"] == results[0]["expected_accuracy"]
@@ -0,0 +1,102 @@
+import pytest
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from src.concept_bottleneck.engine import (
+    TrainingEngine,
+    enable_activation_checkpointing,
+)
+from src.concept_bottleneck.networks import get_inception, get_mlp
+
+
+def train_mlp(micro_batch_size: int | None, mixed_precision: bool = False):
+    torch.manual_seed(0)
+    dataset = TensorDataset(torch.rand(32, 312), torch.randint(0, 200, (32,)))
+    dataloader = DataLoader(dataset, batch_size=8)
+    model = get_mlp()
+    engine = TrainingEngine(
+        torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9),
+        "class",
+        micro_batch_size=micro_batch_size,
+        mixed_precision=mixed_precision,
+    )
+    return model, engine.train(model, dataloader), engine.test(model, dataloader)
+
+
+def test_micro_batches():
+    model, training_metrics, test_metrics = train_mlp(None)
+    (
+        accumulated_model,
+        accumulated_training_metrics,
+        accumulated_test_metrics,
+    ) = train_mlp(3)
+
+    for name, value in model.state_dict().items():
+        assert torch.allclose(accumulated_model.state_dict()[name], value, atol=1e-6)
+    assert abs(accumulated_training_metrics[0] - training_metrics[0]) < 1e-5
+    assert accumulated_training_metrics[1] == training_metrics[1]
+    assert accumulated_test_metrics == pytest.approx(test_metrics)
+
+
+def test_mixed_precision():
+    _, (training_loss, training_accuracy), (test_loss, test_accuracy) = train_mlp(
+        4, mixed_precision=True
+    )
+    assert training_loss > 0 and test_loss > 0
+    assert 0 <= training_accuracy <= 1 and 0 <= test_accuracy <= 1
+
+
+def test_log_every(capsys: pytest.CaptureFixture[str]):
+    torch.manual_seed(0)
+    dataset = TensorDataset(torch.rand(20, 312), torch.randint(0, 200, (20,)))
+    model = get_mlp()
+    engine = TrainingEngine(
+        torch.optim.SGD(model.parameters(), lr=0.1), "class", log_every=2
+    )
+    loss, _ = engine.train(model, DataLoader(dataset, batch_size=4))
+
+    # The running mean loss over the samples seen so far, printed at the end.
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split("[")[1] for line in lines] == [
+        "    4/   20]",
+        "   12/   20]",
+        "   20/   20]",
+    ]
+    assert float(lines[-1].split()[1]) == pytest.approx(loss, abs=1e-6)
+
+
+def test_total_accuracy(capsys: pytest.CaptureFixture[str]):
+    model = torch.nn.Linear(2, 2)
+    with torch.no_grad():
+        model.weight.copy_(torch.eye(2))
+        model.bias.zero_()
+    # Only the first and last images have both attributes right.
+    x = torch.tensor([[1.0, 1.0], [1.0, -1.0], [-1.0, -1.0], [-1.0, 1.0]])
+    y = torch.tensor([[1.0, 1.0], [1.0, 1.0], [0.0, 1.0], [0.0, 1.0]])
+    engine = TrainingEngine(torch.optim.SGD(model.parameters(), lr=0.1), "attributes")
+
+    _, accuracy = engine.test(model, DataLoader(TensorDataset(x, y), batch_size=3))
+    assert accuracy == pytest.approx(0.75)
+    assert capsys.readouterr().out == "Total accuracy: 50.0000%\n"
+
+
+def test_activation_checkpointing():
+    torch.manual_seed(0)
+    model = get_inception(pretrained=False)
+    checkpointed_model = get_inception(pretrained=False)
+    checkpointed_model.load_state_dict(model.state_dict())
+    enable_activation_checkpointing(checkpointed_model)
+
+    dataset = TensorDataset(torch.randn(2, 3, 299, 299), torch.rand(2, 312))
+    for m in (model, checkpointed_model):
+        torch.manual_seed(0)
+        TrainingEngine(torch.optim.SGD(m.parameters(), lr=0.1), "attributes").train(
+            m, DataLoader(dataset, batch_size=2)
+        )
+
+    # Includes the BatchNorm running statistics, which the recomputation must
+    # not update again.
+    for name, value in model.state_dict().items():
+        assert torch.allclose(
+            checkpointed_model.state_dict()[name], value, atol=1e-5
+        ), name
@@ -0,0 +1,84 @@
+import typing
+
+import pytest
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from src.concept_bottleneck.evaluation import evaluate_models, group_by_backbone
+from src.concept_bottleneck.inference import (
+    INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+    JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+    MODEL_TYPE_MAP,
+    ModelType,
+)
+from src.concept_bottleneck.networks import get_mlp
+
+
+class CountingBackbone(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.linear = torch.nn.Linear(12, 312)
+        self.num_images = 0
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        self.num_images += len(x)
+        return self.linear(x.flatten(1))
+
+
+def test_group_by_backbone():
+    assert group_by_backbone(["independent", "sequential", "joint"]) == {
+        INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME: ["independent", "sequential"],
+        JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME: ["joint"],
+    }
+
+
+def test_evaluate_models():
+    torch.manual_seed(0)
+    images = torch.randn(50, 3, 2, 2)
+    labels = torch.randint(0, 200, (50,))
+    attribute_labels = (torch.rand(50, 312) > 0.5).float()
+    # TensorDataset items are typed as tuples of any length.
+    dataloader = typing.cast(
+        DataLoader[tuple[torch.Tensor, typing.Any]],
+        DataLoader(TensorDataset(images, labels), batch_size=16),
+    )
+
+    backbones = {
+        INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME: CountingBackbone(),
+        JOINT_IMAGE_TO_ATTRIBUTES_MODEL_NAME: CountingBackbone(),
+    }
+    heads: dict[ModelType, torch.nn.Module] = {
+        "independent": get_mlp(),
+        "sequential": get_mlp(),
+        "joint": get_mlp(),
+    }
+    results = evaluate_models(backbones, heads, dataloader, attribute_labels, "cpu")
+
+    # Each backbone sees every image once, whatever the number of its heads.
+    assert [backbone.num_images for backbone in backbones.values()] == [50, 50]
+
+    # The same metrics as evaluating each model on its own.
+    for result in results:
+        backbone = backbones[MODEL_TYPE_MAP[result.model_type][0]]
+        with torch.inference_mode():
+            logits = backbone(images)
+            class_logits = heads[result.model_type](torch.sigmoid(logits))
+        assert result.loss == pytest.approx(
+            torch.nn.functional.cross_entropy(class_logits, labels).item()
+        )
+        assert result.class_accuracy == pytest.approx(
+            (class_logits.argmax(dim=1) == labels).float().mean().item()
+        )
+        assert result.attribute_accuracies == pytest.approx(
+            ((logits > 0) == attribute_labels.bool()).float().mean(dim=0).tolist()
+        )
+
+    # bf16 backbones give close to the same metrics.
+    mixed_precision_results = evaluate_models(
+        backbones, heads, dataloader, attribute_labels, "cpu", mixed_precision=True
+    )
+    for result, mixed_precision_result in zip(results, mixed_precision_results):
+        assert mixed_precision_result.loss == pytest.approx(result.loss, rel=1e-2)
+        assert sum(mixed_precision_result.attribute_accuracies) == pytest.approx(
+            sum(result.attribute_accuracies), rel=1e-2
+        )
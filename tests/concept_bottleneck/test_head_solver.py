@@ -0,0 +1,54 @@
+import pathlib
+
+import torch
+
+from src.concept_bottleneck.checkpoint import atomic_save
+from src.concept_bottleneck.head_solver import (
+    evaluate_head,
+    fit_head,
+    init_linear_layer,
+)
+from src.concept_bottleneck.inference import (
+    INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    load_attributes_to_class_model,
+)
+from src.concept_bottleneck.networks import get_mlp
+from tests.concept_bottleneck.helpers import make_head_data
+
+
+def test_init_linear_layer():
+    x, y = make_head_data(1000)
+    layer = torch.nn.Linear(312, 200)
+    init_linear_layer(layer, x, y, ridge=1e-3)
+
+    # The ridge solution is a stationary point of its own objective.
+    targets = torch.nn.functional.one_hot(y, 200).float()
+    weight = layer.weight.detach().requires_grad_()
+    bias = layer.bias.detach().requires_grad_()
+    loss = ((x @ weight.T + bias - targets) ** 2).sum() / 2 + 1e-3 * len(x) / 2 * (
+        weight**2
+    ).sum()
+    loss.backward()
+    assert weight.grad is not None and bias.grad is not None
+    assert weight.grad.abs().max() < 1e-2
+    assert bias.grad.abs().max() < 1e-2
+
+
+def test_fit_head(tmp_path: pathlib.Path):
+    x, y = make_head_data(1000)
+    model = get_mlp()
+    result = fit_head(model, x, y, weight_decay=1e-4, tolerance=1e-4)
+
+    assert result.converged
+    assert result.gradient_norm <= 1e-4
+    assert evaluate_head(model, x, y)[1] > 0.95
+
+    # The state dict is a drop-in replacement for an SGD-trained head.
+    atomic_save(
+        model.state_dict(), tmp_path / INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME
+    )
+    loaded_model = load_attributes_to_class_model(
+        INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME, "cpu", model_path=tmp_path
+    )
+    with torch.inference_mode():
+        assert torch.equal(loaded_model(x), model(x))
@@ -0,0 +1,111 @@
+import io
+import pathlib
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.concept_bottleneck.inference import (
+    SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    AttributesToClassModel,
+    ModelRegistry,
+    decode_image,
+    decode_images,
+    get_model_size,
+)
+from src.concept_bottleneck.networks import get_inception
+
+
+def test_get_inception_offline():
+    model = get_inception(pretrained=False)
+    model.eval()
+    with torch.no_grad():
+        logits = model(torch.rand(1, 3, 299, 299))
+    assert logits.shape == (1, 312)
+
+
+class TestModelRegistry:
+    def test_load_lazily(self):
+        loaded: list[str] = []
+
+        def load(name: str, _: str):
+            loaded.append(name)
+            return torch.nn.Linear(4, 4)
+
+        registry = ModelRegistry()
+        assert not loaded
+
+        model = registry.get("a", "cpu", load)
+        assert registry.get("a", "cpu", load) is model
+        assert loaded == ["a"]
+
+    def test_evict_least_recently_used(self):
+        loaded: list[str] = []
+
+        def load(name: str, _: str):
+            loaded.append(name)
+            return torch.nn.Linear(4, 4)
+
+        size = get_model_size(torch.nn.Linear(4, 4))
+        registry = ModelRegistry(memory_budget=2 * size)
+
+        registry.get("a", "cpu", load)
+        registry.get("b", "cpu", load)
+        registry.get("a", "cpu", load)
+        registry.get("c", "cpu", load)  # evicts "b"
+        assert registry.memory_usage() == 2 * size
+
+        registry.get("a", "cpu", load)
+        registry.get("b", "cpu", load)
+        assert loaded == ["a", "b", "c", "b"]
+
+    def test_key_by_checkpoint(self, tmp_path: pathlib.Path):
+        loaded: list[pathlib.Path] = []
+
+        def get(model_path: pathlib.Path):
+            def load(name: str, _: str):
+                loaded.append(model_path / name)
+                return torch.nn.Linear(4, 4)
+
+            return registry.get("a", "cpu", load, checkpoint=model_path / "a")
+
+        registry = ModelRegistry()
+        for model_path in (tmp_path / "first", tmp_path / "second"):
+            model_path.mkdir()
+            (model_path / "a").write_bytes(b"weights")
+
+        # The same name under another model path is another model.
+        model = get(tmp_path / "first")
+        assert get(tmp_path / "second") is not model
+        assert get(tmp_path / "first") is model
+
+        # A rewritten checkpoint is loaded again, and replaces the stale model.
+        (tmp_path / "first" / "a").write_bytes(b"retrained weights")
+        assert get(tmp_path / "first") is not model
+        first, second = tmp_path / "first" / "a", tmp_path / "second" / "a"
+        assert loaded == [first, second, first]
+        assert registry.memory_usage() == 2 * get_model_size(model)
+
+
+def test_attributes_to_class_model():
+    model = AttributesToClassModel(ModelRegistry())
+    classes = model.predict(SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME, [0.5] * 312)
+    assert len(classes) == 200
+    assert abs(sum(classes.values()) - 1) < 1e-4
+
+
+def test_decode_images():
+    rng = np.random.default_rng(0)
+    images: list[bytes] = []
+    for size in ((400, 300), (1200, 900)):
+        f = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, (*size[::-1], 3), dtype=np.uint8)).save(
+            f, "JPEG"
+        )
+        images.append(f.getvalue())
+
+    for draft in (False, True):
+        batch = decode_images(images, draft=draft, num_threads=2)
+        assert batch.shape == (2, 3, 299, 299)
+        for image, image_bytes in zip(batch, images):
+            assert torch.equal(image, decode_image(image_bytes, draft=draft))
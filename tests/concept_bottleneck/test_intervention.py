@@ -0,0 +1,76 @@
+import pytest
+import torch
+from torchvision.ops import MLP
+
+from src.concept_bottleneck.intervention import (
+    InterventionCurve,
+    compute_intervention_accuracies,
+    format_curves,
+    get_intervention_order,
+)
+from src.concept_bottleneck.networks import get_mlp
+
+
+def make_data(num_samples: int = 50):
+    generator = torch.Generator().manual_seed(0)
+    probabilities = torch.rand(num_samples, 312, generator=generator)
+    ground_truth = (torch.rand(num_samples, 312, generator=generator) > 0.5).float()
+    labels = torch.randint(0, 200, (num_samples,), generator=generator)
+    return probabilities, ground_truth, labels
+
+
+def test_get_intervention_order():
+    probabilities, _, _ = make_data()
+
+    order = get_intervention_order(probabilities, "uncertainty")
+    uncertainties = (probabilities - 0.5).abs().gather(1, order)
+    assert torch.all(uncertainties[:, 1:] >= uncertainties[:, :-1])
+
+    order = get_intervention_order(
+        probabilities, "random", torch.Generator().manual_seed(0)
+    )
+    assert torch.equal(order.sort(dim=1).values, torch.arange(312).expand(50, -1))
+    assert not torch.equal(order[0], order[1])
+
+    with pytest.raises(ValueError):
+        get_intervention_order(probabilities, "unknown")  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "model", [get_mlp(), MLP(in_channels=312, hidden_channels=[64, 200])]
+)
+def test_compute_intervention_accuracies(model: torch.nn.Module):
+    torch.manual_seed(0)
+    probabilities, ground_truth, _ = make_data()
+    model.eval()
+    order = get_intervention_order(probabilities, "uncertainty")
+
+    # Labels that the head gets right exactly when all concepts are corrected.
+    with torch.inference_mode():
+        labels = model(ground_truth).argmax(dim=1)
+
+    accuracies = compute_intervention_accuracies(
+        model, probabilities, ground_truth, labels, order, batch_size=16
+    )
+    assert accuracies.shape == (313,)
+
+    # The same accuracies one k at a time, by editing the concepts themselves.
+    for k in (0, 1, 10, 100, 312):
+        mask = torch.zeros_like(probabilities, dtype=torch.bool)
+        mask.scatter_(1, order[:, :k], True)
+        concepts = torch.where(mask, ground_truth, probabilities)
+        with torch.inference_mode():
+            expected = (model(concepts).argmax(dim=1) == labels).float().mean()
+        assert accuracies[k].item() == pytest.approx(expected.item())
+
+    assert accuracies[-1] == 1
+
+
+def test_format_curves():
+    curves = [
+        InterventionCurve("independent", "random", [0.5] * 313),
+        InterventionCurve("joint", "uncertainty", [0.25] * 313),
+    ]
+    lines = format_curves(curves, ks=(0, 312)).splitlines()
+    assert len(lines) == 3
+    assert lines[2].split() == ["joint", "uncertainty", "25.00%", "25.00%"]
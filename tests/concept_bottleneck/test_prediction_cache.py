@@ -0,0 +1,180 @@
+import pathlib
+import sqlite3
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.concept_bottleneck.backends import Backend
+from src.concept_bottleneck.cache import hash_bytes, hash_file
+from src.concept_bottleneck.inference import (
+    SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    ImageToAttributesModel,
+    ModelRegistry,
+    get_quantized_model_name,
+)
+from src.concept_bottleneck.prediction_cache import SCHEMA_VERSION, PredictionCache
+from src.concept_bottleneck.train import MODEL_PATH
+
+
+class TestPredictionCache:
+    def test_get_put(self, cache: PredictionCache):
+        probabilities = np.linspace(0, 1, 312, dtype=np.float32)
+        assert cache.get("image", "checkpoint", "eager") is None
+
+        cache.put("image", "checkpoint", "eager", probabilities)
+        cached = cache.get("image", "checkpoint", "eager")
+        assert cached is not None
+        assert np.array_equal(cached, probabilities)
+        assert cache.get("image", "other checkpoint", "eager") is None
+        assert cache.get("image", "checkpoint", "int8") is None
+
+    def test_evict_least_recently_used(self, cache: PredictionCache):
+        probabilities = np.zeros(312, dtype=np.float32)
+        cache.put("a", "checkpoint", "eager", probabilities)
+        cache.put("b", "checkpoint", "eager", probabilities)
+        cache.get("a", "checkpoint", "eager")
+        cache.put("c", "checkpoint", "eager", probabilities)
+
+        assert len(cache) == 2
+        assert cache.get("a", "checkpoint", "eager") is not None
+        assert cache.get("b", "checkpoint", "eager") is None
+
+    def test_drop_outdated_schema(self, tmp_path: pathlib.Path):
+        filepath = tmp_path / "predictions.sqlite3"
+        with sqlite3.connect(filepath) as connection:
+            connection.execute(
+                "CREATE TABLE predictions (image_hash TEXT, checkpoint_hash TEXT, "
+                + "probabilities BLOB, last_used REAL)"
+            )
+            connection.execute(
+                "INSERT INTO predictions VALUES ('image', 'checkpoint', x'00', 0)"
+            )
+        connection.close()
+
+        cache = PredictionCache(filepath)
+        assert len(cache) == 0
+        cache.put("image", "checkpoint", "eager", np.zeros(312, dtype=np.float32))
+        assert len(cache) == 1
+        cache.close()
+
+        with sqlite3.connect(filepath) as connection:
+            assert connection.execute("PRAGMA user_version").fetchone() == (
+                SCHEMA_VERSION,
+            )
+        connection.close()
+
+    @pytest.fixture
+    def cache(self, tmp_path: pathlib.Path):
+        return PredictionCache(tmp_path / "predictions.sqlite3", max_entries=2)
+
+
+# Any existing checkpoint works as a cache key. Loading the MLP checkpoint into
+# Inception would fail, so predictions only succeed if the backbone is skipped.
+MODEL_NAME = SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME
+
+
+@pytest.fixture(name="image_path")
+def fixture_image_path(tmp_path: pathlib.Path):
+    image_path = tmp_path / "image.jpg"
+    Image.new("RGB", (320, 400)).save(image_path)
+    return image_path
+
+
+def test_image_to_attributes_model_skips_backbone_on_hit(
+    tmp_path: pathlib.Path, image_path: pathlib.Path
+):
+    cache = PredictionCache(tmp_path / "predictions.sqlite3")
+    cache.put(
+        hash_bytes(image_path.read_bytes()),
+        hash_file(MODEL_PATH / MODEL_NAME),
+        "eager",
+        np.full(312, 0.25, dtype=np.float32),
+    )
+
+    model = ImageToAttributesModel(ModelRegistry(), cache)
+    concepts = model.predict(MODEL_NAME, image_path.as_uri())
+    assert len(concepts) == 312
+    assert all(probability == 0.25 for probability in concepts.values())
+
+
+def test_image_to_attributes_model_keys_by_backend(
+    tmp_path: pathlib.Path, image_path: pathlib.Path
+):
+    cache = PredictionCache(tmp_path / "predictions.sqlite3")
+    image_hash = hash_bytes(image_path.read_bytes())
+    checkpoint_hash = hash_file(MODEL_PATH / MODEL_NAME)
+    cache.put(
+        image_hash, checkpoint_hash, "eager", np.full(312, 0.25, dtype=np.float32)
+    )
+    cache.put(
+        image_hash,
+        checkpoint_hash,
+        "channels_last_bf16",
+        np.full(312, 0.75, dtype=np.float32),
+    )
+
+    cases: tuple[tuple[Backend, float], ...] = (
+        ("eager", 0.25),
+        ("channels_last_bf16", 0.75),
+    )
+    for backend, expected in cases:
+        model = ImageToAttributesModel(ModelRegistry(), cache, backend=backend)
+        concepts = model.predict(MODEL_NAME, image_path.as_uri())
+        assert all(probability == expected for probability in concepts.values())
+
+
+def test_image_to_attributes_model_keys_int8_by_quantized_checkpoint(
+    tmp_path: pathlib.Path, image_path: pathlib.Path
+):
+    model_path = tmp_path / "models"
+    model_path.mkdir()
+    (model_path / MODEL_NAME).write_bytes((MODEL_PATH / MODEL_NAME).read_bytes())
+    quantized_path = model_path / get_quantized_model_name(MODEL_NAME)
+    quantized_path.write_bytes(b"quantized")
+
+    cache = PredictionCache(tmp_path / "predictions.sqlite3")
+    image_hash = hash_bytes(image_path.read_bytes())
+    cache.put(
+        image_hash,
+        hash_file(model_path / MODEL_NAME),
+        "eager",
+        np.full(312, 0.25, dtype=np.float32),
+    )
+    cache.put(
+        image_hash,
+        hash_file(quantized_path),
+        "int8",
+        np.full(312, 0.5, dtype=np.float32),
+    )
+
+    # The int8 prediction is only served for the quantized checkpoint it came
+    # from, and never for the fp32 model.
+    cases: tuple[tuple[Backend, float], ...] = (("eager", 0.25), ("int8", 0.5))
+    for backend, expected in cases:
+        model = ImageToAttributesModel(
+            ModelRegistry(), cache, backend=backend, model_path=model_path
+        )
+        concepts = model.predict(MODEL_NAME, image_path.as_uri())
+        assert all(probability == expected for probability in concepts.values())
+
+
+def test_image_to_attributes_model_keys_by_draft_decode(
+    tmp_path: pathlib.Path, image_path: pathlib.Path
+):
+    cache = PredictionCache(tmp_path / "predictions.sqlite3")
+    image_hash = hash_bytes(image_path.read_bytes())
+    checkpoint_hash = hash_file(MODEL_PATH / MODEL_NAME)
+    cache.put(
+        image_hash, checkpoint_hash, "eager", np.full(312, 0.25, dtype=np.float32)
+    )
+    cache.put(
+        image_hash, checkpoint_hash, "eager-draft", np.full(312, 0.5, dtype=np.float32)
+    )
+
+    for draft_decode, expected in ((False, 0.25), (True, 0.5)):
+        model = ImageToAttributesModel(
+            ModelRegistry(), cache, draft_decode=draft_decode
+        )
+        concepts = model.predict(MODEL_NAME, image_path.as_uri())
+        assert all(probability == expected for probability in concepts.values())
@@ -0,0 +1,64 @@
+import pathlib
+import typing
+
+import torch
+
+from src.concept_bottleneck.inference import (
+    SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    get_model_size,
+    load_attributes_to_class_model,
+)
+from src.concept_bottleneck.networks import get_inception
+from src.concept_bottleneck.quantization import (
+    evaluate_drift,
+    quantize_attributes_to_class_model,
+    quantize_image_to_attributes_model,
+    save_quantized_model,
+)
+
+
+def test_quantize_attributes_to_class_model(tmp_path: pathlib.Path):
+    model = load_attributes_to_class_model(
+        SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME, "cpu"
+    )
+    quantized_model = quantize_attributes_to_class_model(model)
+
+    filepath = tmp_path / "model.int8.pt"
+    save_quantized_model(quantized_model, torch.rand(1, 312), filepath)
+    loaded_model = typing.cast(torch.nn.Module, torch.jit.load(str(filepath)))
+    assert filepath.stat().st_size < get_model_size(model) / 2
+
+    attributes = torch.rand(16, 312, generator=torch.Generator().manual_seed(0))
+    with torch.inference_mode():
+        expected = model(attributes).argmax(dim=1)
+        actual = loaded_model(attributes).argmax(dim=1)
+    assert (actual == expected).float().mean() >= 0.9
+
+
+def test_quantize_image_to_attributes_model():
+    generator = torch.Generator().manual_seed(0)
+    model = get_inception(pretrained=False).eval()
+    images = torch.randn(4, 3, 299, 299, generator=generator)
+    attributes = torch.randint(0, 2, (4, 312), generator=generator)
+
+    quantized_model = quantize_image_to_attributes_model(model, [(images, None)])  # type: ignore
+    # The training-only auxiliary classifier is not kept without calibration.
+    assert quantized_model.AuxLogits is None
+    class_model = load_attributes_to_class_model(
+        SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME, "cpu"
+    )
+
+    report = evaluate_drift(
+        (model, quantized_model),
+        (class_model, class_model),
+        [(images, attributes)],  # type: ignore
+        torch.zeros(4, dtype=torch.long),
+    )
+    assert report["num_images"] == 4
+    assert len(report["attribute_accuracy_drift"]) == 312
+    assert 0 <= report["int8_attribute_accuracy"] <= 1
+
+    with torch.inference_mode():
+        expected = torch.sigmoid(model(images))
+        actual = torch.sigmoid(quantized_model(images))
+    assert torch.allclose(actual, expected, atol=5e-2)
@@ -0,0 +1,72 @@
+import pathlib
+import typing
+
+import torch
+
+from src.concept_bottleneck.inference import (
+    INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    ModelRegistry,
+    load_attributes_to_class_model,
+)
+from src.concept_bottleneck.rerun import RerunEngine
+
+
+def predict(model_name: str, concepts: torch.Tensor):
+    model = load_attributes_to_class_model(model_name, "cpu")
+    with torch.no_grad():
+        return torch.softmax(model(concepts.unsqueeze(0)), dim=1)[0]
+
+
+def test_rerun_engine():
+    generator = torch.Generator().manual_seed(0)
+    concepts = torch.rand(312, generator=generator)
+
+    engine = RerunEngine(ModelRegistry())
+    engine.set_concepts(typing.cast(list[float], concepts.tolist()))
+    engine.set_model(SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME)
+    assert torch.allclose(
+        engine.predict(), predict(SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME, concepts)
+    )
+
+    indices = torch.randint(0, 312, (50,), generator=generator)
+    for index in typing.cast(list[int], indices.tolist()):
+        value = torch.rand(1, generator=generator).item()
+        concepts[index] = value
+        engine.set_concept(index, value)
+    assert torch.allclose(
+        engine.predict(),
+        predict(SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME, concepts),
+        atol=1e-6,
+    )
+
+    engine.set_model(INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME)
+    assert torch.allclose(
+        engine.predict(),
+        predict(INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME, concepts),
+        atol=1e-6,
+    )
+
+
+def test_rerun_engine_without_bias(tmp_path: pathlib.Path):
+    torch.manual_seed(0)
+    model = torch.nn.Sequential(
+        torch.nn.Linear(312, 16, bias=False), torch.nn.ReLU(), torch.nn.Linear(16, 200)
+    )
+    # A placeholder checkpoint for the model registered below.
+    (tmp_path / "no_bias.pth").write_bytes(b"")
+    registry = ModelRegistry()
+    registry.get(
+        "no_bias.pth",
+        "cpu",
+        lambda name, device: model,
+        checkpoint=tmp_path / "no_bias.pth",
+    )
+    concepts = torch.rand(312)
+
+    engine = RerunEngine(registry, model_path=tmp_path)
+    engine.set_concepts(typing.cast(list[float], concepts.tolist()))
+    engine.set_model("no_bias.pth")
+    with torch.no_grad():
+        expected = torch.softmax(model(concepts.unsqueeze(0)), dim=1)[0]
+    assert torch.allclose(engine.predict(), expected, atol=1e-6)
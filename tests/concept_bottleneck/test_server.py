@@ -0,0 +1,129 @@
+import http.client
+import io
+import json
+import pathlib
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.concept_bottleneck.inference import (
+    INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+    SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    ModelRegistry,
+)
+from src.concept_bottleneck.networks import get_inception
+from src.concept_bottleneck.server import (
+    InferenceServer,
+    InferenceService,
+    MicroBatcher,
+)
+from src.concept_bottleneck.train import MODEL_PATH
+
+HOST = "127.0.0.1"
+
+
+def test_micro_batcher():
+    batch_sizes: list[int] = []
+
+    def run_batch(key: str, items: torch.Tensor):
+        batch_sizes.append(len(items))
+        return (items * 2 + len(key)).numpy()
+
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait=1)
+    futures = [
+        batcher.submit("a", torch.tensor([i], dtype=torch.float32)) for i in range(8)
+    ]
+    futures.append(batcher.submit("bb", torch.tensor([0], dtype=torch.float32)))
+
+    # The first two batches are full, while the last one waits for max_wait.
+    assert [future.result()[0] for future in futures] == [*range(1, 17, 2), 2]
+    assert batch_sizes == [4, 4, 1]
+
+    batcher.close()
+
+
+def request(server: InferenceServer, method: str, path: str, body: bytes | None = None):
+    connection = http.client.HTTPConnection(HOST, server.server_port)
+    connection.request(method, path, body)
+    response = connection.getresponse()
+    content = json.loads(response.read())
+    connection.close()
+    return response.status, content
+
+
+def test_inference_server(tmp_path: pathlib.Path):
+    # The heads are the trained ones, while the Inception checkpoint is a
+    # placeholder for the randomly initialized model registered below.
+    model_path = tmp_path / "models"
+    model_path.mkdir()
+    for name in (
+        INDEPENDENT_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+        SEQUENTIAL_ATTRIBUTES_TO_CLASS_MODEL_NAME,
+    ):
+        (model_path / name).symlink_to(MODEL_PATH / name)
+    (model_path / INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME).write_bytes(b"")
+
+    registry = ModelRegistry()
+    inception = get_inception(pretrained=False).eval()
+
+    def load(_: str, __: str):
+        return inception
+
+    registry.get(
+        INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+        "cpu",
+        load,
+        variant="eager",
+        checkpoint=model_path / INDEPENDENT_IMAGE_TO_ATTRIBUTES_MODEL_NAME,
+    )
+
+    service = InferenceService(registry=registry, max_wait=0.001, model_path=model_path)
+    server = InferenceServer((HOST, 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        status, content = request(server, "GET", "/models")
+        assert status == 200
+        assert content["model_type"] == "independent"
+
+        image = io.BytesIO()
+        Image.new("RGB", (64, 48), (200, 100, 50)).save(image, format="JPEG")
+        status, content = request(server, "POST", "/predict", image.getvalue())
+        assert status == 200
+        assert len(content["concepts"]) == 312
+        assert np.isclose(sum(content["classes"].values()), 1, atol=1e-4)
+
+        concepts = list(content["concepts"].values())
+        name = next(iter(content["concepts"]))
+        status, content = request(
+            server,
+            "POST",
+            "/rerun",
+            json.dumps(
+                {"concepts": concepts, "edits": {name: 1.0}, "model_type": "sequential"}
+            ).encode("utf-8"),
+        )
+        assert status == 200
+        assert len(content["classes"]) == 200
+
+        status, content = request(
+            server, "POST", "/model", json.dumps({"model_type": "sequential"}).encode()
+        )
+        assert status == 200
+        assert service.model_type == "sequential"
+
+        status, _ = request(
+            server, "POST", "/model", json.dumps({"model_type": "unknown"}).encode()
+        )
+        assert status == 400
+
+        status, _ = request(server, "POST", "/predict", b"not an image")
+        assert status == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
@@ -0,0 +1,99 @@
+import pathlib
+import random
+import typing
+
+import numpy as np
+import pytest
+import torch
+from torch.utils.data import DataLoader
+from torchvision import transforms
+
+from src.concept_bottleneck.dataset import (
+    DATA_PATH,
+    CUB200ImageToAttributes,
+    download_and_extract,
+)
+from src.concept_bottleneck.shards import (
+    CUB200ShardedImages,
+    load_shard_index,
+    pack_shards,
+    shuffle_buffer,
+)
+from src.concept_bottleneck.synthetic import make_synthetic_cub
+
+download_and_extract()
+
+TRANSFORM = transforms.Compose([transforms.Resize(8), transforms.PILToTensor()])
+
+
+def test_shuffle_buffer():
+    items = list(shuffle_buffer(range(100), 10, random.Random(0)))
+    assert sorted(items) == list(range(100))
+    assert items != list(range(100))
+
+
+def test_pack_shards(tmp_path: pathlib.Path):
+    pack_shards(train=False, shard_path=tmp_path, shard_size=1 << 20)
+    index = load_shard_index(train=False, shard_path=tmp_path)
+    dataset = CUB200ImageToAttributes(train=False, transform=TRANSFORM)
+
+    assert len(index["offsets"]) == len(dataset)
+    assert index["num_shards"].item() > 1
+    assert sorted(index["image_ids"].tolist()) == dataset.image_ids.tolist()
+
+    sharded_images = CUB200ShardedImages(
+        train=False, target="attributes", transform=TRANSFORM, shard_path=tmp_path
+    )
+    for i, (image, attributes) in zip(range(8), sharded_images):
+        idx = dataset.image_ids.tolist().index(index["image_ids"][i])
+        expected_image, expected_attributes = dataset[idx]
+        assert torch.equal(image, expected_image)
+        assert np.array_equal(attributes, expected_attributes)
+
+
+def test_sharded_dataloader(tmp_path: pathlib.Path):
+    sharded_images = CUB200ShardedImages(
+        train=False,
+        target="class",
+        transform=lambda _: torch.zeros(()),
+        shuffle=True,
+        shuffle_buffer_size=64,
+        shard_path=tmp_path,
+    )
+    index = load_shard_index(train=False, shard_path=tmp_path)
+
+    epochs: list[torch.Tensor] = []
+    for _ in range(2):
+        dataloader = DataLoader(sharded_images, batch_size=32, num_workers=2)
+        epochs.append(torch.cat([labels for _, labels in dataloader]))
+
+    # Every image is read exactly once per epoch, in a new order.
+    for labels in epochs:
+        assert sorted(typing.cast(list[int], labels.tolist())) == sorted(
+            index["class_labels"].tolist()
+        )
+    assert not torch.equal(epochs[0], epochs[1])
+
+
+def test_pack_shards_data_path(tmp_path: pathlib.Path):
+    data_path = tmp_path / "data" / DATA_PATH.name
+    make_synthetic_cub(data_path, num_images=8)
+
+    pack_shards(train=True, shard_path=tmp_path / "shards", data_path=data_path)
+    pack_shards(train=False, shard_path=tmp_path / "shards", data_path=data_path)
+    image_ids = np.concatenate(
+        [
+            load_shard_index(train, tmp_path / "shards")["image_ids"]
+            for train in (True, False)
+        ]
+    )
+    assert sorted(image_ids.tolist()) == list(range(8))
+
+
+def test_sharded_images_shuffle_buffer_size(tmp_path: pathlib.Path):
+    with pytest.raises(ValueError):
+        CUB200ShardedImages(
+            train=False, shuffle=True, shuffle_buffer_size=0, shard_path=tmp_path
+        )
+    # The split is not packed before the arguments are checked.
+    assert not list(tmp_path.iterdir())
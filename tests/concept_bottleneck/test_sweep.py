@@ -0,0 +1,76 @@
+import torch
+
+from src.concept_bottleneck.checkpoint import snapshot
+from src.concept_bottleneck.networks import get_mlp
+from src.concept_bottleneck.sweep import SweepConfig, format_results, run_sweep
+from src.concept_bottleneck.tensor_loader import TensorBatchLoader
+from tests.concept_bottleneck.helpers import make_head_data
+
+
+def train_sequentially(
+    config: SweepConfig,
+    index: int,
+    training_data: tuple[torch.Tensor, torch.Tensor],
+    test_data: tuple[torch.Tensor, torch.Tensor],
+):
+    torch.manual_seed(index)
+    model = get_mlp()
+    optimizer = torch.optim.SGD(
+        model.parameters(),
+        lr=config.learning_rate,
+        momentum=config.momentum,
+        weight_decay=config.weight_decay,
+    )
+    loader = TensorBatchLoader(
+        training_data,
+        batch_size=config.batch_size,
+        shuffle=True,
+        generator=torch.Generator().manual_seed(0),
+    )
+    loss_fn = torch.nn.CrossEntropyLoss()
+    accuracies: list[float] = []
+    state_dicts: list[dict[str, torch.Tensor]] = []
+    for _ in range(config.epochs):
+        for x, y in loader:
+            optimizer.zero_grad()
+            loss_fn(model(x), y).backward()
+            optimizer.step()
+        with torch.no_grad():
+            test_x, test_y = test_data
+            accuracies.append((model(test_x).argmax(1) == test_y).float().mean().item())
+        state_dicts.append(snapshot(model.state_dict()))
+    return accuracies, state_dicts
+
+
+def test_run_sweep():
+    training_data, test_data = make_head_data(256, seed=0), make_head_data(256, seed=1)
+    configs = [
+        SweepConfig(learning_rate=0.05, epochs=4, batch_size=16),
+        SweepConfig(learning_rate=0.02, epochs=2, batch_size=32, momentum=0.5),
+        SweepConfig(learning_rate=0.1, epochs=3, batch_size=16, weight_decay=1e-3),
+        SweepConfig(learning_rate=0.05, epochs=2, batch_size=16),
+    ]
+    # Learning rates at which SGD is stable, so that rounding differences
+    # between the stacked and the sequential updates do not blow up.
+    results, state_dicts = run_sweep(configs, training_data, test_data)
+
+    # Every stacked head matches training its configuration on its own. Heads
+    # are seeded by their position among those with the same batch size, and
+    # configurations that only differ in their epochs share a head.
+    for config, index, result, state_dict in zip(
+        configs, [0, 0, 1, 0], results, state_dicts
+    ):
+        accuracies, expected_state_dicts = train_sequentially(
+            config, index, training_data, test_data
+        )
+        assert result.config == config
+        assert abs(result.test_accuracy - accuracies[-1]) < 1e-6
+
+        best_epoch = accuracies.index(max(accuracies)) + 1
+        assert result.best_epoch == best_epoch
+        assert abs(result.best_test_accuracy - accuracies[best_epoch - 1]) < 1e-6
+
+        for key, value in expected_state_dicts[best_epoch - 1].items():
+            assert torch.allclose(state_dict[key], value, rtol=1e-4, atol=1e-4)
+
+    assert len(format_results(results).splitlines()) == len(configs) + 1
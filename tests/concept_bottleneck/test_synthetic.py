@@ -0,0 +1,23 @@
+import pathlib
+
+from src.concept_bottleneck.dataset import (
+    DATA_PATH,
+    NUM_ATTRIBUTES,
+    CUB200ImageToAttributes,
+)
+from src.concept_bottleneck.synthetic import make_synthetic_cub
+
+
+def test_make_synthetic_cub(tmp_path: pathlib.Path):
+    data_path = tmp_path / "data" / DATA_PATH.name
+    make_synthetic_cub(data_path, num_images=8)
+
+    train = CUB200ImageToAttributes(train=True, download=False, data_path=data_path)
+    test = CUB200ImageToAttributes(train=False, download=False, data_path=data_path)
+    assert len(train) + len(test) == 8
+
+    image, attributes = (train if len(train) else test)[0]
+    assert image.shape == (3, 299, 299)
+    assert attributes.shape == (NUM_ATTRIBUTES,)
+    # The metadata index is cached next to the synthetic dataset.
+    assert list((data_path.parent / "cache").glob("metadata-*.npz"))
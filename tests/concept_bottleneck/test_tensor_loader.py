@@ -0,0 +1,77 @@
+import typing
+
+import numpy as np
+import pytest
+import torch
+
+from src.concept_bottleneck.dataset import CUB200AttributesToClass
+from src.concept_bottleneck.tensor_loader import TensorBatchLoader
+from src.concept_bottleneck.train import run_epochs
+from tests.concept_bottleneck.helpers import make_linear_classifier, skip_saving
+
+
+def test_batches():
+    x = torch.arange(10).float().unsqueeze(1)
+    y = torch.arange(10)
+
+    loader = TensorBatchLoader((x, y), batch_size=4)
+    assert len(loader) == 3
+    assert [len(y_batch) for _, y_batch in loader] == [4, 4, 2]
+    assert torch.equal(torch.cat([y_batch for _, y_batch in loader]), y)
+
+    loader = TensorBatchLoader((x, y), batch_size=4, drop_last=True)
+    assert len(loader) == 2
+    assert [len(y_batch) for _, y_batch in loader] == [4, 4]
+
+
+def test_shuffle():
+    x = torch.arange(100).float().unsqueeze(1)
+    y = torch.arange(100)
+    loader = TensorBatchLoader(
+        (x, y), batch_size=8, shuffle=True, generator=torch.Generator().manual_seed(0)
+    )
+
+    epochs = [list(loader) for _ in range(2)]
+    for batches in epochs:
+        # Rows stay paired and every row is seen once per epoch.
+        for x_batch, y_batch in batches:
+            assert torch.equal(x_batch.squeeze(1).long(), y_batch)
+        seen = typing.cast(
+            list[int], torch.cat([y_batch for _, y_batch in batches]).tolist()
+        )
+        assert sorted(seen) == list(range(100))
+    assert not torch.equal(epochs[0][0][1], epochs[1][0][1])
+
+
+def test_mismatched_tensors():
+    with pytest.raises(ValueError):
+        TensorBatchLoader((torch.zeros(3), torch.zeros(4)))
+
+
+def test_from_dataset():
+    dataset = CUB200AttributesToClass(train=False)
+    loader = TensorBatchLoader.from_dataset(dataset, batch_size=64)
+
+    attributes, labels = loader.tensors
+    assert len(loader.dataset) == len(dataset)
+    assert np.array_equal(attributes.numpy(), dataset.image_attribute_labels)
+    assert np.array_equal(labels.numpy(), dataset.image_class_labels - 1)
+
+
+def test_run_epochs():
+    torch.manual_seed(0)
+    loader = TensorBatchLoader(
+        (torch.randn(32, 4), torch.randint(0, 2, (32,))), batch_size=8, shuffle=True
+    )
+    model, train, test = make_linear_classifier(loader)
+
+    best_model = run_epochs(
+        2,
+        model,
+        train,
+        test,
+        loader,  # type: ignore
+        loader,  # type: ignore
+        skip_saving,
+    )
+    assert best_model is not None
@@ -0,0 +1,109 @@
+import pathlib
+
+import pytest
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from src.concept_bottleneck.train import (
+    Event,
+    Profiling,
+    TrainingMonitor,
+    get_live_children_peak_rss,
+    run_epochs,
+    subsample_dataloader,
+)
+from tests.concept_bottleneck.helpers import make_linear_classifier, skip_saving
+
+
+def test_run_epochs_events(tmp_path: pathlib.Path):
+    dataset = TensorDataset(torch.randn(32, 4), torch.randint(0, 2, (32,)))
+    events: list[Event] = []
+    monitor = TrainingMonitor(
+        log_path=tmp_path / "log.jsonl",
+        callbacks=[events.append],
+        profiling=Profiling(epochs=[2], steps=1, directory=tmp_path / "profiles"),
+    )
+    training_dataloader = monitor.instrument(DataLoader(dataset, batch_size=8))
+    test_dataloader = monitor.instrument(DataLoader(dataset, batch_size=16))
+
+    model, train, test = make_linear_classifier(training_dataloader)
+
+    run_epochs(
+        2,
+        model,
+        train,
+        test,
+        training_dataloader,  # type: ignore
+        test_dataloader,  # type: ignore
+        skip_saving,
+        monitor=monitor,
+    )
+
+    epochs = [event for event in events if event["event"] == "epoch"]
+    assert [event["epoch"] for event in epochs] == [1, 2]
+    assert epochs[0]["train_samples"] == 32
+    assert epochs[0]["eval_samples"] == 64
+    assert 0 <= epochs[0]["train_data_wait_seconds"] <= epochs[0]["train_seconds"]
+    assert epochs[0]["peak_rss_bytes"] > 0
+
+    assert events[0]["event"] == "start"
+    assert events[-1]["event"] == "end"
+    assert (tmp_path / "profiles" / "epoch-2.json").exists()
+    assert len((tmp_path / "log.jsonl").read_text().splitlines()) == len(events)
+
+
+def test_run_epochs_schedule():
+    dataset = TensorDataset(torch.randn(32, 4), torch.randint(0, 2, (32,)))
+    dataloader = DataLoader(dataset, batch_size=8)
+    model = torch.nn.Linear(4, 2)
+
+    tested: list[int] = []
+    test_accuracies = iter([0.5, 0.6, 0.6, 0.6, 0.6])
+
+    def train(_: torch.nn.Module):
+        return 0.0, 1.0
+
+    def test(_: torch.nn.Module, dataloader: DataLoader[tuple[torch.Tensor, ...]]):
+        tested.append(len(dataloader.dataset))  # type: ignore
+        return 0.0, next(test_accuracies)
+
+    events: list[Event] = []
+    run_epochs(
+        20,
+        model,
+        train,
+        test,
+        subsample_dataloader(dataloader, 8),
+        subsample_dataloader(dataloader, 16),
+        skip_saving,
+        monitor=TrainingMonitor(callbacks=[events.append]),
+        eval_every=2,
+        patience=3,
+    )
+
+    # The training set is never evaluated because train returns its metrics,
+    # and training stops after three evaluations without improvement.
+    assert tested == [16] * 5
+    epochs = [event for event in events if event["event"] == "epoch"]
+    assert len(epochs) == 10
+    assert [event["epoch"] for event in epochs if "test_accuracy" in event] == [
+        2,
+        4,
+        6,
+        8,
+        10,
+    ]
+    assert all(event["training_accuracy"] == 1.0 for event in epochs)
+    assert events[-2]["event"] == "early_stop"
+
+
+@pytest.mark.skipif(not pathlib.Path("/proc/self/status").exists(), reason="no /proc")
+def test_get_live_children_peak_rss():
+    dataset = TensorDataset(torch.randn(8, 4))
+    dataloader = DataLoader(dataset, num_workers=1, persistent_workers=True)
+    before = get_live_children_peak_rss()
+
+    # Persistent workers stay alive between epochs, where RUSAGE_CHILDREN
+    # cannot see them.
+    list(dataloader)
+    assert get_live_children_peak_rss() > before
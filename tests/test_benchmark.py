@@ -0,0 +1,21 @@
+from src.benchmark import Result, compare_with_baseline
+
+
+def test_compare_with_baseline():
+    results = [
+        Result("latency", 1.3, "ms", False),
+        Result("throughput", 90, "images/s", True),
+        Result("throughput_drop", 50, "images/s", True),
+        Result("new", 1, "ms", False),
+    ]
+    baseline = {
+        "latency": {"value": 1.0},
+        "throughput": {"value": 100},
+        "throughput_drop": {"value": 100},
+    }
+
+    regressions = compare_with_baseline(results, baseline, tolerance=0.2)
+    assert [(result.name, round(slowdown, 2)) for result, slowdown in regressions] == [
+        ("latency", 0.3),
+        ("throughput_drop", 1.0),
+    ]
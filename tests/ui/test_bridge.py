@@ -0,0 +1,81 @@
+import contextlib
+import threading
+
+from PySide6.QtCore import QCoreApplication
+
+from src.concept_bottleneck.dataset import load_attribute_names
+from src.concept_bottleneck.inference import MODEL_TYPE_MAP, ImageToAttributesModel
+from src.ui import Bridge
+from src.ui.models import ProbabilityListModel
+from src.ui.scheduler import TaskScheduler
+
+
+class StubImageToAttributesModel(ImageToAttributesModel):
+    # Predicts the same concepts for every image and records the requests.
+    def __init__(self):
+        super().__init__()
+        self.requests: list[tuple[str, str]] = []
+
+    def predict(self, model_name: str, image_uri: str) -> dict[str, float]:
+        self.requests.append((model_name, image_uri))
+        return {name: 0.5 for name in load_attribute_names()}
+
+
+@contextlib.contextmanager
+def hold(scheduler: TaskScheduler):
+    # Occupies the worker, so that the tasks submitted in the block stay
+    # pending, then runs them to completion.
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    scheduler.submit("block", block)
+    started.wait()
+    yield
+    release.set()
+    scheduler.join()
+
+
+def test_bridge():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    bridge = Bridge()
+    model = StubImageToAttributesModel()
+    bridge.image_to_attributes_model = model
+    class_model: ProbabilityListModel = bridge.property("classModel")
+
+    loading_changes: list[bool] = []
+
+    def on_loading_changed():
+        loading_changes.append(True)
+
+    bridge.loadingChanged.connect(on_loading_changed)
+
+    with hold(bridge.scheduler):
+        assert bridge.property("loading")
+        bridge.setImagePath("first.jpg")
+        bridge.predict()
+        bridge.rerun()
+        # The pending tasks were requested for the previous image or model type.
+        bridge.setImagePath("second.jpg")
+        bridge.rerun()
+        bridge.setModelType("sequential")
+    app.processEvents()
+
+    assert not bridge.property("loading")
+    assert not model.requests
+    assert class_model.rowCount() == 0
+
+    with hold(bridge.scheduler):
+        bridge.predict()
+        bridge.predict()
+    app.processEvents()
+
+    # Only the latest prediction ran, and reran the classes itself.
+    assert model.requests == [(MODEL_TYPE_MAP["sequential"][0], "second.jpg")]
+    assert class_model.rowCount() > 0
+    assert len(loading_changes) == 4
+
+    bridge.scheduler.shutdown()
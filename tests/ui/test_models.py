@@ -0,0 +1,58 @@
+from PySide6.QtCore import QModelIndex
+
+from src.ui.models import NAME_ROLE, PROBABILITY_ROLE, ProbabilityListModel
+
+
+def rows(model: ProbabilityListModel):
+    return [
+        (
+            model.data(model.index(row), NAME_ROLE),
+            model.data(model.index(row), PROBABILITY_ROLE),
+        )
+        for row in range(model.rowCount())
+    ]
+
+
+def test_probability_list_model_pages():
+    model = ProbabilityListModel(rows_per_page=2)
+    model.set_items(["a", "b", "c"], [0.1, 0.5, 0.3])
+
+    assert model.property("pageCount") == 2
+    assert rows(model) == [("b", 0.5), ("c", 0.3)]
+
+    model.nextPage()
+    assert model.property("page") == 1
+    assert rows(model) == [("a", 0.1)]
+
+    model.nextPage()
+    assert model.property("page") == 1
+
+    model.previousPage()
+    assert model.property("page") == 0
+
+
+def test_probability_list_model_updates_changed_rows():
+    model = ProbabilityListModel(rows_per_page=2)
+    model.set_items(["a", "b", "c"], [0.1, 0.5, 0.3])
+
+    changed: list[int] = []
+    resets: list[bool] = []
+    # Inherited Qt signals are not visible to pylint.
+    # pylint: disable=no-member
+    model.dataChanged.connect(
+        lambda top_left, *_: changed.append(top_left.row())  # type: ignore
+    )
+    model.modelReset.connect(lambda: resets.append(True))
+    # pylint: enable=no-member
+
+    model.set_probability("c", 0.4)
+    assert changed == [1]
+    assert not resets
+    assert rows(model) == [("b", 0.5), ("c", 0.4)]
+
+    model.set_probability("a", 0.9)
+    assert resets
+    assert rows(model) == [("a", 0.9), ("b", 0.5)]
+    assert model.probability("c") == 0.4
+    assert model.rowCount(model.index(0)) == 0
+    assert model.rowCount(QModelIndex()) == 2
@@ -0,0 +1,79 @@
+import threading
+
+from src.ui.scheduler import TaskScheduler
+
+
+def test_run_latest_task_of_each_kind_by_priority():
+    ran: list[str] = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    scheduler = TaskScheduler()
+    scheduler.submit("block", block)
+    started.wait()
+
+    scheduler.submit("rerun", lambda: ran.append("rerun 1"))
+    scheduler.submit("rerun", lambda: ran.append("rerun 2"))
+    scheduler.submit("predict", lambda: ran.append("predict"), priority=1)
+    release.set()
+    scheduler.join()
+
+    assert ran == ["predict", "rerun 2"]
+    scheduler.shutdown()
+
+
+def test_cancel():
+    ran: list[str] = []
+    release = threading.Event()
+
+    def block():
+        release.wait()
+
+    scheduler = TaskScheduler()
+    scheduler.submit("block", block)
+    scheduler.submit("rerun", lambda: ran.append("rerun"))
+    scheduler.cancel("rerun")
+    release.set()
+    scheduler.join()
+
+    assert not ran
+    scheduler.shutdown()
+
+
+def test_busy():
+    changes: list[bool] = []
+    release = threading.Event()
+
+    def block():
+        release.wait()
+
+    scheduler = TaskScheduler(on_busy_changed=changes.append)
+    assert not scheduler.busy
+
+    scheduler.submit("block", block)
+    assert scheduler.busy
+
+    release.set()
+    scheduler.join()
+    assert not scheduler.busy
+    assert changes == [True, False]
+    scheduler.shutdown()
+
+
+def test_keep_running_after_failed_task():
+    ran: list[str] = []
+
+    def fail():
+        raise RuntimeError("failed")
+
+    scheduler = TaskScheduler()
+    scheduler.submit("fail", fail)
+    scheduler.submit("rerun", lambda: ran.append("rerun"))
+    scheduler.join()
+
+    assert ran == ["rerun"]
+    scheduler.shutdown()